@@ -0,0 +1,129 @@
+"""
+Micro-batching for MedAI
+Collects concurrent generation requests so they can share one forward pass
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+class _PendingItem:
+    __slots__ = ("payload", "future", "enqueued_at")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class MicroBatcher:
+    """Groups items submitted from many threads into batches.
+
+    A batch is closed when it reaches ``max_batch_size`` items or when
+    ``window_ms`` has passed since its first item arrived, whichever comes
+    first. ``process_batch`` receives the payloads in order and must return
+    one result per payload; each submitter gets its own result back through
+    the Future returned by ``submit``.
+    """
+
+    def __init__(self, process_batch: Callable[[List], List], max_batch_size: int = 8,
+                 window_ms: float = 20, name: str = "batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = window_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = {}
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def submit(self, payload) -> Future:
+        self._ensure_started()
+        item = _PendingItem(payload)
+        self._queue.put(item)
+        return item.future
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _collect(self, first: _PendingItem) -> List[_PendingItem]:
+        batch = [first]
+        deadline = first.enqueued_at + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop signal back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self._record(batch)
+
+            try:
+                results = self.process_batch([item.payload for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(batch)}: {e}")
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
+
+    def _record(self, batch: List[_PendingItem]):
+        started = time.perf_counter()
+        waits = [started - item.enqueued_at for item in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+            self._total_wait += sum(waits)
+            self._max_wait = max(self._max_wait, max(waits))
+        logger.debug(f"{self.name}: batch of {len(batch)}, max wait {max(waits) * 1000:.1f}ms")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "window_ms": self.window * 1000,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "avg_wait_ms": round(self._total_wait / self._items * 1000, 2) if self._items else 0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+            }
+
+    def stop(self):
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
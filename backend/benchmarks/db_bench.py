@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Database Micro-benchmarks for MedAI
+Times save_conversation, get_conversation and get_all_conversations as the
+messages table grows (1k to 100k messages by default).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logging.basicConfig(level=logging.WARNING, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def summarize(samples) -> dict:
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+    }
+
+async def seed(database, start: int, end: int, messages_per_conversation: int):
+    """Bulk insert messages [start, end) grouped into conversations"""
+    from sqlalchemy import insert
+
+    base_time = datetime(2024, 1, 1)
+    conversations, messages = [], []
+    for n in range(start, end):
+        conversation_number = n // messages_per_conversation
+        timestamp = base_time + timedelta(seconds=n)
+        if n % messages_per_conversation == 0:
+            conversations.append({
+                "id": f"bench_{conversation_number}",
+                "title": f"Benchmark conversation {conversation_number}",
+                "created_at": timestamp,
+                "updated_at": timestamp,
+            })
+        messages.append({
+            "conversation_id": f"bench_{conversation_number}",
+            "role": "user" if n % 2 == 0 else "assistant",
+            "content": f"Benchmark message {n} about symptoms, causes and treatment options.",
+            "timestamp": timestamp,
+        })
+
+    async with database.SessionLocal() as db:
+        for i in range(0, len(conversations), 5000):
+            await db.execute(insert(database.ConversationDB), conversations[i:i + 5000])
+        for i in range(0, len(messages), 5000):
+            await db.execute(insert(database.MessageDB), messages[i:i + 5000])
+        await db.commit()
+
+async def time_call(fn, repeats: int):
+    samples = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        await fn(i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+async def run(args) -> list:
+    import database
+    import main
+
+    await database.init_db()
+    results = []
+    seeded = 0
+
+    for size in args.sizes:
+        await seed(database, seeded, size, args.messages_per_conversation)
+        seeded = size
+        conversation_count = size // args.messages_per_conversation
+
+        async def save(i):
+            now = datetime.now().isoformat()
+            async with database.SessionLocal() as db:
+                await main.save_conversation(
+                    f"bench_{i % conversation_count}",
+                    "unused",
+                    [main.Message(role="user", content="Follow-up question", timestamp=now),
+                     main.Message(role="assistant", content="Follow-up answer", timestamp=now)],
+                    db
+                )
+
+        async def get_one(i):
+            async with database.SessionLocal() as db:
+                await main.get_conversation(f"bench_{i % conversation_count}", db)
+
+        async def list_first_page(i):
+            async with database.SessionLocal() as db:
+                await main.get_all_conversations(db, limit=20)
+
+        async def list_deep_page(i):
+            # Walk five pages to include cursor decoding and keyset seeks
+            cursor = None
+            async with database.SessionLocal() as db:
+                for _ in range(5):
+                    page = await main.get_all_conversations(db, limit=20, cursor=cursor)
+                    cursor = page.next_cursor
+                    if not cursor:
+                        break
+
+        result = {"messages": size, "conversations": conversation_count}
+        for name, fn in [("save_conversation", save), ("get_conversation", get_one),
+                         ("list_first_page", list_first_page), ("list_five_pages", list_deep_page)]:
+            result[name] = await time_call(fn, args.repeats)
+        results.append(result)
+        print(f"{size:>8} messages: " + "  ".join(
+            f"{name} {result[name]['median_ms']}ms (p95 {result[name]['p95_ms']})"
+            for name in ("save_conversation", "get_conversation", "list_first_page", "list_five_pages")
+        ))
+
+    await database.close_db()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MedAI database helpers as data grows")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[1000, 10000, 100000],
+                        help="Comma-separated message counts to measure at")
+    parser.add_argument("--messages-per-conversation", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--database-url", help="Database to benchmark (default: temporary SQLite; must be empty)")
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="medai-dbbench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+    os.environ["DB_SQLITE_FALLBACK"] = "false"
+    # Only the database is measured; the retrieval index is never opened here
+    os.environ["RETRIEVAL_ENABLED"] = "false"
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"args": vars(args), "results": results}, output, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Load Test for the MedAI API
+Drives /chat, /conversations and /conversations/{id} at a fixed concurrency
+and reports latency percentiles, throughput and server memory, plus the
+median time of each server-side stage from the Server-Timing headers.
+
+By default it starts its own server against a temporary SQLite database and
+a tiny offline model (or the mock OpenAI server with --backend openai).
+Pass --url to benchmark an already running server instead.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+QUESTIONS = [
+    "What causes diabetes?",
+    "What are the symptoms of depression?",
+    "How is high blood pressure treated?",
+    "What are the early signs of cancer?",
+    "Is it safe to take ibuprofen every day?",
+    "How much sleep does an adult need?",
+    "What should I do for a persistent headache?",
+    "How can I lower my cholesterol?",
+]
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_server_timing(header: str) -> dict:
+    """Stage name -> milliseconds from a Server-Timing header"""
+    stages = {}
+    for entry in header.split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    stages[name] = float(param[4:])
+                except ValueError:
+                    pass
+    return stages
+
+def rss_mb(pid: int) -> float:
+    """Resident memory of a process in MB (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+class ManagedServer:
+    """Starts the API (and optionally the mock OpenAI server) as subprocesses"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="medai-bench-")
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.processes = []
+        self.api = None
+
+    def start(self):
+        env = dict(os.environ)
+        env.update(
+            DATABASE_URL=self.args.database_url or f"sqlite:///{self.workdir}/bench.db",
+            MODEL_MAX_LENGTH=str(self.args.max_tokens),
+            INFERENCE_WORKERS=str(self.args.workers),
+            RESPONSE_CACHE_ENABLED="false" if self.args.no_cache else "true",
+        )
+
+        if self.args.backend == "openai":
+            mock_port = free_port()
+            self.processes.append(subprocess.Popen(
+                [sys.executable, str(BACKEND_DIR / "benchmarks" / "mock_openai.py"),
+                 "--port", str(mock_port), "--latency", str(self.args.mock_latency),
+                 "--error-rate", str(self.args.mock_error_rate), "--slow-rate", str(self.args.mock_slow_rate)],
+            ))
+            env.update(
+                OPENAI_ENABLED="true",
+                OPENAI_API_KEY="benchmark",
+                OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+            )
+        else:
+            model_dir = self.args.model
+            if not model_dir:
+                from make_tiny_model import make_tiny_model
+                model_dir = os.path.join(self.workdir, "tiny-model")
+                make_tiny_model(model_dir)
+            env.update(OPENAI_ENABLED="false", MODEL_NAME=model_dir)
+
+        self.api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        self.processes.append(self.api)
+        self._wait_ready()
+
+    def _wait_ready(self, timeout: float = 300):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.api.poll() is not None:
+                raise RuntimeError("API server exited during startup")
+            try:
+                if httpx.get(f"{self.url}/ready", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError("API server did not become ready")
+
+    def memory_mb(self) -> float:
+        return rss_mb(self.api.pid) if self.api else 0.0
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+async def run_scenario(client: httpx.AsyncClient, name: str, make_request, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    statuses = {}
+    stages = {}
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in remaining:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code >= 400:
+                    errors += 1
+                for stage, ms in parse_server_timing(response.headers.get("Server-Timing", "")).items():
+                    stages.setdefault(stage, []).append(ms)
+            except httpx.HTTPError:
+                errors += 1
+                statuses["error"] = statuses.get("error", 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0,
+        # Median per stage over the responses that had it
+        "stages_p50_ms": {stage: round(percentile(values, 50), 1) for stage, values in stages.items()},
+    }
+
+async def run(args, url: str, memory=lambda: 0.0) -> list:
+    conversation_ids = []
+    results = []
+
+    async def chat(client, i):
+        payload = {"message": f"{random.choice(QUESTIONS)} ({i})" if args.no_cache else random.choice(QUESTIONS)}
+        if conversation_ids and random.random() < args.follow_up:
+            payload["conversation_id"] = random.choice(conversation_ids)
+        response = await client.post("/chat", json=payload)
+        if response.status_code == 200:
+            conversation_ids.append(response.json()["conversation_id"])
+        return response
+
+    async def list_conversations(client, i):
+        return await client.get("/conversations", params={"limit": 20})
+
+    async def get_conversation(client, i):
+        return await client.get(f"/conversations/{random.choice(conversation_ids)}")
+
+    scenarios = {
+        "chat": (chat, args.requests),
+        "list": (list_conversations, args.requests * 2),
+        "get": (get_conversation, args.requests * 2),
+    }
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        for name in args.scenarios:
+            make_request, total = scenarios[name]
+            if name == "get" and not conversation_ids:
+                logger.warning("Skipping 'get': no conversations were created")
+                continue
+            memory_before = memory()
+            result = await run_scenario(client, name, make_request, total, args.concurrency)
+            result["rss_mb_before"] = round(memory_before, 1)
+            result["rss_mb_after"] = round(memory(), 1)
+            results.append(result)
+    return results
+
+def print_table(results: list):
+    columns = ["scenario", "requests", "concurrency", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rss_mb_after"]
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        if result["stages_p50_ms"]:
+            breakdown = ", ".join(f"{stage} {ms}" for stage, ms in result["stages_p50_ms"].items())
+            print(f"{result['scenario']} server p50 ms: {breakdown}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the MedAI API")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--backend", choices=["local", "openai"], default="local")
+    parser.add_argument("--model", help="Model directory for the local backend (default: build a tiny one)")
+    parser.add_argument("--database-url", help="Database for the started server (default: temporary SQLite)")
+    parser.add_argument("--scenarios", nargs="+", choices=["chat", "list", "get"], default=["chat", "list", "get"])
+    parser.add_argument("--requests", type=int, default=200, help="Chat requests; list/get run twice as many")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="INFERENCE_WORKERS for the started server")
+    parser.add_argument("--max-tokens", type=int, default=16, help="MODEL_MAX_LENGTH for the started server")
+    parser.add_argument("--follow-up", type=float, default=0.5, help="Fraction of chats that continue a conversation")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache and vary questions")
+    parser.add_argument("--mock-latency", type=float, default=0.2, help="Mock OpenAI latency in seconds")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0, help="Fraction of mock OpenAI requests that fail")
+    parser.add_argument("--mock-slow-rate", type=float, default=0.0, help="Fraction of mock OpenAI requests that take 2s")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    server = None
+    try:
+        if args.url:
+            url, memory = args.url, (lambda: 0.0)
+        else:
+            server = ManagedServer(args)
+            server.start()
+            url, memory = server.url, server.memory_mb
+        results = asyncio.run(run(args, url, memory))
+    finally:
+        if server:
+            server.stop()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"args": vars(args), "results": results}, output, indent=2)
+
+if __name__ == "__main__":
+    main()
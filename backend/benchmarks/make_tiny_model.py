@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tiny Offline Model for MedAI Benchmarks
+Builds a small randomly initialised GPT-2 and tokenizer without any downloads
+"""
+
+import argparse
+import logging
+
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2TokenizerFast
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CORPUS = [
+    "You are a helpful medical AI assistant. Answer medical questions clearly and informatively.",
+    "User: What causes diabetes? Assistant: Diabetes is caused by insufficient insulin or insulin resistance.",
+    "User: What are the symptoms of depression? Assistant: Persistent low mood, loss of interest and fatigue.",
+    "User: How is cancer treated? Assistant: Treatment may include surgery, chemotherapy and radiation.",
+]
+
+def make_tiny_model(output_dir: str, vocab_size: int = 1000, layers: int = 2, hidden: int = 64, context: int = 512):
+    """Save a tiny causal LM usable as MODEL_NAME"""
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=["<|endoftext|>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(CORPUS * 100, trainer)
+
+    fast_tokenizer = GPT2TokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token="<|endoftext|>",
+        eos_token="<|endoftext|>",
+        unk_token="<|endoftext|>"
+    )
+    fast_tokenizer.save_pretrained(output_dir)
+
+    eos_id = fast_tokenizer.eos_token_id
+    config = GPT2Config(
+        vocab_size=len(fast_tokenizer),
+        n_positions=context,
+        n_embd=hidden,
+        n_layer=layers,
+        n_head=2,
+        bos_token_id=eos_id,
+        eos_token_id=eos_id
+    )
+    GPT2LMHeadModel(config).save_pretrained(output_dir)
+    logger.info(f"Tiny model saved to {output_dir} ({len(fast_tokenizer)} tokens, {layers} layers)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a tiny offline model for benchmarks")
+    parser.add_argument("output_dir", nargs="?", default="./benchmarks/tiny-model")
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--hidden", type=int, default=64)
+    args = parser.parse_args()
+    make_tiny_model(args.output_dir, layers=args.layers, hidden=args.hidden)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI Server for MedAI Benchmarks
+Serves /v1/chat/completions with configurable latency, streaming and errors
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Mock OpenAI")
+
+# Overridden from the command line
+settings = {
+    "latency": 0.2,
+    "token_delay": 0.01,
+    "error_rate": 0.0,
+    "slow_rate": 0.0,
+    "slow_latency": 2.0,
+    "reply": "This is a mock medical answer. Please consult a healthcare professional for personal advice.",
+}
+
+def _completion_id() -> str:
+    return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    slow = random.random() < settings["slow_rate"]
+    await asyncio.sleep(settings["slow_latency"] if slow else settings["latency"])
+
+    if random.random() < settings["error_rate"]:
+        return JSONResponse(
+            status_code=random.choice([429, 500, 503]),
+            content={"error": {"message": "Mock failure", "type": "server_error"}}
+        )
+
+    words = settings["reply"].split(" ")[: body.get("max_tokens") or None]
+    model = body.get("model", "gpt-3.5-turbo")
+    created = int(time.time())
+
+    if not body.get("stream"):
+        return {
+            "id": _completion_id(),
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 20, "completion_tokens": len(words), "total_tokens": 20 + len(words)}
+        }
+
+    async def events():
+        completion_id = _completion_id()
+        for i, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(settings["token_delay"])
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=settings["latency"], help="Seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=settings["token_delay"], help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"], help="Fraction of requests that fail")
+    parser.add_argument("--slow-rate", type=float, default=settings["slow_rate"], help="Fraction of requests that are slow")
+    parser.add_argument("--slow-latency", type=float, default=settings["slow_latency"], help="Seconds before the first byte of a slow request")
+    args = parser.parse_args()
+    settings.update(
+        latency=args.latency, token_delay=args.token_delay, error_rate=args.error_rate,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Inference Mode Benchmark for MedAI
+Runs the same prompts through each MODEL_OPTIMIZATION mode and reports load
+time, memory, latency, throughput and how often outputs match float32.
+
+Each mode runs in its own process so memory figures are not mixed up.
+Decoding is greedy, so differences from float32 come from numerics alone.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+logging.basicConfig(level=logging.WARNING, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import QUESTIONS, rss_mb
+
+PREAMBLE = "You are a helpful medical AI assistant. Answer medical questions clearly and informatively.\n"
+
+def run_mode(args) -> dict:
+    """Benchmark one mode in this process"""
+    import torch
+    from transformers import AutoTokenizer
+    import optimization
+
+    os.environ["MODEL_NUM_THREADS"] = str(args.threads)
+    threads = optimization.configure_threads()
+    rss_before = rss_mb(os.getpid())
+
+    started = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model, mode = optimization.load_model(args.model, "cpu", args.mode)
+    load_seconds = time.perf_counter() - started
+
+    prompts = [f"{PREAMBLE}\nUser: {question}\nAssistant:" for question in QUESTIONS]
+    latencies, outputs, tokens = [], [], 0
+    for round_number in range(args.warmup + args.rounds):
+        for prompt in prompts:
+            inputs = tokenizer(prompt, return_tensors="pt")
+            started = time.perf_counter()
+            with torch.no_grad():
+                sequence = model.generate(
+                    **inputs,
+                    max_new_tokens=args.max_tokens,
+                    min_new_tokens=args.max_tokens,
+                    do_sample=False,
+                    pad_token_id=tokenizer.eos_token_id
+                )
+            elapsed = time.perf_counter() - started
+            if round_number >= args.warmup:
+                latencies.append(elapsed)
+                generated = sequence[0, inputs["input_ids"].shape[1]:].tolist()
+                tokens += len(generated)
+                if round_number == args.warmup:
+                    outputs.append(generated)
+
+    ordered = sorted(latencies)
+    return {
+        "mode": args.mode,
+        "applied": mode,
+        "threads": threads,
+        "load_s": round(load_seconds, 2),
+        "rss_mb": round(rss_mb(os.getpid()) - rss_before, 1),
+        "median_ms": round(statistics.median(ordered) * 1000, 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        "tokens_per_s": round(tokens / sum(latencies), 1),
+        "outputs": outputs,
+    }
+
+def compare(results: list):
+    """Fraction of generated tokens that match the float32 run"""
+    baseline = next((r for r in results if r["mode"] == "none"), None)
+    for result in results:
+        if not baseline:
+            result["match_fp32"] = None
+            continue
+        same = total = 0
+        for ours, theirs in zip(result["outputs"], baseline["outputs"]):
+            same += sum(a == b for a, b in zip(ours, theirs))
+            total += max(len(ours), len(theirs))
+        result["match_fp32"] = round(same / total, 3) if total else None
+
+def print_table(results: list):
+    columns = ["mode", "applied", "threads", "load_s", "rss_mb", "median_ms", "p95_ms", "tokens_per_s", "match_fp32"]
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare local model inference modes on identical prompts")
+    parser.add_argument("--model", help="Model name or directory (default: build a tiny one)")
+    parser.add_argument("--modes", nargs="+", default=["none", "bf16", "int8", "onnx"])
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="MODEL_NUM_THREADS for every mode")
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3, help="Timed passes over the prompts")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--json", help="Also write results to this file")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: benchmark a single mode and report on stdout
+        print(json.dumps(run_mode(args)))
+        return
+
+    if not args.model:
+        from make_tiny_model import make_tiny_model
+        args.model = os.path.join(tempfile.mkdtemp(prefix="medai-modelbench-"), "tiny-model")
+        make_tiny_model(args.model)
+
+    results = []
+    for mode in args.modes:
+        command = [sys.executable, __file__, "--mode", mode, "--model", args.model,
+                   "--threads", str(args.threads), "--max-tokens", str(args.max_tokens),
+                   "--rounds", str(args.rounds), "--warmup", str(args.warmup)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            logger.error(f"Mode {mode} failed:\n{completed.stderr}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    compare(results)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"args": vars(args), "results": results}, output, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Prompt Encoding Micro-benchmark for MedAI
+Compares building the local model's input ids the old way (format the whole
+prompt as one string, tokenize each history message to pick the ones that
+fit, then tokenize the full prompt again) with BioMedLMModel._encode_prompt
+(preamble ids computed at load time, all turns encoded in one fast-tokenizer
+call). Reports CPU time and Python memory allocated per request for
+conversations of several lengths.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+logging.basicConfig(level=logging.WARNING, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import QUESTIONS
+
+HistoryMessage = namedtuple("HistoryMessage", "role content")
+
+ANSWER = "It depends on the cause; common treatments include rest, fluids and medication a doctor recommends."
+
+def make_history(turns: int) -> list:
+    history = []
+    for turn in range(turns):
+        history.append(HistoryMessage("user", QUESTIONS[turn % len(QUESTIONS)]))
+        history.append(HistoryMessage("assistant", ANSWER))
+    return history
+
+def encode_baseline(model, prompt: str, history: list):
+    """The encoding path before the preamble and turns were tokenized separately"""
+    import torch
+    from context import select_history, HISTORY_TOKEN_BUDGET
+    from models import PREAMBLE
+
+    selected = select_history(history, HISTORY_TOKEN_BUDGET, lambda text: len(model.tokenizer.encode(text)))
+    text = PREAMBLE + "".join(model._format_turn(m.role, m.content) for m in selected) + model._format_turn("user", prompt)
+    input_ids = torch.tensor([model.tokenizer.encode(text)])
+    return input_ids, torch.ones_like(input_ids)
+
+def encode_current(model, prompt: str, history: list, profile):
+    import torch
+
+    input_ids = torch.tensor([model._encode_prompt(prompt, history, profile)])
+    return input_ids, torch.ones_like(input_ids)
+
+def measure(encode, rounds: int) -> dict:
+    for _ in range(10):
+        encode()
+    samples = []
+    for _ in range(rounds):
+        started = time.process_time_ns()
+        encode()
+        samples.append(time.process_time_ns() - started)
+
+    # Separately, since tracing slows every allocation down
+    allocated = []
+    tracemalloc.start()
+    for _ in range(min(rounds, 50)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        encode()
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return {
+        "cpu_us": round(statistics.median(samples) / 1000, 1),
+        "peak_alloc_kb": round(statistics.median(allocated) / 1024, 1),
+    }
+
+def run(args) -> list:
+    os.environ["MODEL_NAME"] = args.model
+    from generation import profiles
+    from models import BioMedLMModel
+
+    model = BioMedLMModel()
+    model.load_model()
+    if not model.ready:
+        raise SystemExit(f"Could not load {args.model}")
+    if args.slow_tokenizer:
+        from transformers import AutoTokenizer
+        slow = AutoTokenizer.from_pretrained(args.model, use_fast=False)
+        slow.pad_token = slow.pad_token or slow.eos_token
+
+    profile = profiles.get()
+    prompt = "What should I do about a persistent cough and mild fever?"
+    results = []
+    for turns in args.turns:
+        history = make_history(turns)
+        baseline = measure(lambda: encode_baseline(model, prompt, history), args.rounds)
+        current = measure(lambda: encode_current(model, prompt, history, profile), args.rounds)
+        row = {
+            "history_turns": turns,
+            "prompt_tokens": len(model._encode_prompt(prompt, history, profile)),
+            "baseline_us": baseline["cpu_us"],
+            "current_us": current["cpu_us"],
+            "saved_us": round(baseline["cpu_us"] - current["cpu_us"], 1),
+            "baseline_kb": baseline["peak_alloc_kb"],
+            "current_kb": current["peak_alloc_kb"],
+        }
+        if args.slow_tokenizer:
+            fast, model.tokenizer = model.tokenizer, slow
+            row["slow_tokenizer_us"] = measure(lambda: encode_baseline(model, prompt, history), args.rounds)["cpu_us"]
+            model.tokenizer = fast
+        results.append(row)
+    return results
+
+def print_table(results: list):
+    columns = list(results[0])
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Time prompt encoding for the local model, old path against new")
+    parser.add_argument("--model", help="Model name or directory (default: build a tiny one)")
+    parser.add_argument("--turns", type=int, nargs="+", default=[0, 2, 5, 10], help="Earlier question/answer pairs")
+    parser.add_argument("--rounds", type=int, default=500, help="Timed encodings per case")
+    parser.add_argument("--slow-tokenizer", action="store_true",
+                        help="Also time the old path with the pure-Python tokenizer, if the model has one")
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    if not args.model:
+        from make_tiny_model import make_tiny_model
+        args.model = os.path.join(tempfile.mkdtemp(prefix="medai-tokbench-"), "tiny-model")
+        make_tiny_model(args.model)
+
+    results = run(args)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"args": vars(args), "results": results}, output, indent=2)
+
+if __name__ == "__main__":
+    main()
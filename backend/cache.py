@@ -0,0 +1,204 @@
+"""
+Response Cache for MedAI
+In-memory LRU with TTL and an optional on-disk SQLite tier
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, punctuation and spacing so trivially different questions match"""
+    prompt = _PUNCTUATION.sub(" ", prompt.lower())
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+class ResponseCache:
+    """Bounded LRU cache of generated responses.
+
+    Entries expire ``ttl`` seconds after they are written. When ``disk_path``
+    is set, entries are also written to a local SQLite file so they survive
+    restarts and can be shared by workers on the same host; a memory miss
+    falls through to disk and promotes the entry back into memory. Disk
+    reads run in a worker thread and writes are queued to a single writer
+    thread, which also deletes expired rows every ``purge_interval``
+    seconds, so the event loop never waits on the file.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, disk_path: str = None, enabled: bool = None,
+                 purge_interval: float = 60):
+        self.enabled = enabled if enabled is not None else os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+        self.ttl = ttl or float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.disk_path = disk_path if disk_path is not None else os.getenv("RESPONSE_CACHE_PATH", "")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self.purge_interval = purge_interval
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._writer = None
+        if self.enabled and self.disk_path:
+            self._open_disk()
+
+    def _open_disk(self):
+        try:
+            self._disk = self._connect()
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.execute("CREATE INDEX IF NOT EXISTS ix_responses_expires_at ON responses (expires_at)")
+            self._disk.commit()
+            self._writer = threading.Thread(target=self._write_disk, name="response-cache-writer", daemon=True)
+            self._writer.start()
+            logger.info(f"Response cache disk tier at {self.disk_path}")
+        except Exception as e:
+            logger.error(f"Error opening response cache file: {e}")
+            self._disk = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.disk_path, check_same_thread=False)
+        # Readers don't wait for the writer thread or for other workers' writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @staticmethod
+    def make_key(prompt: str, identity: dict) -> str:
+        """Key on the normalized prompt plus the model and generation settings"""
+        raw = json.dumps({"prompt": normalize_prompt(prompt), **identity}, sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+            if not self._disk:
+                self._misses += 1
+                return None
+
+        row = await asyncio.to_thread(self._read_disk, key, now)
+        with self._lock:
+            if row:
+                self._store(key, row[0], row[1])
+                self._hits += 1
+                self._disk_hits += 1
+                return row[0]
+            self._misses += 1
+            return None
+
+    def _read_disk(self, key: str, now: float):
+        with self._disk_lock:
+            if not self._disk:
+                return None
+            try:
+                return self._disk.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading response cache file: {e}")
+                return None
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._writer:
+            self._writes.put((key, value, expires_at))
+
+    def _write_disk(self):
+        """Writer thread: applies queued writes in batches and purges expired rows"""
+        connection = self._connect()
+        next_purge = time.monotonic() + self.purge_interval
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self._writes.get(timeout=max(next_purge - time.monotonic(), 0)))
+                while len(batch) < 256:
+                    batch.append(self._writes.get_nowait())
+            except queue.Empty:
+                pass
+            rows = [item for item in batch if item is not None]
+            # close() queues None after the last write
+            stopping = len(rows) < len(batch)
+            try:
+                if rows:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)", rows
+                    )
+                if time.monotonic() >= next_purge:
+                    connection.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                    next_purge = time.monotonic() + self.purge_interval
+                connection.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing response cache file: {e}")
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+        connection.close()
+
+    def flush(self):
+        """Block until queued disk writes are in the file"""
+        if self._writer:
+            self._writes.join()
+
+    def _store(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk": bool(self._disk),
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0,
+            }
+
+    def close(self):
+        """Write out queued entries and close the file"""
+        if self._writer:
+            self._writes.put(None)
+            self._writer.join(timeout=10)
+            self._writer = None
+        with self._disk_lock:
+            if self._disk:
+                self._disk.close()
+                self._disk = None
@@ -0,0 +1,116 @@
+"""
+Conversation Context for MedAI
+Token-budgeted history selection and a per-conversation KV cache
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Prior-turn tokens included in a prompt, and how many messages are loaded to pick from
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "512"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for remote models"""
+    return len(text) // 4 + 1
+
+def select_history(history: List, budget: int, count_tokens: Callable[[str], int]) -> List:
+    """Keep the most recent messages whose combined size fits in ``budget`` tokens.
+
+    Older turns are dropped whole rather than cut mid-message, and the
+    selection never starts with an assistant reply to a dropped question.
+    """
+    selected = []
+    used = 0
+    for message in reversed(history):
+        cost = count_tokens(message.content) + 2
+        if used + cost > budget:
+            break
+        selected.append(message)
+        used += cost
+    selected.reverse()
+    while selected and selected[0].role != "user":
+        selected.pop(0)
+    return selected
+
+class KVCacheEntry:
+    """Attention cache for a conversation's prompt and the reply generated for it"""
+
+    __slots__ = ("token_ids", "past_key_values", "prompt", "response")
+
+    def __init__(self, token_ids: List[int], past_key_values, prompt: str, response: str):
+        # Token ids covered (or about to be covered) by past_key_values
+        self.token_ids = token_ids
+        self.past_key_values = past_key_values
+        # The turn the entry ends with
+        self.prompt = prompt
+        self.response = response
+
+    def matches(self, history: List) -> bool:
+        """True if nothing has been added to the conversation since this entry was made.
+
+        Compares the last exchange rather than the number of messages, which
+        stops growing once the history reaches HISTORY_MAX_MESSAGES.
+        """
+        return (
+            len(history) >= 2
+            and history[-2].role == "user"
+            and history[-2].content == self.prompt
+            and history[-1].role == "assistant"
+            and history[-1].content == self.response
+        )
+
+class ConversationKVCache:
+    """Bounded LRU of KV caches keyed by conversation id.
+
+    ``take`` removes the entry so a cache is only ever extended by one
+    generation at a time; the caller stores the extended cache with ``put``.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("KV_CACHE_SIZE", "32"))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def take(self, conversation_id: str, history: List) -> Optional[KVCacheEntry]:
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry and entry.matches(history):
+                self._hits += 1
+                return entry
+            self._misses += 1
+            return None
+
+    def put(self, conversation_id: str, entry: KVCacheEntry):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[conversation_id] = entry
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, conversation_id: str):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
@@ -0,0 +1,178 @@
+"""
+Inference Executor for MedAI
+Runs blocking model generation off the event loop with bounded concurrency
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when every worker is busy and the admission queue is full"""
+
+class InferenceTimeoutError(Exception):
+    """Raised when a request is not answered within its timeout"""
+
+class GenerationCancelled(Exception):
+    """Raised inside a streaming generation once its consumer has gone away"""
+
+_STREAM_DONE = object()
+
+class InferenceStream:
+    """Async iterator over the text deltas of a streaming generation.
+
+    Iterate it to receive deltas as the worker produces them; once iteration
+    ends, ``result()`` returns the generation function's return value.
+    """
+
+    def __init__(self, future, chunks: asyncio.Queue, cancelled: threading.Event, timeout: float, on_timeout):
+        self._future = future
+        self._chunks = chunks
+        self._timeout = timeout
+        self._on_timeout = on_timeout
+        self.cancelled = cancelled
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._timeout
+        while True:
+            try:
+                chunk = await asyncio.wait_for(self._chunks.get(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                self.close()
+                self._on_timeout()
+                raise InferenceTimeoutError(f"Inference did not finish within {self._timeout}s")
+            if chunk is _STREAM_DONE:
+                return
+            yield chunk
+
+    def result(self):
+        return self._future.result()
+
+    def close(self):
+        """Stop the generation early, e.g. when the client disconnects"""
+        self.cancelled.set()
+        self._future.cancel()
+
+class InferenceExecutor:
+    """Thread pool with a bounded admission queue for model calls.
+
+    At most ``max_workers`` generations run at once and at most ``max_queue``
+    more wait for a free worker. Anything beyond that is rejected straight
+    away with QueueFullError so callers can shed load instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None, timeout: float = None):
+        self.max_workers = max_workers or int(os.getenv("INFERENCE_WORKERS", "2"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))
+        self.timeout = timeout or float(os.getenv("INFERENCE_TIMEOUT", "120"))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise QueueFullError(f"Inference queue is full ({self.capacity} requests pending)")
+            self._pending += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, timeout: float = None, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on a worker thread and await its result"""
+        self._admit()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        # The slot is only freed once the work itself finishes, so requests
+        # that time out while still running keep counting against capacity.
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # Drops the call if it never started; a running generation
+            # cannot be interrupted and finishes in the background.
+            future.cancel()
+            with self._lock:
+                self._timed_out += 1
+            raise InferenceTimeoutError(f"Inference did not finish within {timeout or self.timeout}s")
+
+    def stream(self, fn, *args, timeout: float = None, **kwargs) -> InferenceStream:
+        """Run ``fn(*args, on_delta=..., **kwargs)`` on a worker thread.
+
+        ``fn`` reports partial output by calling ``on_delta(text)`` and returns
+        the complete text. Admission happens immediately, so QueueFullError is
+        raised here rather than while iterating.
+        """
+        self._admit()
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def on_delta(text: str):
+            if cancelled.is_set():
+                raise GenerationCancelled()
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        try:
+            future = self._pool.submit(fn, *args, on_delta=on_delta, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        stream = InferenceStream(future, chunks, cancelled, timeout or self.timeout, self._count_timeout)
+        future.add_done_callback(self._release)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(chunks.put_nowait, _STREAM_DONE))
+        return stream
+
+    def stream_async(self, fn, *args, timeout: float = None, **kwargs) -> InferenceStream:
+        """Run coroutine function ``fn(*args, on_delta=..., **kwargs)`` as a task.
+
+        Returns the same kind of stream as stream(). Async generations wait on
+        the network rather than a worker thread, so they are not counted
+        against the admission queue.
+        """
+        chunks = asyncio.Queue()
+        task = asyncio.ensure_future(fn(*args, on_delta=chunks.put_nowait, **kwargs))
+
+        def on_done(task):
+            if not task.cancelled():
+                # Mark the exception as seen; result() re-raises it for the consumer
+                task.exception()
+            chunks.put_nowait(_STREAM_DONE)
+
+        task.add_done_callback(on_done)
+        return InferenceStream(task, chunks, threading.Event(), timeout or self.timeout, self._count_timeout)
+
+    def _count_timeout(self):
+        with self._lock:
+            self._timed_out += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_size": self.max_queue,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+    def shutdown(self):
+        logger.info("Shutting down inference executor")
+        self._pool.shutdown(wait=False, cancel_futures=True)
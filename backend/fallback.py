@@ -0,0 +1,125 @@
+"""
+Fallback Responder for MedAI
+Matches prompts against topic rules loaded from a JSON file
+"""
+
+import json
+import os
+import re
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent / "fallback_rules.json"
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+class TopicMatch(NamedTuple):
+    name: str
+    hits: int
+    priority: int
+
+def _word_forms(word: str) -> Tuple[str, ...]:
+    """The word plus its likely singular forms, so "pills" matches "pill" """
+    forms = [word]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        forms.append(word[:-1])
+        if word.endswith("es"):
+            forms.append(word[:-2])
+    return tuple(forms)
+
+class FallbackResponder:
+    """Canned answers chosen by whole-word keyword matching.
+
+    Keywords (single words or phrases) from every topic are compiled into a
+    single phrase table. A prompt is split into words once and each word
+    position is looked up in the table, so matching cost depends on the
+    prompt length rather than on how many topics or keywords there are.
+
+    Rules file format::
+
+        {"default": "...",
+         "topics": [{"name": "...", "keywords": ["...", "two words"],
+                     "response": "...", "priority": 0}]}
+
+    Lower priority wins; it defaults to the topic's position in the file.
+    Topics with equal priority are ranked by how many keywords they hit.
+    """
+
+    def __init__(self, rules_path: str = None):
+        self.rules_path = rules_path or os.getenv("FALLBACK_RULES_PATH") or str(DEFAULT_RULES_PATH)
+        try:
+            rules = self._read(self.rules_path)
+        except (OSError, ValueError) as e:
+            if self.rules_path == str(DEFAULT_RULES_PATH):
+                raise
+            logger.error(f"Could not load fallback rules from {self.rules_path}: {e}; using the defaults")
+            rules = self._read(DEFAULT_RULES_PATH)
+        self._compile(rules)
+
+    @staticmethod
+    def _read(path) -> dict:
+        with open(path, encoding="utf-8") as rules_file:
+            return json.load(rules_file)
+
+    def _compile(self, rules: dict):
+        self.default_response = rules["default"]
+        self.responses: Dict[str, str] = {}
+        self.priorities: Dict[str, int] = {}
+        # Keyword phrase (tuple of words) -> topic name
+        self._phrases: Dict[Tuple[str, ...], str] = {}
+        self._max_words = 1
+
+        for index, topic in enumerate(rules.get("topics", [])):
+            name = topic["name"]
+            self.responses[name] = topic["response"]
+            self.priorities[name] = int(topic.get("priority", index))
+            for keyword in topic["keywords"]:
+                phrase = tuple(_WORD.findall(keyword.lower()))
+                if not phrase:
+                    continue
+                owner = self._phrases.setdefault(phrase, name)
+                if owner != name:
+                    logger.warning(f"Fallback keyword '{keyword}' is already used by topic '{owner}'")
+                self._max_words = max(self._max_words, len(phrase))
+
+        self._known = set(self.responses.values()) | {self.default_response}
+        logger.info(f"Loaded {len(self.responses)} fallback topics ({len(self._phrases)} keywords)")
+
+    def match(self, prompt: str) -> List[TopicMatch]:
+        """Topics mentioned in the prompt, best first"""
+        words = _WORD.findall(prompt.lower())
+        hits: Dict[str, int] = {}
+        i = 0
+        while i < len(words):
+            matched = 0
+            # Prefer the longest phrase starting at this word
+            for length in range(min(self._max_words, len(words) - i), 0, -1):
+                *head, last = words[i:i + length]
+                for form in _word_forms(last):
+                    topic = self._phrases.get((*head, form))
+                    if topic:
+                        hits[topic] = hits.get(topic, 0) + 1
+                        matched = length
+                        break
+                if matched:
+                    break
+            i += matched or 1
+
+        ranked = [TopicMatch(name, count, self.priorities[name]) for name, count in hits.items()]
+        ranked.sort(key=lambda m: (m.priority, -m.hits))
+        return ranked
+
+    def respond(self, prompt: str) -> str:
+        matches = self.match(prompt)
+        return self.responses[matches[0].name] if matches else self.default_response
+
+    def is_fallback(self, response: str) -> bool:
+        """True if the response is one of the canned answers"""
+        return response in self._known
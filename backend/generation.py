@@ -0,0 +1,173 @@
+"""
+Generation Profiles for MedAI
+Named sets of generation settings (token cap, sampling or beam search, stop
+sequences and a wall-clock deadline) that a chat request can pick from
+"""
+
+import json
+import os
+import logging
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Where the local model would start inventing the user's next turn
+TURN_STOP = "\nUser:"
+
+class UnknownProfileError(KeyError):
+    """Raised for a profile name that is not configured"""
+
+class GenerationProfile(NamedTuple):
+    """How much a single reply may cost, and how it is decoded"""
+    name: str
+    # New tokens for the local model, and max_tokens for OpenAI
+    max_new_tokens: int
+    openai_max_tokens: int
+    # Sampling when true; otherwise greedy, or beam search with num_beams > 1
+    do_sample: bool = True
+    temperature: float = 0.7
+    top_p: float = 0.9
+    num_beams: int = 1
+    stop: Tuple[str, ...] = (TURN_STOP,)
+    # Seconds after which generation stops with what it has (0 = no deadline)
+    deadline_s: float = 0
+
+    def identity(self) -> dict:
+        """Settings responses are cached under; the name alone could be redefined"""
+        return {**self._asdict(), "stop": list(self.stop)}
+
+    @classmethod
+    def from_identity(cls, identity: dict) -> "GenerationProfile":
+        """Rebuild a profile sent as identity(), e.g. to the inference server"""
+        return cls(**{**identity, "stop": tuple(identity.get("stop", ()))})
+
+def _builtin_profiles() -> Dict[str, GenerationProfile]:
+    return {
+        "fast": GenerationProfile(
+            "fast", max_new_tokens=64, openai_max_tokens=40, do_sample=False, deadline_s=5
+        ),
+        # The original settings, still driven by the MODEL_* variables
+        "balanced": GenerationProfile(
+            "balanced",
+            max_new_tokens=int(os.getenv("MODEL_MAX_LENGTH", "200")),
+            openai_max_tokens=50,
+            do_sample=os.getenv("MODEL_DO_SAMPLE", "true").lower() == "true",
+            temperature=float(os.getenv("MODEL_TEMPERATURE", "0.7")),
+            top_p=float(os.getenv("MODEL_TOP_P", "0.9")),
+        ),
+        "thorough": GenerationProfile(
+            "thorough", max_new_tokens=400, openai_max_tokens=300, do_sample=False, num_beams=3, deadline_s=60
+        ),
+    }
+
+class GenerationProfiles:
+    """The configured profiles and the one used when a request names none.
+
+    ``fast``, ``balanced`` (the default) and ``thorough`` are built in.
+    GENERATION_PROFILES_PATH may name a JSON file overriding their settings
+    or adding profiles, and GENERATION_PROFILE picks the default::
+
+        {"fast": {"max_new_tokens": 32, "deadline_s": 3},
+         "brief": {"max_new_tokens": 80, "openai_max_tokens": 60,
+                   "do_sample": false, "stop": ["\\nUser:", "\\n\\n"]}}
+    """
+
+    def __init__(self, config_path: str = None, default: str = None):
+        self.config_path = config_path if config_path is not None else os.getenv("GENERATION_PROFILES_PATH", "")
+        self.profiles = _builtin_profiles()
+        for name, settings in self._read_config().items():
+            base = self.profiles.get(name, self.profiles["balanced"])
+            try:
+                settings = dict(settings)
+                if "stop" in settings:
+                    settings["stop"] = tuple(settings["stop"])
+                self.profiles[name] = base._replace(name=name, **settings)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Invalid generation profile '{name}': {e}; skipping it")
+
+        self.default_name = default or os.getenv("GENERATION_PROFILE", "balanced")
+        if self.default_name not in self.profiles:
+            logger.error(f"Default generation profile '{self.default_name}' is not configured, using 'balanced'")
+            self.default_name = "balanced"
+
+    def _read_config(self) -> dict:
+        if not self.config_path:
+            return {}
+        try:
+            with open(self.config_path, encoding="utf-8") as config_file:
+                return json.load(config_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load generation profiles from {self.config_path}: {e}; using the built-in ones")
+            return {}
+
+    def get(self, name: Optional[str] = None) -> GenerationProfile:
+        """The named profile, or the default one for None"""
+        try:
+            return self.profiles[name or self.default_name]
+        except KeyError:
+            raise UnknownProfileError(name) from None
+
+    def stats(self) -> dict:
+        return {
+            "default": self.default_name,
+            "profiles": {name: profile.identity() for name, profile in self.profiles.items()},
+        }
+
+profiles = GenerationProfiles()
+
+def resolve_profile(profile: Optional[GenerationProfile] = None, max_length: int = None) -> GenerationProfile:
+    """The profile to generate with: the given one or the default, with max_length capping its new tokens"""
+    profile = profile or profiles.get()
+    if max_length:
+        profile = profile._replace(max_new_tokens=max_length, openai_max_tokens=max_length)
+    return profile
+
+def trim_at_stop(text: str, stop: Tuple[str, ...]) -> Tuple[str, bool]:
+    """Cut ``text`` at the earliest stop sequence; also says whether one was found"""
+    cut = min((index for index in (text.find(sequence) for sequence in stop if sequence) if index >= 0), default=-1)
+    if cut < 0:
+        return text, False
+    return text[:cut], True
+
+class StopSequenceFilter:
+    """Passes streamed text on to ``on_text`` without any stop sequence.
+
+    Text that could be the start of a stop sequence is held back until the
+    next chunk shows whether it is; once a stop sequence appears everything
+    after it is dropped.
+    """
+
+    def __init__(self, on_text: Callable[[str], None], stop: Tuple[str, ...]):
+        self.on_text = on_text
+        self.stop = tuple(sequence for sequence in stop if sequence)
+        self.stopped = False
+        self._pending = ""
+
+    def __call__(self, text: str):
+        if self.stopped:
+            return
+        text, self.stopped = trim_at_stop(self._pending + text, self.stop)
+        if self.stopped:
+            self._pending = ""
+        else:
+            held = self._held_back(text)
+            text, self._pending = text[:len(text) - held], text[len(text) - held:]
+        if text:
+            self.on_text(text)
+
+    def _held_back(self, text: str) -> int:
+        """Length of the longest end of ``text`` that begins a stop sequence"""
+        for length in range(min(len(text), max(map(len, self.stop), default=1) - 1), 0, -1):
+            if any(sequence.startswith(text[-length:]) for sequence in self.stop):
+                return length
+        return 0
+
+    def flush(self):
+        """Pass on text held back at the end of generation"""
+        if self._pending and not self.stopped:
+            self.on_text(self._pending)
+        self._pending = ""
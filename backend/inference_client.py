@@ -0,0 +1,246 @@
+"""
+Inference Client for MedAI
+Lets API workers use local models hosted by the inference server
+(inference_server.py) over a Unix domain socket
+"""
+
+import asyncio
+import json
+import os
+import logging
+from typing import Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+
+import metrics
+import tracing
+from executor import QueueFullError, InferenceTimeoutError
+from models import fallback_responder
+from generation import GenerationProfile, resolve_profile
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refreshes of the model states reported by the server
+STATUS_INTERVAL = 2.0
+
+class InferenceClient:
+    """Connection from one API worker to the inference server.
+
+    Model states are polled in the background so routing decisions never
+    wait on the socket.
+    """
+
+    def __init__(self, socket_path: str = None):
+        self.socket_path = socket_path or os.getenv("INFERENCE_SERVER_SOCKET", "")
+        self._http: Optional[httpx.AsyncClient] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._models: Dict[str, dict] = {}
+        self._tasks = set()
+        self.reachable = False
+
+    def connect(self):
+        """Open the client and start polling; needs a running event loop"""
+        if self._http:
+            return
+        self._http = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=self.socket_path),
+            base_url="http://inference-server",
+            # Generation deadlines are enforced by the API's own INFERENCE_TIMEOUT
+            timeout=httpx.Timeout(None, connect=5.0),
+        )
+        self._poller = asyncio.create_task(self._poll())
+        logger.info(f"Using the inference server at {self.socket_path}")
+
+    async def close(self):
+        if self._poller:
+            self._poller.cancel()
+            self._poller = None
+        if self._http:
+            await self._http.aclose()
+            self._http = None
+
+    async def _poll(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(STATUS_INTERVAL)
+
+    async def refresh(self):
+        try:
+            response = await self._http.get("/models")
+            response.raise_for_status()
+            self._models = response.json()["models"]
+            self.reachable = True
+        except httpx.HTTPError as e:
+            if self.reachable:
+                logger.error(f"Inference server is unreachable: {e}")
+            self.reachable = False
+
+    def status(self, name: str) -> dict:
+        return self._models.get(name, {}) if self.reachable else {}
+
+    def send(self, method: str, path: str):
+        """Fire a request in the background, e.g. to start loading a model"""
+        async def run():
+            try:
+                (await self._http.request(method, path)).raise_for_status()
+                await self.refresh()
+            except httpx.HTTPError as e:
+                logger.error(f"Inference server request {method} {path} failed: {e}")
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        # Joins the server's spans to the API request's trace
+        response = await self._http.request(method, path, headers=tracing.propagation_headers(), **kwargs)
+        _raise_for_status(response)
+        return response
+
+    def stream(self, path: str, payload: dict):
+        return self._http.stream("POST", path, json=payload, headers=tracing.propagation_headers())
+
+    async def profile(self, seconds: float, interval_ms: float) -> str:
+        """Collapsed stacks sampled in the server process"""
+        response = await self.request(
+            "POST", "/profile", params={"seconds": seconds, "interval_ms": interval_ms}, timeout=seconds + 30
+        )
+        return response.text
+
+    async def health(self) -> dict:
+        try:
+            return (await self.request("GET", "/health")).json()
+        except httpx.HTTPError as e:
+            return {"status": "unreachable", "error": str(e)}
+
+def _raise_for_status(response: httpx.Response):
+    if response.status_code == 429:
+        raise QueueFullError("Inference server queue is full")
+    if response.status_code == 504:
+        raise InferenceTimeoutError("Inference server timed out")
+    response.raise_for_status()
+
+class RemoteModel:
+    """A local model served by the inference server.
+
+    Behaves like BioMedLMModel towards the API, but its methods are
+    coroutines that forward to the server, so it is treated as an async
+    model. If the server cannot be reached the fallback responder answers.
+    """
+    backend = "local"
+    is_async = True
+
+    def __init__(self, name: str = "local", client: InferenceClient = None, model: str = None, **_):
+        self.name = name
+        self.client = client
+        self.model_name = model or os.getenv("MODEL_NAME", "microsoft/DialoGPT-medium")
+
+    @property
+    def state(self) -> str:
+        return self.client.status(self.name).get("state", "unreachable" if self.client._http else "not_loaded")
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def available(self) -> bool:
+        return self.ready
+
+    def load_model(self):
+        """Ask the server to load the model; its state follows through polling"""
+        self.client.connect()
+        self.client.send("POST", f"/models/{self.name}/load")
+
+    async def unload(self):
+        await self.client.request("POST", f"/models/{self.name}/unload")
+        await self.client.refresh()
+
+    async def close(self):
+        # Only this worker's connection; the model stays loaded for the others
+        await self.client.close()
+
+    async def forget(self, conversation_id: str):
+        """Drop the server's cached attention state for a deleted conversation"""
+        try:
+            await self.client.request("DELETE", f"/models/{self.name}/conversations/{conversation_id}")
+        except httpx.HTTPError as e:
+            logger.error(f"Could not clear cached state for {conversation_id}: {e}")
+
+    def describe(self) -> dict:
+        status = self.client.status(self.name)
+        return {
+            **{key: value for key, value in status.items() if key != "cache_identity"},
+            "backend": self.backend,
+            "model": status.get("model", self.model_name),
+            "state": self.state,
+            "server": self.client.socket_path,
+        }
+
+    @staticmethod
+    def _payload(prompt: str, max_length: Optional[int], history: Optional[List], conversation_id: Optional[str],
+                 profile: Optional[GenerationProfile]) -> dict:
+        return {
+            "prompt": prompt,
+            "max_length": max_length,
+            "history": [{"role": message.role, "content": message.content} for message in history or []],
+            "conversation_id": conversation_id,
+            # Sent in full, so the server needs no profile configuration of its own
+            "profile": resolve_profile(profile).identity(),
+        }
+
+    async def generate_response(self, prompt: str, max_length: int = None, history: List = None,
+                                conversation_id: str = None, profile: GenerationProfile = None) -> str:
+        try:
+            response = await self.client.request(
+                "POST", f"/models/{self.name}/generate",
+                json=self._payload(prompt, max_length, history, conversation_id, profile)
+            )
+        except httpx.TransportError as e:
+            logger.error(f"Inference server is unreachable: {e}")
+            return self._serve_fallback(prompt)
+        return response.json()["response"]
+
+    async def stream_response(self, prompt: str, on_delta, max_length: int = None, history: List = None,
+                              conversation_id: str = None, profile: GenerationProfile = None) -> str:
+        """Relay the server's NDJSON stream: {"delta"} lines, then {"response"} or {"error"}"""
+        try:
+            async with self.client.stream(
+                f"/models/{self.name}/stream", self._payload(prompt, max_length, history, conversation_id, profile)
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    _raise_for_status(response)
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if "delta" in event:
+                        on_delta(event["delta"])
+                    elif "response" in event:
+                        return event["response"]
+                    elif event.get("error") == "timeout":
+                        raise InferenceTimeoutError("Inference server timed out")
+                    else:
+                        raise RuntimeError(f"Inference server error: {event.get('error')}")
+        except httpx.TransportError as e:
+            logger.error(f"Inference server is unreachable: {e}")
+            response = self._serve_fallback(prompt)
+            on_delta(response)
+            return response
+        raise RuntimeError("Inference server closed the stream early")
+
+    def cache_identity(self, profile: GenerationProfile = None) -> dict:
+        """Model and generation settings that responses are cached under, as reported by the server"""
+        identity = dict(self.client.status(self.name).get("cache_identity") or {"backend": "local", "model": self.model_name})
+        identity["profile"] = resolve_profile(profile).identity()
+        return identity
+
+    def _serve_fallback(self, prompt: str) -> str:
+        metrics.fallback_responses.inc(backend=self.backend)
+        return fallback_responder.respond(prompt)
+
+    def is_fallback(self, prompt: str, response: str) -> bool:
+        return fallback_responder.is_fallback(response)
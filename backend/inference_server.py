@@ -0,0 +1,181 @@
+"""
+Inference Server for MedAI
+Holds the local models in a single process and serves generation to the API
+workers over a Unix domain socket, so the weights are loaded once however
+many workers there are
+"""
+
+import asyncio
+import json
+import os
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+from executor import InferenceExecutor, QueueFullError, InferenceTimeoutError
+from registry import ModelRegistry, UnknownModelError
+from models import BioMedLMModel
+from generation import GenerationProfile
+from profiling import SamplingProfiler, ProfilerBusyError
+import metrics
+import tracing
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/medai-inference.sock"
+
+# Only local models live here; API workers call OpenAI themselves
+model_registry = ModelRegistry({"local": BioMedLMModel}, skip_backends=("openai",))
+
+# Admission control for all API workers together
+inference_executor = InferenceExecutor()
+
+profiler = SamplingProfiler()
+
+# Spans of this process join the API worker's trace through the traceparent header
+tracing.configure("medai-inference")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracing.start()
+    await model_registry.start()
+    yield
+    await model_registry.close()
+    inference_executor.shutdown()
+    tracing.shutdown()
+
+app = FastAPI(title="MedAI Inference Server", version="1.0.0", lifespan=lifespan)
+app.middleware("http")(tracing.trace_requests)
+
+class HistoryMessage(NamedTuple):
+    role: str
+    content: str
+
+class GenerateRequest(BaseModel):
+    prompt: str
+    max_length: Optional[int] = None
+    history: List[dict] = []
+    conversation_id: Optional[str] = None
+    # GenerationProfile.identity() of the API's profile; the default one when missing
+    profile: Optional[dict] = None
+
+def _model(name: str):
+    try:
+        return model_registry.get(name)
+    except UnknownModelError:
+        raise HTTPException(status_code=404, detail="Model not found")
+
+def _generation_args(request: GenerateRequest) -> dict:
+    try:
+        profile = GenerationProfile.from_identity(request.profile) if request.profile else None
+    except TypeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid generation profile: {e}")
+    return {
+        "max_length": request.max_length,
+        "history": [HistoryMessage(message["role"], message["content"]) for message in request.history],
+        "conversation_id": request.conversation_id,
+        "profile": profile,
+    }
+
+@app.post("/models/{name}/generate")
+async def generate(name: str, request: GenerateRequest):
+    model = _model(name)
+    try:
+        with tracing.span("generate", model=name):
+            response = await inference_executor.run(model.generate_response, request.prompt, **_generation_args(request))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except InferenceTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    return {"response": response}
+
+@app.post("/models/{name}/stream")
+async def stream(name: str, request: GenerateRequest):
+    """Stream a generation as NDJSON: {"delta"} lines, then {"response"} or {"error"}"""
+    model = _model(name)
+    try:
+        generation = inference_executor.stream(model.stream_response, request.prompt, **_generation_args(request))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def lines():
+        try:
+            async for delta in generation:
+                yield json.dumps({"delta": delta}) + "\n"
+            yield json.dumps({"response": generation.result()}) + "\n"
+        except InferenceTimeoutError:
+            yield json.dumps({"error": "timeout"}) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming from model '{name}': {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            # Stops generation early if the API worker's client went away
+            generation.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.delete("/models/{name}/conversations/{conversation_id}")
+async def forget_conversation(name: str, conversation_id: str):
+    _model(name).kv_cache.discard(conversation_id)
+    return {"conversation_id": conversation_id}
+
+@app.get("/models")
+async def list_models():
+    stats = model_registry.stats()
+    for name, info in stats["models"].items():
+        info["cache_identity"] = model_registry.get(name).cache_identity()
+    return stats
+
+@app.post("/models/{name}/load", status_code=202)
+async def load_model(name: str):
+    _model(name)
+    model_registry.load(name)
+    return {"model": name, "state": model_registry.get(name).state}
+
+@app.post("/models/{name}/unload")
+async def unload_model(name: str):
+    _model(name)
+    await model_registry.unload(name)
+    return {"model": name, "state": model_registry.get(name).state}
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "pid": os.getpid(), **inference_executor.stats()}
+
+@app.post("/profile")
+async def record_profile(seconds: float = Query(10, gt=0, le=120), interval_ms: float = Query(5, ge=1, le=1000)):
+    """Collapsed stacks of this process; the API's /admin/profile?process=inference forwards here"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (set PROFILER_ENABLED=true)")
+    try:
+        stacks = await asyncio.to_thread(profiler.profile, seconds, interval_ms)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stacks)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+def main(socket_path: str = None):
+    """Serve on INFERENCE_SERVER_SOCKET until interrupted"""
+    import uvicorn
+
+    path = Path(socket_path or os.getenv("INFERENCE_SERVER_SOCKET") or DEFAULT_SOCKET)
+    # A socket file left by a crashed server would make binding fail
+    path.unlink(missing_ok=True)
+    logger.info(f"Inference server listening on {path}")
+    uvicorn.run(app, uds=str(path), log_level="info")
+
+if __name__ == "__main__":
+    main()
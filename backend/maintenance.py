@@ -0,0 +1,329 @@
+"""
+Database Maintenance for MedAI
+Archives and removes conversations past the retention period and deletes
+duplicate messages, in small batches so the API keeps running alongside
+"""
+
+import asyncio
+import gzip
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import select, delete, func, text
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are only serialized on PostgreSQL
+    fcntl = None
+
+import database
+import metrics
+import transfer
+from database import ConversationDB, MessageDB
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant key for pg_try_advisory_lock, so only one process runs maintenance at a time
+MAINTENANCE_LOCK_ID = 72_601_918
+
+class MaintenanceJob:
+    """Keeps the hot tables small.
+
+    Each run:
+
+    1. Deletes duplicate messages (same conversation, role, content and
+       timestamp), keeping the oldest copy.
+    2. Writes conversations not updated for RETENTION_DAYS to compressed
+       archive files under ARCHIVE_PATH (NDJSON.gz, or Parquet with
+       ARCHIVE_FORMAT=parquet, in the export format so setup_db.py --import
+       can restore them), then deletes them. Each batch gets its own file,
+       finished, synced and read back before the batch is deleted, so an
+       interrupted run leaves only complete archives behind.
+    3. Reports how many rows and characters were removed and the table size
+       before and after (running a plain, non-blocking VACUUM ANALYZE on
+       PostgreSQL so freed space is reusable).
+
+    Rows are deleted at most ``batch_size`` per statement and transaction,
+    pausing ``pause_ms`` between batches, so no lock is held for long.
+    With ``interval_hours`` set, start() runs it periodically; a PostgreSQL
+    advisory lock (or a lock file next to the archives) keeps API workers
+    from running it concurrently.
+    """
+
+    def __init__(self, retention_days: float = None, archive_path: str = None, archive_format: str = None,
+                 batch_size: int = None, pause_ms: float = None, interval_hours: float = None,
+                 before_run: Callable[[], Awaitable] = None):
+        self.retention_days = retention_days if retention_days is not None else float(os.getenv("RETENTION_DAYS", "0"))
+        self.archive_path = Path(archive_path if archive_path is not None else os.getenv("ARCHIVE_PATH", "./archive"))
+        self.archive_format = (archive_format or os.getenv("ARCHIVE_FORMAT", "ndjson")).lower()
+        if self.archive_format not in transfer.MEDIA_TYPES:
+            logger.warning(f"Unknown ARCHIVE_FORMAT '{self.archive_format}', using ndjson")
+            self.archive_format = "ndjson"
+        self.batch_size = batch_size or int(os.getenv("MAINTENANCE_BATCH_SIZE", "1000"))
+        self.pause = (pause_ms if pause_ms is not None else float(os.getenv("MAINTENANCE_PAUSE_MS", "50"))) / 1000
+        self.interval = (interval_hours if interval_hours is not None
+                         else float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "0"))) * 3600
+        # Called before each run, e.g. to flush queued writes so none land in deleted conversations
+        self.before_run = before_run
+        self.running = False
+        self.last_report: Optional[dict] = None
+        self._task = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._schedule())
+        logger.info(f"Database maintenance runs every {self.interval / 3600:g}h")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Database maintenance failed: {e}")
+
+    async def run(self) -> Optional[dict]:
+        """Run once; returns the report, or None if another process is running it"""
+        if self.running:
+            return None
+        engine = database.get_engine()
+        async with engine.connect() as lock_connection:
+            if not await self._lock(lock_connection):
+                logger.info("Database maintenance is already running elsewhere, skipping")
+                return None
+            self.running = True
+            try:
+                if self.before_run:
+                    await self.before_run()
+                report = await self._run(engine)
+            finally:
+                self.running = False
+                await self._unlock(lock_connection)
+        self.last_report = report
+        logger.info(
+            f"Database maintenance: archived {report['archived_conversations']} conversations "
+            f"({report['archived_messages']} messages), removed {report['duplicate_messages']} duplicates, "
+            f"{report['content_chars_removed']} characters of message text in {report['duration_s']}s"
+        )
+        return report
+
+    async def _lock(self, connection) -> bool:
+        if connection.dialect.name == "postgresql":
+            locked = await connection.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+            await connection.commit()
+            return bool(locked)
+        if not fcntl:
+            return True
+        self.archive_path.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.archive_path / "maintenance.lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            return False
+
+    async def _unlock(self, connection):
+        if connection.dialect.name == "postgresql":
+            await connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+            await connection.commit()
+        elif fcntl:
+            self._lock_file.close()
+
+    async def _run(self, engine) -> dict:
+        started = time.monotonic()
+        report = {
+            "started_at": datetime.now().isoformat(),
+            "archived_conversations": 0,
+            "archived_messages": 0,
+            "archive_files": [],
+            "duplicate_messages": 0,
+            "content_chars_removed": 0,
+            "table_bytes_before": await self._table_bytes(engine),
+        }
+        # Duplicates go first so they are not archived too
+        await self._dedupe(engine, report)
+        if self.retention_days > 0:
+            await self._archive_expired(engine, report)
+        if engine.dialect.name == "postgresql":
+            # Plain VACUUM takes no exclusive lock; it makes the dead rows' space reusable
+            async with engine.connect() as connection:
+                connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+                await connection.execute(text("VACUUM ANALYZE messages"))
+                await connection.execute(text("VACUUM ANALYZE conversations"))
+        report["table_bytes_after"] = await self._table_bytes(engine)
+        report["duration_s"] = round(time.monotonic() - started, 2)
+        return report
+
+    async def _table_bytes(self, engine) -> Optional[int]:
+        """On-disk size of the chat tables (PostgreSQL), or used pages of the database file (SQLite)"""
+        async with engine.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                # Partitions of messages count towards it too
+                return await connection.scalar(text("""
+                    SELECT coalesce(sum(pg_total_relation_size(oid)), 0) FROM pg_class
+                    WHERE oid IN ('messages'::regclass, 'conversations'::regclass)
+                       OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = 'messages'::regclass)
+                """))
+            if connection.dialect.name == "sqlite":
+                page_size = await connection.scalar(text("PRAGMA page_size"))
+                pages = await connection.scalar(text("PRAGMA page_count"))
+                free = await connection.scalar(text("PRAGMA freelist_count"))
+                return (pages - free) * page_size
+        return None
+
+    async def _delete_messages(self, engine, ids: List[int], lengths: List[int], reason: str, report: dict):
+        for start in range(0, len(ids), self.batch_size):
+            async with engine.begin() as connection:
+                await connection.execute(delete(MessageDB).where(MessageDB.id.in_(ids[start:start + self.batch_size])))
+            chunk = ids[start:start + self.batch_size]
+            report["content_chars_removed"] += sum(lengths[start:start + len(chunk)])
+            metrics.maintenance_deleted.inc(len(chunk), table="messages", reason=reason)
+            await asyncio.sleep(self.pause)
+
+    async def _archive_expired(self, engine, report: dict):
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        # Unique per run, even for two runs started in the same second
+        run_name = f"conversations-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}"
+        while True:
+            async with engine.connect() as connection:
+                # Deleted as we go, so the oldest remaining batch is always next
+                conversation_ids = list((await connection.execute(
+                    select(ConversationDB.id)
+                    .where(ConversationDB.updated_at < cutoff)
+                    .order_by(ConversationDB.updated_at, ConversationDB.id)
+                    .limit(self.batch_size)
+                )).scalars())
+            if not conversation_ids:
+                break
+            archive = _ArchiveWriter(
+                self.archive_path, self.archive_format, f"{run_name}-{len(report['archive_files']) + 1:04d}"
+            )
+            message_ids, lengths = [], []
+            try:
+                async with database.SessionLocal() as session:
+                    async for rows in transfer.iter_message_batches(session, conversation_ids=conversation_ids):
+                        await asyncio.to_thread(archive.write, rows)
+                        message_ids.extend(row.id for row in rows)
+                        lengths.extend(len(row.content) for row in rows)
+                # Footer or gzip trailer written and synced before anything is deleted
+                await asyncio.to_thread(archive.close)
+            except BaseException:
+                await asyncio.to_thread(archive.discard)
+                raise
+            archived = await asyncio.to_thread(archive.read_back)
+            if archived != len(message_ids):
+                raise RuntimeError(
+                    f"Archive {archive.path} holds {archived} messages, expected {len(message_ids)}; nothing deleted"
+                )
+            report["archive_files"].append(str(archive.path))
+
+            # Only what was archived: a turn saved meanwhile is kept, and so is
+            # its conversation, whose updated_at it moved past the cutoff
+            await self._delete_messages(engine, message_ids, lengths, "retention", report)
+            async with engine.begin() as connection:
+                deleted = (await connection.execute(
+                    delete(ConversationDB)
+                    .where(ConversationDB.id.in_(conversation_ids), ConversationDB.updated_at < cutoff)
+                )).rowcount
+            metrics.maintenance_deleted.inc(deleted, table="conversations", reason="retention")
+            report["archived_conversations"] += deleted
+            report["archived_messages"] += len(message_ids)
+
+    async def _dedupe(self, engine, report: dict):
+        """Remove duplicate messages, one page of conversations at a time"""
+        last_id = None
+        while True:
+            async with engine.connect() as connection:
+                query = select(ConversationDB.id).order_by(ConversationDB.id).limit(self.batch_size)
+                if last_id is not None:
+                    query = query.where(ConversationDB.id > last_id)
+                conversation_ids = list((await connection.execute(query)).scalars())
+                if not conversation_ids:
+                    break
+                last_id = conversation_ids[-1]
+                numbered = (
+                    select(
+                        MessageDB.id,
+                        func.length(MessageDB.content).label("length"),
+                        func.row_number().over(
+                            partition_by=(MessageDB.conversation_id, MessageDB.role, MessageDB.content, MessageDB.timestamp),
+                            order_by=MessageDB.id
+                        ).label("copy_number")
+                    )
+                    .where(MessageDB.conversation_id.in_(conversation_ids))
+                    .subquery()
+                )
+                duplicates = (await connection.execute(
+                    select(numbered.c.id, numbered.c.length).where(numbered.c.copy_number > 1)
+                )).all()
+            if duplicates:
+                await self._delete_messages(
+                    engine, [row[0] for row in duplicates], [row[1] or 0 for row in duplicates], "duplicate", report
+                )
+                report["duplicate_messages"] += len(duplicates)
+
+    def stats(self) -> dict:
+        return {
+            "retention_days": self.retention_days or None,
+            "interval_hours": self.interval / 3600 or None,
+            "running": self.running,
+            "last_run": self.last_report,
+        }
+
+class _ArchiveWriter:
+    """One archive file per batch, in the export format"""
+
+    def __init__(self, directory: Path, fmt: str, name: str):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.format = fmt
+        suffix = "parquet" if fmt == "parquet" else "ndjson.gz"
+        self.path = directory / f"{name}.{suffix}"
+        self._raw = open(self.path, "xb")
+        # Parquet is compressed per column already
+        self._out = self._raw if fmt == "parquet" else gzip.GzipFile(fileobj=self._raw, mode="wb")
+        self._encoder = transfer.make_encoder(fmt)
+
+    def write(self, rows: List):
+        self._out.write(self._encoder.encode(rows))
+
+    def close(self):
+        """Finish the file (Parquet footer, gzip trailer) and sync it to disk"""
+        self._out.write(self._encoder.close())
+        if self._out is not self._raw:
+            # Writes the gzip trailer; the underlying file stays open
+            self._out.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+
+    def discard(self):
+        """Remove an archive that could not be finished"""
+        self._raw.close()
+        self.path.unlink(missing_ok=True)
+
+    def read_back(self) -> int:
+        """Messages in the finished file, read the way --import would read it"""
+        if self.format == "parquet":
+            return transfer.parquet_rows(self.path)
+        with gzip.open(self.path, "rb") as lines:
+            return sum(1 for line in lines if line.strip())
@@ -0,0 +1,238 @@
+"""
+Metrics for MedAI
+Minimal Prometheus-style counters and histograms with text exposition
+"""
+
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+# Latency buckets in seconds, from sub-millisecond DB calls to long generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+registry = Registry()
+
+# HTTP
+http_requests = registry.counter(
+    "medai_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")
+)
+http_latency = registry.histogram(
+    "medai_http_request_duration_seconds", "HTTP request latency by route", ("route", "method")
+)
+
+# Generation
+generations = registry.counter(
+    "medai_generations_total", "Model generations by backend and outcome", ("backend", "outcome")
+)
+generation_latency = registry.histogram(
+    "medai_generation_duration_seconds", "Time spent generating a response", ("backend",)
+)
+generation_ttft = registry.histogram(
+    "medai_generation_time_to_first_token_seconds", "Time until the first generated text", ("backend",)
+)
+tokens_generated = registry.counter(
+    "medai_generated_tokens_total", "Tokens generated by backend", ("backend",)
+)
+tokens_per_second = registry.histogram(
+    "medai_generation_tokens_per_second", "Generation throughput per request", ("backend",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+generation_stops = registry.counter(
+    "medai_generation_stops_total", "Generations by profile and what ended them (stop, deadline or complete)",
+    ("backend", "profile", "reason")
+)
+fallback_responses = registry.counter(
+    "medai_fallback_responses_total", "Responses served by the canned fallback responder", ("backend",)
+)
+openai_errors = registry.counter(
+    "medai_openai_errors_total", "Failed OpenAI API calls by error type", ("error",)
+)
+openai_retries = registry.counter(
+    "medai_openai_retries_total", "OpenAI calls retried after a transient error", ("error",)
+)
+openai_hedges = registry.counter(
+    "medai_openai_hedged_requests_total", "Duplicate OpenAI requests sent because the first was slow"
+)
+openai_failovers = registry.counter(
+    "medai_openai_failovers_total", "Requests answered by the local model because OpenAI was unavailable", ("endpoint",)
+)
+
+# Database
+db_latency = registry.histogram(
+    "medai_db_query_duration_seconds", "Database helper latency by operation", ("operation",)
+)
+
+# Retrieval
+retrieval_latency = registry.histogram(
+    "medai_retrieval_duration_seconds", "Retrieval index latency by operation", ("operation",)
+)
+reused_answers = registry.counter(
+    "medai_reused_answers_total", "Chat answers served from a similar earlier question", ("endpoint",)
+)
+
+# Maintenance
+maintenance_deleted = registry.counter(
+    "medai_maintenance_deleted_rows_total", "Rows removed by the maintenance job", ("table", "reason")
+)
+
+def record_generation(backend: str, duration: float, tokens: int, ttft: float = None, fallback: bool = False):
+    """Record one finished generation; ttft defaults to the full duration for non-streaming calls"""
+    generations.inc(backend=backend, outcome="fallback" if fallback else "ok")
+    generation_latency.observe(duration, backend=backend)
+    generation_ttft.observe(duration if ttft is None else ttft, backend=backend)
+    if tokens:
+        tokens_generated.inc(tokens, backend=backend)
+        if duration > 0:
+            tokens_per_second.observe(tokens / duration, backend=backend)
+
+def timed(histogram: Histogram, **labels):
+    """Decorator recording the duration of each call (sync or async) in a histogram"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class GenerationTimer:
+    """Times one generation, including time to first token when streaming"""
+
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.started = time.perf_counter()
+        self.first_token_at = None
+
+    def wrap(self, on_delta):
+        """Wrap a streaming callback so the first delta marks time to first token"""
+        def timed_on_delta(text: str):
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            on_delta(text)
+        return timed_on_delta
+
+    def finish(self, tokens: int, fallback: bool = False):
+        ttft = self.first_token_at - self.started if self.first_token_at is not None else None
+        record_generation(self.backend, time.perf_counter() - self.started, tokens, ttft=ttft, fallback=fallback)
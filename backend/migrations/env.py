@@ -0,0 +1,72 @@
+"""
+Alembic environment for MedAI
+Runs migrations over the app's async engine, either on a connection handed
+in by database.migrate() or on a new engine for DATABASE_URL
+"""
+
+import asyncio
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import text
+
+from database import Base, DATABASE_URL, create_engine_for
+
+config = context.config
+
+# Arbitrary constant key for pg_advisory_lock, so concurrent workers migrate one at a time
+MIGRATION_LOCK_ID = 72_601_917
+
+if config.config_file_name and not config.attributes.get("embedded"):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+def _url() -> str:
+    return config.attributes.get("url") or DATABASE_URL
+
+def run_migrations_offline():
+    """Emit SQL to stdout instead of running it (alembic upgrade head --sql)"""
+    context.configure(
+        url=_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_migrations(connection):
+    postgres = connection.dialect.name == "postgresql"
+    if postgres:
+        # Session-level lock: held across the per-migration transactions
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        connection.commit()
+    try:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite can't alter constraints in place; batch mode rebuilds the table
+            render_as_batch=connection.dialect.name == "sqlite",
+            transaction_per_migration=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        if postgres:
+            connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            connection.commit()
+
+async def run_migrations_online():
+    engine = create_engine_for(_url())
+    try:
+        async with engine.connect() as connection:
+            await connection.run_sync(do_run_migrations)
+    finally:
+        await engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif config.attributes.get("connection") is not None:
+    do_run_migrations(config.attributes["connection"])
+else:
+    asyncio.run(run_migrations_online())
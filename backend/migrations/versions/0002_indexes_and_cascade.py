@@ -0,0 +1,89 @@
+"""Indexes for the chat queries and a cascading foreign key
+
+- messages (conversation_id, timestamp, id) serves the ordered fetch in
+  get_conversation/get_history and the per-conversation counts in the
+  listing; it replaces the single-column idx_messages_conversation_id
+  created by older setup_db.py runs.
+- conversations (updated_at, id) serves the keyset-paginated listing.
+- messages.conversation_id references conversations.id ON DELETE CASCADE,
+  so deleting a conversation is one statement. Orphaned messages are
+  removed first.
+- Timestamps become NOT NULL, as setup_db.py always declared them.
+
+On PostgreSQL the foreign key is added NOT VALID and validated separately,
+and the indexes are built CONCURRENTLY, so large tables stay writable.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+FK_NAME = "fk_messages_conversation_id"
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == "postgresql"
+
+    op.execute(
+        "UPDATE conversations SET "
+        "created_at = COALESCE(created_at, updated_at, CURRENT_TIMESTAMP), "
+        "updated_at = COALESCE(updated_at, created_at, CURRENT_TIMESTAMP) "
+        "WHERE created_at IS NULL OR updated_at IS NULL"
+    )
+    op.execute("UPDATE messages SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+    op.execute(
+        "DELETE FROM messages WHERE NOT EXISTS "
+        "(SELECT 1 FROM conversations WHERE conversations.id = messages.conversation_id)"
+    )
+
+    if postgres:
+        op.alter_column("conversations", "created_at", nullable=False)
+        op.alter_column("conversations", "updated_at", nullable=False)
+        op.alter_column("messages", "timestamp", nullable=False)
+        op.execute(
+            f"ALTER TABLE messages ADD CONSTRAINT {FK_NAME} FOREIGN KEY (conversation_id) "
+            "REFERENCES conversations (id) ON DELETE CASCADE NOT VALID"
+        )
+        # Outside the transaction that added it, validation only blocks schema changes, not writes.
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction at all.
+        with op.get_context().autocommit_block():
+            op.execute(f"ALTER TABLE messages VALIDATE CONSTRAINT {FK_NAME}")
+            op.create_index(
+                "idx_messages_conversation_timestamp", "messages", ["conversation_id", "timestamp", "id"],
+                postgresql_concurrently=True, if_not_exists=True
+            )
+            op.create_index(
+                "idx_conversations_updated_at", "conversations", ["updated_at", "id"],
+                postgresql_concurrently=True, if_not_exists=True
+            )
+            op.drop_index(
+                "idx_messages_conversation_id", table_name="messages",
+                postgresql_concurrently=True, if_exists=True
+            )
+        return
+
+    with op.batch_alter_table("conversations") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+        batch.alter_column("updated_at", existing_type=sa.DateTime(), nullable=False)
+    with op.batch_alter_table("messages", recreate="always") as batch:
+        batch.alter_column("timestamp", existing_type=sa.DateTime(), nullable=False)
+        batch.create_foreign_key(FK_NAME, "conversations", ["conversation_id"], ["id"], ondelete="CASCADE")
+    op.drop_index("idx_messages_conversation_id", table_name="messages", if_exists=True)
+    op.create_index("idx_messages_conversation_timestamp", "messages", ["conversation_id", "timestamp", "id"])
+    op.create_index("idx_conversations_updated_at", "conversations", ["updated_at", "id"])
+
+
+def downgrade():
+    op.drop_index("idx_conversations_updated_at", table_name="conversations")
+    op.drop_index("idx_messages_conversation_timestamp", table_name="messages")
+    op.create_index("idx_messages_conversation_id", "messages", ["conversation_id"])
+    with op.batch_alter_table("messages") as batch:
+        batch.drop_constraint(FK_NAME, type_="foreignkey")
@@ -0,0 +1,105 @@
+"""Optionally partition messages by month (PostgreSQL only)
+
+Applied only when DB_PARTITION_MESSAGES=true at upgrade time; otherwise this
+revision changes nothing. To partition an existing database later, run
+``alembic downgrade 0002`` and then upgrade again with the variable set.
+
+The table is rebuilt as ``PARTITION BY RANGE (timestamp)`` with one
+partition per month (from the oldest message to a few months ahead) and a
+DEFAULT partition for anything outside them. Later months are added with
+``python setup_db.py --create-partitions``. Old months can then be detached
+or dropped as whole partitions instead of deleted row by row. Partitioning
+requires the primary key to include the partition column, so it becomes
+(id, timestamp). Rows are copied in one transaction, so run this during a
+maintenance window on large tables.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+
+import os
+from alembic import op
+
+from database import message_partition_ddl, months_between
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# Months of partitions created ahead of the current one
+MONTHS_AHEAD = 3
+
+
+def _enabled() -> bool:
+    return (
+        op.get_bind().dialect.name == "postgresql"
+        and os.getenv("DB_PARTITION_MESSAGES", "false").lower() == "true"
+    )
+
+
+def _is_partitioned() -> bool:
+    return bool(op.get_bind().exec_driver_sql(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'messages'::regclass"
+    ).scalar())
+
+
+def upgrade():
+    if not _enabled() or _is_partitioned():
+        return
+    bind = op.get_bind()
+    oldest = bind.exec_driver_sql("SELECT MIN(timestamp) FROM messages").scalar()
+
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey")
+    op.execute("""
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            conversation_id VARCHAR NOT NULL,
+            role VARCHAR NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            CONSTRAINT messages_pkey PRIMARY KEY (id, timestamp),
+            CONSTRAINT fk_messages_conversation_id FOREIGN KEY (conversation_id)
+                REFERENCES conversations (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+    for year, month in months_between(oldest, MONTHS_AHEAD):
+        op.execute(message_partition_ddl(year, month))
+    op.execute(
+        "INSERT INTO messages (id, conversation_id, role, content, timestamp) "
+        "SELECT id, conversation_id, role, content, timestamp FROM messages_unpartitioned"
+    )
+    # Keep the id sequence when the old table goes
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("DROP TABLE messages_unpartitioned")
+    # Built after the copy, and on every partition at once
+    op.execute("CREATE INDEX idx_messages_conversation_timestamp ON messages (conversation_id, timestamp, id)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql" or not _is_partitioned():
+        return
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey")
+    op.execute("""
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            conversation_id VARCHAR NOT NULL,
+            role VARCHAR NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            CONSTRAINT messages_pkey PRIMARY KEY (id),
+            CONSTRAINT fk_messages_conversation_id FOREIGN KEY (conversation_id)
+                REFERENCES conversations (id) ON DELETE CASCADE
+        )
+    """)
+    op.execute(
+        "INSERT INTO messages (id, conversation_id, role, content, timestamp) "
+        "SELECT id, conversation_id, role, content, timestamp FROM messages_partitioned"
+    )
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("DROP TABLE messages_partitioned")
+    op.execute("CREATE INDEX idx_messages_conversation_timestamp ON messages (conversation_id, timestamp, id)")
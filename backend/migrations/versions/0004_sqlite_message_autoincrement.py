@@ -0,0 +1,37 @@
+"""Never reuse message ids on SQLite
+
+SQLite hands out max(rowid) + 1, so deleting a conversation frees its
+message ids for the next messages saved, and retrieval index entries of the
+deleted conversation would then point at unrelated messages. The messages
+table is rebuilt with AUTOINCREMENT, which keeps ids increasing. Ids freed
+before this migration may still be reused once; search checks each hit's
+question text against the index for that case.
+
+PostgreSQL ids come from a sequence, which never goes back, so nothing
+changes there.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table("messages", recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+        pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table("messages", recreate="always", table_kwargs={"sqlite_autoincrement": False}):
+        pass
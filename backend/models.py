@@ -0,0 +1,612 @@
+"""
+Model Backends for MedAI
+The local transformers model and the ChatGPT client that requests are
+routed to, shared by the API and the inference server
+"""
+
+import asyncio
+import os
+import gc
+import time
+import logging
+from typing import List
+from transformers import AutoTokenizer, TextStreamer
+import torch
+from dotenv import load_dotenv
+
+from executor import GenerationCancelled
+from openai_client import ResilientOpenAI, OpenAIUnavailable
+from batching import MicroBatcher
+from fallback import FallbackResponder
+import metrics
+import optimization
+from generation import GenerationProfile, StopSequenceFilter, resolve_profile, trim_at_stop
+from context import (
+    ConversationKVCache, KVCacheEntry, select_history, approximate_tokens, HISTORY_TOKEN_BUDGET
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Canned answers used while the local model is unavailable or failing
+fallback_responder = FallbackResponder()
+
+PREAMBLE = "You are a helpful medical AI assistant. Answer medical questions clearly and informatively.\n"
+
+# Earlier messages tokenized per call while picking the history that fits
+HISTORY_ENCODE_BATCH = 8
+
+def _record_stop(backend: str, profile: GenerationProfile, stopped: bool, started: float):
+    """Count what ended a generation that began at ``started`` (a perf_counter time)"""
+    if stopped:
+        reason = "stop"
+    elif profile.deadline_s and time.perf_counter() - started >= profile.deadline_s:
+        reason = "deadline"
+    else:
+        reason = "complete"
+    metrics.generation_stops.inc(backend=backend, profile=profile.name, reason=reason)
+
+class CallbackStreamer(TextStreamer):
+    """Streamer that hands each decoded chunk of new text to a callback"""
+
+    def __init__(self, tokenizer, on_text):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.on_text = on_text
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.on_text(text)
+
+class BioMedLMModel:
+    backend = "local"
+
+    def __init__(self, name: str = "local", model: str = None, optimization_mode: str = None, onnx_path: str = None):
+        self.name = name
+        self.model_name = model or os.getenv("MODEL_NAME", "microsoft/DialoGPT-medium")
+        self.onnx_path = onnx_path
+        self.model = None
+        self.tokenizer = None
+        self.device = os.getenv("MODEL_DEVICE", "auto")
+        if self.device == "auto":
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.batcher = None
+        if os.getenv("BATCH_ENABLED", "false").lower() == "true":
+            self.batcher = MicroBatcher(
+                self._process_batch,
+                max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "8")),
+                window_ms=float(os.getenv("BATCH_WINDOW_MS", "20")),
+                name=f"{name}-batcher"
+            )
+        self.kv_cache = ConversationKVCache()
+        self._preamble_ids = []
+        # Positions the model can attend to, prompt and reply together
+        self.context_limit = None
+        self.optimization = optimization_mode or optimization.get_mode()
+        self._requested_optimization = self.optimization
+        # Loaded later by the model registry so the API can serve immediately
+        self.state = "not_loaded"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load_model(self):
+        self.state = "loading"
+        try:
+            logger.info(f"Loading medical AI model '{self.name}' ({self.model_name})...")
+            model_name = self.model_name
+            tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+            if not tokenizer.is_fast:
+                logger.warning(f"No fast tokenizer for {model_name}; prompt encoding will be slower")
+            # Left padding keeps every prompt's last token aligned for batched generation
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            if self.device == "cpu":
+                logger.info(f"Using {optimization.configure_threads()} CPU threads for inference")
+            model, self.optimization = optimization.load_model(
+                model_name, self.device, self._requested_optimization, self.onnx_path
+            )
+            # Every prompt starts with the preamble, so it is tokenized only once
+            self._preamble_ids = tokenizer.encode(PREAMBLE)
+            self.context_limit = getattr(model.config, "max_position_embeddings", None)
+            # Publish only once fully loaded so requests never see a half-built model
+            self.tokenizer = tokenizer
+            self.model = model
+            self.state = "ready"
+            logger.info(f"Medical model '{self.name}' loaded successfully on {self.device} (optimization: {self.optimization})")
+        except Exception as e:
+            logger.error(f"Error loading model '{self.name}': {e}")
+            # Fallback to a simpler approach
+            self.model = None
+            self.state = "failed"
+
+    def unload(self):
+        """Release the weights; generations still running finish with a fallback answer"""
+        self.state = "not_loaded"
+        self.model = None
+        self.tokenizer = None
+        self._preamble_ids = []
+        self.kv_cache.clear()
+        gc.collect()
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+
+    def memory_bytes(self) -> int:
+        model = self.model
+        return optimization.model_memory_bytes(model) if model is not None else 0
+
+    def describe(self) -> dict:
+        return {
+            "backend": self.backend,
+            "model": self.model_name,
+            "state": self.state,
+            "optimization": self.optimization,
+            "batching": self.batcher.stats() if self.batcher else None,
+            "kv_cache": self.kv_cache.stats(),
+        }
+
+    def generate_response(self, prompt: str, max_length: int = None, history: List = None,
+                          conversation_id: str = None, profile: GenerationProfile = None) -> str:
+        profile = resolve_profile(profile, max_length)
+
+        if not self.model or not self.tokenizer:
+            return self._serve_fallback(prompt)
+
+        history = history or []
+        entry = self._take_cached(conversation_id, history, profile)
+        if self.batcher and not entry:
+            # Wait for a shared forward pass with other concurrent requests
+            return self.batcher.submit((prompt, profile, history)).result()
+
+        return self._generate_one(prompt, profile, history, conversation_id, entry)
+
+    def _take_cached(self, conversation_id: str, history: List, profile: GenerationProfile) -> KVCacheEntry:
+        # Beam search keeps a cache per beam, so those generations start from the full prompt
+        if not conversation_id or profile.num_beams > 1:
+            return None
+        return self.kv_cache.take(conversation_id, history)
+
+    def _process_batch(self, items: List[tuple]) -> List[str]:
+        """Generate a collected batch, grouping prompts by generation profile"""
+        results = [None] * len(items)
+        groups = {}
+        for index, (prompt, profile, history) in enumerate(items):
+            groups.setdefault(profile, []).append(index)
+
+        for profile, indices in groups.items():
+            responses = self.generate_batch(
+                [items[i][0] for i in indices], profile, [items[i][2] for i in indices]
+            )
+            for i, response in zip(indices, responses):
+                results[i] = response
+        return results
+
+    @staticmethod
+    def _format_turn(role: str, content: str) -> str:
+        # Simple conversational prompt format, appended to the preamble turn by turn
+        if role == "user":
+            return f"\nUser: {content}\nAssistant:"
+        return f" {content}"
+
+    def _encode_prompt(self, prompt: str, history: List, profile: GenerationProfile) -> List[int]:
+        """Token ids of the preamble, the recent history that fits and the new user turn.
+
+        The preamble was tokenized at load time and each turn is tokenized
+        once, so only the new text costs anything.
+        """
+        prompt_ids = self._encode_turns([("user", prompt)])[0]
+        budget = HISTORY_TOKEN_BUDGET
+        if self.context_limit:
+            # Whole earlier turns are dropped before anything is cut
+            budget = min(budget, self._input_limit(profile) - len(self._preamble_ids) - len(prompt_ids))
+        token_ids = list(self._preamble_ids)
+        for ids in self._history_ids(history, budget):
+            token_ids.extend(ids)
+        token_ids.extend(prompt_ids)
+        return self._cap_input(token_ids, profile)
+
+    def _encode_turns(self, turns: List[tuple]) -> List[List[int]]:
+        """Token ids of (role, content) turns, in one batch call to the Rust tokenizer when there is one"""
+        texts = [self._format_turn(role, content) for role, content in turns]
+        if self.tokenizer.is_fast:
+            return [encoding.ids for encoding in self.tokenizer.backend_tokenizer.encode_batch(texts, add_special_tokens=False)]
+        return [self.tokenizer.encode(text, add_special_tokens=False) for text in texts]
+
+    def _history_ids(self, history: List, budget: int) -> List[List[int]]:
+        """Token ids of the most recent turns that fit in ``budget`` tokens, oldest first.
+
+        Selects like context.select_history, counting the formatted turns
+        instead of their bare content so the counts are the ids used.
+        Messages are encoded newest first, HISTORY_ENCODE_BATCH at a time,
+        and encoding stops once the budget is spent.
+        """
+        selected = []
+        used = 0
+        end = len(history)
+        while end > 0:
+            start = max(end - HISTORY_ENCODE_BATCH, 0)
+            batch = history[start:end]
+            encoded = self._encode_turns([(message.role, message.content) for message in batch])
+            for message, ids in zip(reversed(batch), reversed(encoded)):
+                if used + len(ids) > budget:
+                    start = 0
+                    break
+                selected.append((message.role, ids))
+                used += len(ids)
+            end = start
+        selected.reverse()
+        while selected and selected[0][0] != "user":
+            selected.pop(0)
+        return [ids for _, ids in selected]
+
+    def _cap_input(self, token_ids: List[int], profile: GenerationProfile) -> List[int]:
+        """Cut the text after the preamble from the front so the prompt leaves room for the reply.
+
+        At least a quarter of the context is kept for the reply (less if the
+        profile asks for fewer tokens); _fit_context shortens longer replies.
+        """
+        if not self.context_limit:
+            return token_ids
+        limit = self._input_limit(profile)
+        if len(token_ids) <= limit:
+            return token_ids
+        logger.warning(f"Prompt of {len(token_ids)} tokens cut to {limit} to fit the model's context")
+        keep = max(limit - len(self._preamble_ids), 1)
+        return self._preamble_ids[:limit - keep] + token_ids[-keep:]
+
+    def _input_limit(self, profile: GenerationProfile) -> int:
+        return self.context_limit - min(profile.max_new_tokens, self.context_limit // 4)
+
+    def _left_pad(self, encoded: List[List[int]]) -> dict:
+        """Batch tensors for already-encoded prompts, padded on the left"""
+        length = max(len(ids) for ids in encoded)
+        input_ids = torch.full((len(encoded), length), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(encoded), length), dtype=torch.long)
+        for row, ids in enumerate(encoded):
+            input_ids[row, length - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, length - len(ids):] = 1
+        return {"input_ids": input_ids.to(self.device), "attention_mask": attention_mask.to(self.device)}
+
+    def _generate(self, inputs, profile: GenerationProfile, **kwargs):
+        """Run generate() with the profile's settings.
+
+        Stop sequences and the deadline become transformers stopping criteria
+        (StopStringCriteria and MaxTimeCriteria), checked after every token.
+        """
+        settings = {"do_sample": profile.do_sample, "num_beams": profile.num_beams}
+        if profile.do_sample:
+            settings.update(temperature=profile.temperature, top_p=profile.top_p)
+        if profile.stop:
+            settings.update(stop_strings=list(profile.stop), tokenizer=self.tokenizer)
+        if profile.deadline_s:
+            settings["max_time"] = profile.deadline_s
+        with torch.no_grad():
+            return self.model.generate(
+                inputs["input_ids"],
+                max_new_tokens=profile.max_new_tokens,
+                repetition_penalty=1.1,
+                pad_token_id=self.tokenizer.pad_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                attention_mask=inputs["attention_mask"],
+                **settings,
+                **kwargs
+            )
+
+    def _fit_context(self, profile: GenerationProfile, prompt_tokens: int) -> GenerationProfile:
+        """Lower the profile's token cap so prompt and reply fit in the model's context"""
+        if self.context_limit and prompt_tokens + profile.max_new_tokens > self.context_limit:
+            return profile._replace(max_new_tokens=max(self.context_limit - prompt_tokens, 1))
+        return profile
+
+    def generate_batch(self, prompts: List[str], profile: GenerationProfile = None,
+                       histories: List[List] = None) -> List[str]:
+        profile = resolve_profile(profile)
+        try:
+            timer = metrics.GenerationTimer(self.backend)
+            histories = histories or [[] for _ in prompts]
+            inputs = self._left_pad([
+                self._encode_prompt(prompt, history, profile) for prompt, history in zip(prompts, histories)
+            ])
+            outputs = self._generate(inputs, self._fit_context(profile, inputs["input_ids"].shape[1]))
+            
+            # Decode the generated tokens (only the new ones)
+            generated_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+            decoded = self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+            token_counts = (generated_tokens != self.tokenizer.pad_token_id).sum(dim=1).tolist()
+            
+            responses = []
+            for prompt, response, token_count in zip(prompts, decoded, token_counts):
+                response, stopped = trim_at_stop(response, profile.stop)
+                response = response.strip()
+                # If response is empty or too short, use fallback
+                too_short = not response or len(response) < 10
+                _record_stop(self.backend, profile, stopped, timer.started)
+                timer.finish(token_count, fallback=too_short)
+                if too_short:
+                    response = self._serve_fallback(prompt)
+                # Return response without medical disclaimer
+                responses.append(response)
+            return responses
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return [self._serve_fallback(prompt) for prompt in prompts]
+
+    def _generate_one(self, prompt: str, profile: GenerationProfile, history: List, conversation_id: str = None,
+                      entry: KVCacheEntry = None, on_delta=None) -> str:
+        """Generate for a single conversation, reusing its KV cache when possible.
+
+        With a cache entry only the new user turn is encoded; the earlier
+        context comes from the cached attention keys and values. Once the
+        cached context outgrows HISTORY_TOKEN_BUDGET the prompt is rebuilt
+        from the most recent turns that fit.
+        """
+        try:
+            timer = metrics.GenerationTimer(self.backend)
+            stream = None
+            if on_delta:
+                on_delta = timer.wrap(on_delta)
+                stream = StopSequenceFilter(on_delta, profile.stop)
+
+            past_key_values = None
+            if entry and len(entry.token_ids) - len(self._preamble_ids) <= HISTORY_TOKEN_BUDGET:
+                token_ids = entry.token_ids + self._encode_turns([("user", prompt)])[0]
+                past_key_values = entry.past_key_values
+                if self.context_limit and len(token_ids) + profile.max_new_tokens > self.context_limit:
+                    past_key_values = None
+            if past_key_values is None:
+                token_ids = self._encode_prompt(prompt, history, profile)
+
+            input_ids = torch.tensor([token_ids], device=self.device)
+            inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+            kwargs = {"return_dict_in_generate": True}
+            if past_key_values is not None:
+                kwargs["past_key_values"] = past_key_values
+            # Beam search only settles on its text at the end, so it is sent in one piece
+            if stream and profile.num_beams == 1:
+                kwargs["streamer"] = CallbackStreamer(self.tokenizer, stream)
+            outputs = self._generate(inputs, self._fit_context(profile, len(token_ids)), **kwargs)
+
+            sequence = outputs.sequences[0]
+            generated_tokens = sequence[len(token_ids):]
+            response, stopped = trim_at_stop(
+                self.tokenizer.decode(generated_tokens, skip_special_tokens=True), profile.stop
+            )
+            kept_tokens = self._tokens_within(generated_tokens, len(response)) if stopped else len(generated_tokens)
+            response = response.strip()
+            too_short = not response or len(response) < 10
+            _record_stop(self.backend, profile, stopped, timer.started)
+            timer.finish(int((generated_tokens != self.tokenizer.pad_token_id).sum()), fallback=too_short)
+            if too_short:
+                response = self._serve_fallback(prompt)
+            if stream:
+                if profile.num_beams > 1:
+                    stream(response)
+                stream.flush()
+            if too_short:
+                return response
+
+            if conversation_id and profile.num_beams == 1:
+                self._remember(conversation_id, sequence[:len(token_ids) + kept_tokens], outputs.past_key_values,
+                               prompt, response)
+            return response
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return self._serve_fallback(prompt)
+
+    def _tokens_within(self, generated_tokens, length: int) -> int:
+        """How many generated tokens decode to at most ``length`` characters, i.e. end before a stop sequence"""
+        count = len(generated_tokens)
+        while count and len(self.tokenizer.decode(generated_tokens[:count], skip_special_tokens=True)) > length:
+            count -= 1
+        return count
+
+    def _remember(self, conversation_id: str, sequence, past_key_values, prompt: str, response: str):
+        if self.optimization == "onnx":
+            # ONNX Runtime keeps its own cache format, which cannot be cropped and resumed
+            return
+        token_ids = sequence.tolist()
+        # Drop trailing end-of-text tokens so the next turn follows the reply directly
+        while token_ids and token_ids[-1] in (self.tokenizer.eos_token_id, self.tokenizer.pad_token_id):
+            token_ids.pop()
+        if hasattr(past_key_values, "crop") and past_key_values.get_seq_length() > len(token_ids):
+            past_key_values.crop(len(token_ids))
+        self.kv_cache.put(conversation_id, KVCacheEntry(token_ids, past_key_values, prompt, response))
+
+    def stream_response(self, prompt: str, on_delta, max_length: int = None, history: List = None,
+                        conversation_id: str = None, profile: GenerationProfile = None) -> str:
+        """Generate a response, passing text to on_delta as tokens are produced.
+
+        Streaming requests bypass micro-batching. Returns the final response,
+        which is the fallback text if generation fails or comes back too short.
+        """
+        profile = resolve_profile(profile, max_length)
+
+        if not self.model or not self.tokenizer:
+            response = self._serve_fallback(prompt)
+            on_delta(response)
+            return response
+
+        history = history or []
+        entry = self._take_cached(conversation_id, history, profile)
+        return self._generate_one(prompt, profile, history, conversation_id, entry, on_delta=on_delta)
+
+    def cache_identity(self, profile: GenerationProfile = None) -> dict:
+        """Model and generation settings that responses are cached under"""
+        return {
+            "backend": "local",
+            "model": self.model_name,
+            "optimization": self.optimization,
+            "profile": resolve_profile(profile).identity(),
+        }
+
+    def _serve_fallback(self, prompt: str) -> str:
+        metrics.fallback_responses.inc(backend=self.backend)
+        return self._fallback_response(prompt)
+
+    def is_fallback(self, prompt: str, response: str) -> bool:
+        return fallback_responder.is_fallback(response)
+
+    def _fallback_response(self, prompt: str) -> str:
+        """Fallback response when model is not available"""
+        return fallback_responder.respond(prompt)
+
+class ChatGPTModel:
+    backend = "openai"
+    # Generation methods are coroutines and run on the event loop, not the inference executor
+    is_async = True
+
+    def __init__(self, name: str = "openai", model: str = None):
+        self.name = name
+        self.client = None
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.model_name = model or os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+    @property
+    def state(self) -> str:
+        return "ready" if self.client else "not_loaded"
+
+    @property
+    def ready(self) -> bool:
+        return self.client is not None
+
+    def load_model(self):
+        """Create the pooled client; called at startup so it lives on the server's event loop"""
+        try:
+            if not self.api_key:
+                logger.error("OpenAI API key not found")
+                return
+            
+            self.client = ResilientOpenAI(self.api_key)
+            logger.info(f"ChatGPT client '{self.name}' initialized with model: {self.model_name}")
+        except Exception as e:
+            logger.error(f"Error initializing ChatGPT client: {e}")
+            self.client = None
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def unload(self):
+        await self.close()
+
+    def available(self) -> bool:
+        """False while the circuit breaker is refusing calls"""
+        return bool(self.client) and self.client.breaker.available()
+
+    def describe(self) -> dict:
+        return {
+            "backend": self.backend,
+            "model": self.model_name,
+            "state": self.state,
+            "openai": self.client.stats() if self.client else None,
+        }
+
+    def _build_messages(self, prompt: str, history: List = None) -> List[dict]:
+        earlier = select_history(history or [], HISTORY_TOKEN_BUDGET, approximate_tokens)
+        return [
+            {
+                "role": "system",
+                "content": "You are a medical AI assistant. Provide brief, concise medical information. Keep responses short - 1-2 sentences maximum. Be direct and to the point. Always remind users to consult healthcare professionals for serious concerns."
+            },
+            *({"role": message.role, "content": message.content} for message in earlier),
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    def _request_params(self, prompt: str, history: List, profile: GenerationProfile) -> dict:
+        params = {
+            "model": self.model_name,
+            "messages": self._build_messages(prompt, history),
+            "max_tokens": profile.openai_max_tokens,
+            # The API has no beam search; greedy profiles ask for its most likely tokens
+            "temperature": profile.temperature if profile.do_sample else 0,
+            "top_p": profile.top_p,
+        }
+        if profile.stop:
+            # The API accepts at most four
+            params["stop"] = list(profile.stop[:4])
+        return params
+
+    async def generate_response(self, prompt: str, max_length: int = None, history: List = None,
+                                conversation_id: str = None, profile: GenerationProfile = None) -> str:
+        """Generate a ChatGPT response; raises OpenAIUnavailable so callers can fail over.
+
+        Missing the profile's deadline counts as unavailable too, so the
+        local model can answer instead.
+        """
+        if not self.client:
+            raise OpenAIUnavailable("OpenAI client is not configured")
+
+        profile = resolve_profile(profile, max_length)
+        timer = metrics.GenerationTimer(self.backend)
+        try:
+            response = await asyncio.wait_for(
+                self.client.create(**self._request_params(prompt, history, profile)), profile.deadline_s or None
+            )
+        except asyncio.TimeoutError:
+            _record_stop(self.backend, profile, False, timer.started)
+            raise OpenAIUnavailable(f"No response within the '{profile.name}' deadline of {profile.deadline_s:g}s")
+        _record_stop(self.backend, profile, False, timer.started)
+        timer.finish(response.usage.completion_tokens if response.usage else 0)
+        return response.choices[0].message.content.strip()
+
+    async def stream_response(self, prompt: str, on_delta, max_length: int = None, history: List = None,
+                              conversation_id: str = None, profile: GenerationProfile = None) -> str:
+        """Stream a ChatGPT response, passing each content delta to on_delta.
+
+        Raises OpenAIUnavailable like generate_response; by then some deltas
+        may already have been passed on. At the profile's deadline the
+        stream is cut off and the text so far is the response.
+        """
+        if not self.client:
+            raise OpenAIUnavailable("OpenAI client is not configured")
+
+        profile = resolve_profile(profile, max_length)
+        timer = metrics.GenerationTimer(self.backend)
+        on_delta = timer.wrap(on_delta)
+        parts = []
+
+        def collect(text: str):
+            parts.append(text)
+            on_delta(text)
+
+        try:
+            await asyncio.wait_for(
+                self.client.stream(collect, **self._request_params(prompt, history, profile)),
+                profile.deadline_s or None
+            )
+        except asyncio.TimeoutError:
+            if not parts:
+                raise OpenAIUnavailable(f"No response within the '{profile.name}' deadline of {profile.deadline_s:g}s")
+        _record_stop(self.backend, profile, False, timer.started)
+        # Each streamed chunk carries roughly one token
+        timer.finish(len(parts))
+        return "".join(parts).strip()
+
+    def cache_identity(self, profile: GenerationProfile = None) -> dict:
+        """Model and generation settings that responses are cached under"""
+        return {
+            "backend": "openai",
+            "model": self.model_name,
+            "profile": resolve_profile(profile).identity(),
+        }
+
+    def _serve_fallback(self, prompt: str) -> str:
+        metrics.fallback_responses.inc(backend=self.backend)
+        return self._fallback_response(prompt)
+
+    def is_fallback(self, prompt: str, response: str) -> bool:
+        return response == self._fallback_response(prompt)
+
+    def _fallback_response(self, prompt: str) -> str:
+        """Fallback response when ChatGPT is not available"""
+        return "I'm sorry, I'm having trouble connecting right now. Please consult a healthcare professional for medical advice."
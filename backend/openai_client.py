@@ -0,0 +1,248 @@
+"""
+Resilient OpenAI Client for MedAI
+Async chat completions over a pooled HTTP client with retries, a circuit
+breaker and optional request hedging
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import logging
+from typing import Callable, List
+import httpx
+import openai
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Errors worth another attempt: rate limits, server errors, timeouts and dropped connections
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError, httpx.TransportError)
+
+class OpenAIUnavailable(Exception):
+    """Raised when OpenAI could not answer; callers should fail over"""
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused for ``reset_timeout`` seconds. Then a single trial call
+    is let through (half-open): success closes the circuit, failure opens it
+    again for another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Admit a call: returns the state it was admitted in, or None if refused.
+
+        Only one call is admitted while half-open; it must end with
+        record_success(), record_failure() or release().
+        """
+        with self._lock:
+            state = self._state()
+            if state == "half_open":
+                if self._trial_running:
+                    return None
+                self._trial_running = True
+            return state if state != "open" else None
+
+    def available(self) -> bool:
+        """True if a call would be admitted now, without admitting one"""
+        with self._lock:
+            state = self._state()
+            return state == "closed" or (state == "half_open" and not self._trial_running)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            trial = self._trial_running
+            self._trial_running = False
+            if trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = self._clock()
+                self._times_opened += 1
+                logger.warning(f"OpenAI circuit opened after {self._failures} consecutive failures")
+
+    def release(self):
+        """End the half-open trial call without a verdict (e.g. it was cancelled)"""
+        with self._lock:
+            self._trial_running = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._state(),
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+            }
+
+class ResilientOpenAI:
+    """AsyncOpenAI with a shared connection pool and our own retry policy.
+
+    The SDK's built-in retries are turned off so that retries, the circuit
+    breaker and hedging all see the same attempts. OPENAI_BASE_URL is
+    honoured by the SDK, which is how benchmarks point it at the mock server.
+    """
+
+    def __init__(self, api_key: str):
+        timeout = httpx.Timeout(
+            float(os.getenv("OPENAI_TIMEOUT", "30")),
+            connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+        )
+        max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.client = openai.AsyncOpenAI(api_key=api_key, http_client=self._http, max_retries=0, timeout=timeout)
+        self.max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+        self.backoff_base = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+        self.backoff_max = float(os.getenv("OPENAI_BACKOFF_MAX", "8"))
+        # Send a duplicate request if the first has not answered after this long (0 disables)
+        self.hedge_after = float(os.getenv("OPENAI_HEDGE_AFTER_MS", "0")) / 1000
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("OPENAI_BREAKER_RESET", "30"))
+        )
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After on rate limits"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    async def _call(self, operation):
+        """Run ``operation`` through the breaker and retry policy"""
+        admitted = self.breaker.allow()
+        if admitted is None:
+            raise OpenAIUnavailable("OpenAI circuit is open")
+        trial = admitted == "half_open"
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = await operation()
+                except RETRYABLE_ERRORS as e:
+                    metrics.openai_errors.inc(error=type(e).__name__)
+                    if attempt >= self.max_retries or getattr(e, "retryable", True) is False:
+                        self.breaker.record_failure()
+                        raise OpenAIUnavailable(f"OpenAI request failed after {attempt + 1} attempts: {e}") from e
+                    delay = self._backoff(attempt, e)
+                    attempt += 1
+                    metrics.openai_retries.inc(error=type(e).__name__)
+                    logger.warning(f"OpenAI request failed ({type(e).__name__}), retry {attempt} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                except openai.OpenAIError as e:
+                    # Bad requests and auth errors won't improve with retries and say nothing about availability
+                    metrics.openai_errors.inc(error=type(e).__name__)
+                    if trial:
+                        self.breaker.release()
+                    raise OpenAIUnavailable(f"OpenAI request rejected: {e}") from e
+                self.breaker.record_success()
+                return result
+        except asyncio.CancelledError:
+            if trial:
+                self.breaker.release()
+            raise
+
+    async def _hedged(self, make_request):
+        """Await ``make_request()``, racing a second copy if the first is slow"""
+        if not self.hedge_after:
+            return await make_request()
+        tasks = [asyncio.ensure_future(make_request())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                metrics.openai_hedges.inc()
+                tasks.append(asyncio.ensure_future(make_request()))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing request (or both, if we were cancelled) is abandoned
+            for task in tasks:
+                task.cancel()
+
+    async def create(self, **params):
+        """Non-streaming chat completion"""
+        return await self._call(lambda: self._hedged(lambda: self.client.chat.completions.create(**params)))
+
+    async def stream(self, on_delta: Callable[[str], None], **params) -> List[str]:
+        """Streaming chat completion, passing each content delta to on_delta.
+
+        Only attempts that fail before producing any text are retried; after
+        that the partial text has already reached the client.
+        """
+        parts = []
+
+        async def attempt():
+            stream = await self.client.chat.completions.create(stream=True, **params)
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        on_delta(delta)
+            except RETRYABLE_ERRORS as e:
+                if parts:
+                    # Don't repeat text the client has already received
+                    e.retryable = False
+                raise
+            finally:
+                await stream.close()
+            return parts
+
+        return await self._call(attempt)
+
+    def stats(self) -> dict:
+        return {"circuit": self.breaker.stats(), "hedge_after_ms": self.hedge_after * 1000}
+
+    async def aclose(self):
+        await self._http.aclose()
@@ -0,0 +1,130 @@
+"""
+CPU Inference Optimization for MedAI
+Loads the local model as float32, bf16, dynamically quantized int8 or ONNX
+"""
+
+import os
+import logging
+import torch
+from torch import nn
+from transformers import AutoModelForCausalLM
+from transformers.pytorch_utils import Conv1D
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MODES = ("none", "bf16", "int8", "onnx")
+
+def get_mode() -> str:
+    mode = os.getenv("MODEL_OPTIMIZATION", "none").lower()
+    if mode not in MODES:
+        logger.warning(f"Unknown MODEL_OPTIMIZATION '{mode}', using none")
+        return "none"
+    return mode
+
+def configure_threads():
+    """Apply MODEL_NUM_THREADS / MODEL_INTEROP_THREADS to torch (0 keeps the default)"""
+    num_threads = int(os.getenv("MODEL_NUM_THREADS", "0"))
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    interop_threads = int(os.getenv("MODEL_INTEROP_THREADS", "0"))
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only allowed before any inter-op parallel work has started
+            logger.warning("MODEL_INTEROP_THREADS ignored: torch thread pools already started")
+    return torch.get_num_threads()
+
+def cpu_supports_bf16() -> bool:
+    """True when the CPU has native bf16 instructions (AVX512-BF16 or AMX)"""
+    checks = ("_is_avx512_bf16_supported", "_is_amx_tile_supported")
+    return any(getattr(torch.cpu, name, lambda: False)() for name in checks)
+
+def _conv1d_to_linear(model: nn.Module):
+    """Swap GPT-2 style Conv1D layers for nn.Linear so dynamic quantization covers them"""
+    for name, module in list(model.named_children()):
+        if isinstance(module, Conv1D):
+            linear = nn.Linear(module.weight.shape[0], module.weight.shape[1])
+            linear.weight = nn.Parameter(module.weight.detach().t().contiguous())
+            linear.bias = nn.Parameter(module.bias.detach())
+            setattr(model, name, linear)
+        else:
+            _conv1d_to_linear(module)
+
+def _load_onnx(model_name: str, export_dir: str):
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError:
+        logger.error("MODEL_OPTIMIZATION=onnx requires optimum[onnxruntime]; loading the PyTorch model instead")
+        return None
+    if export_dir and os.path.isdir(export_dir):
+        return ORTModelForCausalLM.from_pretrained(export_dir, use_cache=True)
+    model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+    if export_dir:
+        # Keep the exported graph so later starts skip the export
+        model.save_pretrained(export_dir)
+    return model
+
+def load_model(model_name: str, device: str, mode: str = None, onnx_path: str = None):
+    """Load ``model_name`` for inference on ``device`` with the given optimization.
+
+    Returns ``(model, mode)`` where mode is the optimization actually applied;
+    unsupported combinations fall back to "none" with a warning. ``onnx_path``
+    keeps the exported ONNX graph between starts (default MODEL_ONNX_PATH).
+    """
+    mode = mode or get_mode()
+    if onnx_path is None:
+        onnx_path = os.getenv("MODEL_ONNX_PATH", "")
+    if mode != "none" and device != "cpu" and mode != "bf16":
+        logger.warning(f"MODEL_OPTIMIZATION={mode} only applies on CPU, ignoring it on {device}")
+        mode = "none"
+    if mode == "bf16" and device == "cpu" and not cpu_supports_bf16():
+        logger.warning("This CPU has no native bf16 support, using float32")
+        mode = "none"
+
+    if mode == "onnx":
+        model = _load_onnx(model_name, onnx_path)
+        if model is not None:
+            return model, mode
+        mode = "none"
+
+    if mode == "bf16":
+        dtype = torch.bfloat16
+    else:
+        dtype = torch.float16 if device == "cuda" else torch.float32
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=dtype, low_cpu_mem_usage=True)
+    model.to(device)
+    model.eval()
+
+    if mode == "int8":
+        _conv1d_to_linear(model)
+        # Weights are stored as int8; activations are quantized on the fly per batch
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    return model, mode
+
+def model_memory_bytes(model) -> int:
+    """Approximate memory held by a loaded model's weights and buffers"""
+    if isinstance(model, nn.Module):
+        total = 0
+        seen = set()
+        for value in model.state_dict().values():
+            # Dynamically quantized layers store (weight, bias) tuples
+            for tensor in value if isinstance(value, tuple) else (value,):
+                if not torch.is_tensor(tensor) or tensor.data_ptr() in seen:
+                    continue
+                # Tied weights (e.g. GPT-2's input and output embeddings) are counted once
+                seen.add(tensor.data_ptr())
+                total += tensor.numel() * tensor.element_size()
+        return total
+    # ONNX Runtime models: size of the graph and weight files
+    model_dir = getattr(model, "model_save_dir", None)
+    if model_dir and os.path.isdir(model_dir):
+        return sum(
+            os.path.getsize(os.path.join(model_dir, name)) for name in os.listdir(model_dir)
+            if os.path.isfile(os.path.join(model_dir, name))
+        )
+    return 0
@@ -0,0 +1,81 @@
+"""
+Sampling Profiler for MedAI
+Records where every thread of the process spends its time for a few seconds
+and reports it as collapsed stacks, the text format flame graph tools read
+"""
+
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval.
+
+    The event loop and the inference worker threads are sampled alike, so a
+    profile shows both request handling and generation. The output has one
+    ``thread;outermost;...;innermost count`` line per distinct stack and
+    loads directly into speedscope or flamegraph.pl. Sampling costs the
+    process roughly one stack walk per thread per interval while it runs,
+    and nothing otherwise; PROFILER_ENABLED must be set for the admin
+    endpoint to start it.
+    """
+
+    def __init__(self, enabled: bool = None, max_seconds: float = None):
+        self.enabled = enabled if enabled is not None else os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+        self.max_seconds = max_seconds or float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+        self._lock = threading.Lock()
+        self.running = False
+        self.last_run = None
+
+    def profile(self, seconds: float, interval_ms: float = 5) -> str:
+        """Sample for ``seconds`` (blocking the calling thread) and return the collapsed stacks"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already being recorded")
+        try:
+            self.running = True
+            seconds = min(seconds, self.max_seconds)
+            interval = max(interval_ms, 1) / 1000
+            stacks = Counter()
+            own_thread = threading.get_ident()
+            names = {}
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                for ident, frame in sys._current_frames().items():
+                    if ident != own_thread:
+                        stacks[(names.get(ident, str(ident)),) + _frames(frame)] += 1
+                samples += 1
+                time.sleep(interval)
+            self.last_run = {"seconds": seconds, "interval_ms": interval * 1000, "samples": samples,
+                             "stacks": len(stacks)}
+            logger.info(f"Profiled for {seconds}s: {samples} samples, {len(stacks)} distinct stacks")
+            return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self.running = False
+            self._lock.release()
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "running": self.running, "last_run": self.last_run}
+
+def _frames(frame) -> tuple:
+    """Frame labels from the outermost call to ``frame``"""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    # ';' separates frames in the collapsed format
+    return tuple(label.replace(";", ":") for label in reversed(labels))
@@ -0,0 +1,312 @@
+"""
+Model Registry for MedAI
+Named model backends that can be loaded and unloaded at runtime, with
+request routing rules and a memory budget for local models
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class UnknownModelError(KeyError):
+    """Raised for a model name that is not in the registry"""
+
+class ModelNotLoadedError(Exception):
+    """Raised when a requested model is not loaded; loading has been started"""
+
+class RouteRule(NamedTuple):
+    """Send prompts matching every given condition to ``model``"""
+    model: str
+    min_chars: int = 0
+    max_chars: Optional[int] = None
+    # Fallback topic names (see fallback_rules.json); any one of them must match
+    topics: Tuple[str, ...] = ()
+
+    def matches(self, prompt: str, topics: Callable[[], set]) -> bool:
+        if len(prompt) < self.min_chars:
+            return False
+        if self.max_chars is not None and len(prompt) > self.max_chars:
+            return False
+        return not self.topics or bool(topics() & set(self.topics))
+
+class ModelRegistry:
+    """Holds the model backends requests can be routed to.
+
+    The built-in ``local`` (MODEL_NAME) and ``openai`` (OPENAI_MODEL) models
+    are always registered. MODEL_REGISTRY_PATH may name a JSON file adding
+    more and choosing the default and routing rules::
+
+        {"default": "local",
+         "models": {"small": {"backend": "local", "model": "distilgpt2",
+                              "optimization_mode": "int8", "preload": true},
+                    "gpt-4o": {"backend": "openai", "model": "gpt-4o"}},
+         "routes": [{"model": "small", "max_chars": 120},
+                    {"model": "gpt-4o", "topics": ["cancer"]}]}
+
+    Requests naming a model use it; otherwise the first route whose model is
+    ready and whose conditions match wins, then the default. A local model
+    that is not loaded is loaded when first requested by name or through the
+    admin API. When the loaded local models exceed MODEL_MEMORY_BUDGET_MB the
+    least recently used ones are unloaded; the default model is never
+    evicted.
+
+    Local models may also live in another process (see inference_server.py):
+    their classes set ``is_async`` like the OpenAI backend, and that process
+    does the loading and eviction. ``skip_backends`` names backends another
+    process serves, which are left out without complaint.
+    """
+
+    def __init__(self, factories: Dict[str, Callable[..., object]], config_path: str = None,
+                 topic_matcher: Callable[[str], List] = None, memory_budget_mb: float = None,
+                 skip_backends: Tuple[str, ...] = ()):
+        self.factories = factories
+        self.config_path = config_path if config_path is not None else os.getenv("MODEL_REGISTRY_PATH", "")
+        self.topic_matcher = topic_matcher
+        budget = memory_budget_mb if memory_budget_mb is not None else float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+        self.memory_budget = int(budget * 1024 * 1024)
+        self.models: Dict[str, object] = {}
+        self.routes: List[RouteRule] = []
+        self._preload: List[str] = []
+        self._last_used: Dict[str, float] = {}
+        self._memory: Dict[str, int] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._evictions = 0
+
+        config = self._read_config()
+        specs = {
+            "local": {"backend": "local", "preload": True},
+            "openai": {"backend": "openai", "preload": True},
+            **config.get("models", {}),
+        }
+        for name, spec in specs.items():
+            spec = dict(spec)
+            backend = spec.pop("backend", "local")
+            if backend in skip_backends:
+                continue
+            if backend not in factories:
+                logger.error(f"Model '{name}' has unknown backend '{backend}', skipping it")
+                continue
+            if spec.pop("preload", False):
+                self._preload.append(name)
+            self.models[name] = factories[backend](name, **spec)
+
+        default = config.get("default") or ("openai" if os.getenv("OPENAI_ENABLED", "false").lower() == "true" else "local")
+        if default not in self.models:
+            if specs.get(default, {}).get("backend", "local") in skip_backends:
+                default = "local"
+        if default not in self.models:
+            logger.error(f"Default model '{default}' is not registered, using 'local'")
+            default = "local"
+        self.default_name = default
+
+        for rule in config.get("routes", []):
+            if rule.get("model") not in self.models:
+                if rule.get("model") in specs:
+                    continue
+                logger.error(f"Route to unknown model '{rule.get('model')}' ignored")
+                continue
+            self.routes.append(RouteRule(
+                model=rule["model"],
+                min_chars=int(rule.get("min_chars", 0)),
+                max_chars=rule.get("max_chars"),
+                topics=tuple(rule.get("topics", ())),
+            ))
+
+    def _read_config(self) -> dict:
+        if not self.config_path:
+            return {}
+        try:
+            with open(self.config_path, encoding="utf-8") as config_file:
+                return json.load(config_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load model registry from {self.config_path}: {e}; using the built-in models")
+            return {}
+
+    def get(self, name: str):
+        try:
+            return self.models[name]
+        except KeyError:
+            raise UnknownModelError(name) from None
+
+    @property
+    def default(self):
+        return self.models[self.default_name]
+
+    def local_models(self) -> List:
+        return [model for model in self.models.values() if model.backend == "local"]
+
+    def _resident_models(self) -> List:
+        """Local models whose weights are in this process"""
+        return [model for model in self.local_models() if not getattr(model, "is_async", False)]
+
+    async def start(self):
+        """Load the preloaded models; local ones load in the background"""
+        for name in self._preload:
+            self.load(name)
+
+    def load(self, name: str):
+        """Start loading a model if it is not loaded or loading already"""
+        model = self.get(name)
+        if getattr(model, "is_async", False):
+            # Models served elsewhere only need a client, created on the event loop
+            if not model.ready:
+                model.load_model()
+            return
+        if model.ready or name in self._loading:
+            return
+        model.state = "loading"
+        task = asyncio.create_task(self._load_local(name))
+        self._loading[name] = task
+        task.add_done_callback(lambda _: self._loading.pop(name, None))
+
+    async def _load_local(self, name: str):
+        model = self.models[name]
+        # Make room for the model up front when its size is known from an earlier load
+        self._evict(self._memory.get(name, 0), keep=name)
+        loop = asyncio.get_running_loop()
+        loaded = asyncio.Event()
+
+        def run():
+            model.load_model()
+            try:
+                loop.call_soon_threadsafe(loaded.set)
+            except RuntimeError:
+                # The server shut down while the model was loading
+                pass
+
+        # A daemon thread, so shutting down never waits for a slow download
+        threading.Thread(target=run, name=f"{name}-loader", daemon=True).start()
+        await loaded.wait()
+        if not model.ready:
+            return
+        self._memory[name] = model.memory_bytes()
+        self._last_used[name] = time.monotonic()
+        self._evict(0, keep=name)
+
+    async def unload(self, name: str):
+        model = self.get(name)
+        task = self._loading.get(name)
+        if task:
+            # Weights being loaded can't be interrupted; drop them once they arrive
+            await asyncio.shield(task)
+        if getattr(model, "is_async", False):
+            await model.unload()
+        else:
+            model.unload()
+        logger.info(f"Unloaded model '{name}'")
+
+    def memory_used(self) -> int:
+        return sum(self._memory.get(model.name, 0) for model in self._resident_models() if model.ready)
+
+    def _evict(self, incoming: int, keep: str):
+        """Unload least recently used local models until ``incoming`` more bytes fit the budget"""
+        if not self.memory_budget:
+            return
+        candidates = sorted(
+            (model for model in self._resident_models()
+             if model.ready and model.name not in (keep, self.default_name)),
+            key=lambda model: self._last_used.get(model.name, 0)
+        )
+        while self.memory_used() + incoming > self.memory_budget and candidates:
+            victim = candidates.pop(0)
+            logger.info(f"Unloading model '{victim.name}' to stay within MODEL_MEMORY_BUDGET_MB")
+            victim.unload()
+            self._evictions += 1
+        if self.memory_used() + incoming > self.memory_budget:
+            logger.warning(
+                f"Loaded models use {self.memory_used() / 2**20:.0f}MB, over the "
+                f"{self.memory_budget / 2**20:.0f}MB budget, and nothing more can be evicted"
+            )
+
+    def route(self, prompt: Optional[str], requested: str = None):
+        """Pick the model for a request; without a prompt the rules are skipped"""
+        if requested:
+            model = self.get(requested)
+            if not model.ready:
+                if model.state != "loading":
+                    self.load(requested)
+                # Whoever started the load, a local model answers only once it is ready
+                if not model.ready and model.backend == "local":
+                    raise ModelNotLoadedError(f"Model '{requested}' is loading, please try again shortly")
+            return self._use(model)
+
+        topics = None
+
+        def prompt_topics() -> set:
+            nonlocal topics
+            if topics is None:
+                topics = {match.name for match in self.topic_matcher(prompt)} if self.topic_matcher else set()
+            return topics
+
+        for rule in self.routes if prompt is not None else ():
+            model = self.models[rule.model]
+            if model.ready and rule.matches(prompt, prompt_topics):
+                return self._use(model)
+        return self._use(self.default)
+
+    def _use(self, model):
+        if getattr(model, "is_async", False) and not model.available():
+            # OpenAI is unconfigured or its circuit is open: answer locally if we can
+            local = self.local_fallback()
+            if local:
+                logger.debug(f"Model '{model.name}' is unavailable, using '{local.name}'")
+                model = local
+            elif not model.ready:
+                model = self.local_fallback(ready_only=False) or model
+        self._last_used[model.name] = time.monotonic()
+        return model
+
+    def local_fallback(self, ready_only: bool = True):
+        """Local model to fail over to: the default if local, else the most recently used ready one"""
+        if self.default.backend == "local" and (self.default.ready or not ready_only):
+            return self.default
+        ready = [model for model in self.local_models() if model.ready]
+        if ready:
+            return max(ready, key=lambda model: self._last_used.get(model.name, 0))
+        if not ready_only:
+            return self.models.get("local")
+        return None
+
+    async def forget(self, conversation_id: str):
+        """Drop the cached attention state local models keep for a conversation"""
+        for model in self.local_models():
+            if getattr(model, "is_async", False):
+                await model.forget(conversation_id)
+            else:
+                model.kv_cache.discard(conversation_id)
+
+    def _describe(self, name: str, model) -> dict:
+        info = model.describe()
+        if model.ready and name in self._memory:
+            info["memory_mb"] = round(self._memory[name] / 2**20, 1)
+        info.setdefault("memory_mb", None)
+        return info
+
+    def stats(self) -> dict:
+        return {
+            "default": self.default_name,
+            "memory_used_mb": round(self.memory_used() / 2**20, 1),
+            "memory_budget_mb": round(self.memory_budget / 2**20, 1) if self.memory_budget else None,
+            "evictions": self._evictions,
+            "routes": [rule._asdict() for rule in self.routes],
+            "models": {name: self._describe(name, model) for name, model in self.models.items()},
+        }
+
+    async def close(self):
+        for task in list(self._loading.values()):
+            task.cancel()
+        for model in self.models.values():
+            if getattr(model, "is_async", False):
+                await model.close()
+            elif model.batcher:
+                model.batcher.stop()
@@ -0,0 +1,244 @@
+"""
+Retrieval Index for MedAI
+Vector index over past questions for semantic search and answer reuse
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+import logging
+from pathlib import Path
+from typing import List, NamedTuple
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+class IndexEntry(NamedTuple):
+    """One question/answer pair to index, by message id"""
+    question_id: int
+    answer_id: int
+    # First turn of a conversation, so the answer does not depend on earlier turns
+    standalone: bool
+    question: str
+
+class SearchHit(NamedTuple):
+    question_id: int
+    answer_id: int
+    standalone: bool
+    score: float
+    # question_hash() of the indexed text, to check the row still holds that question
+    question_hash: int
+
+def question_hash(text: str) -> int:
+    """Signed 64-bit digest of a question, stored next to its message ids"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+class HashingEmbedder:
+    """Dependency-free embedding: signed hashes of words and word pairs.
+
+    Captures lexical overlap only, but needs no model download and costs
+    microseconds per question.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN.findall(text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                digest = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers model, loaded on first use"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self._model_class = SentenceTransformer
+        self._model = None
+        self._lock = threading.Lock()
+        self.model_name = model_name
+        self.name = model_name
+        self._dim = None
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self._model_class(self.model_name, device="cpu")
+        return self._model
+
+    @property
+    def dim(self) -> int:
+        if self._dim is None:
+            self._dim = self._load().get_sentence_embedding_dimension()
+        return self._dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self._load().encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+def make_embedder():
+    model_name = os.getenv("RETRIEVAL_MODEL", "")
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            logger.error("RETRIEVAL_MODEL requires sentence-transformers; using the hashing embedder")
+    return HashingEmbedder(int(os.getenv("RETRIEVAL_DIM", "384")))
+
+class RetrievalIndex:
+    """Flat cosine-similarity index stored as append-only files.
+
+    ``vectors.f32`` holds one normalized float32 row per question and
+    ``rows.i64`` the matching (question id, answer id, standalone, question
+    hash) message references; the text itself stays in the database. The
+    hash lets readers reject a hit whose message id now belongs to another
+    question, since deleted conversations stay in the index. Both files are read
+    through ``np.memmap``, so every worker process shares the same page
+    cache instead of loading its own copy, and each worker picks up rows
+    appended by the others on its next search.
+    """
+
+    ROW_FIELDS = 4
+
+    def __init__(self, path: str = None, embedder=None, enabled: bool = None):
+        self.enabled = enabled if enabled is not None else os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+        self.path = Path(path or os.getenv("RETRIEVAL_INDEX_PATH", "./retrieval_index"))
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        self._size = -1
+        self._vectors = None
+        self._rows = None
+        self._searches = 0
+        self._added = 0
+
+    def open(self):
+        """Create or validate the index files; disables the index on mismatch"""
+        if not self.enabled:
+            return
+        if self.embedder is None:
+            self.embedder = make_embedder()
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            meta_path = self.path / "index.json"
+            meta = {"embedder": self.embedder.name, "dim": self.embedder.dim, "row_fields": self.ROW_FIELDS}
+            if meta_path.exists():
+                stored = json.loads(meta_path.read_text())
+                if stored != meta:
+                    logger.error(
+                        f"Retrieval index at {self.path} was built with {stored}, not {meta}; "
+                        "disabling it (remove the directory and run setup_db.py --build-index to rebuild)"
+                    )
+                    self.enabled = False
+                    return
+            else:
+                meta_path.write_text(json.dumps(meta))
+            for name in ("vectors.f32", "rows.i64"):
+                (self.path / name).touch()
+            logger.info(f"Retrieval index ready at {self.path} ({len(self)} questions, {self.embedder.name})")
+        except OSError as e:
+            logger.error(f"Could not open retrieval index at {self.path}: {e}")
+            self.enabled = False
+
+    def __len__(self) -> int:
+        if not self.enabled or self.embedder is None:
+            return 0
+        dim = self.embedder.dim
+        vector_rows = os.path.getsize(self.path / "vectors.f32") // (dim * 4)
+        ref_rows = os.path.getsize(self.path / "rows.i64") // (self.ROW_FIELDS * 8)
+        # A concurrent append may have written one file but not yet the other
+        return min(vector_rows, ref_rows)
+
+    def add(self, entries: List[IndexEntry]):
+        """Embed and append entries (blocking; call off the event loop)"""
+        # Nothing to write to until open() has run
+        if not self.enabled or self.embedder is None or not entries:
+            return
+        vectors = self.embedder.encode([entry.question for entry in entries])
+        rows = np.array(
+            [(entry.question_id, entry.answer_id, int(entry.standalone), question_hash(entry.question))
+             for entry in entries],
+            dtype=np.int64
+        )
+        with self._lock, open(self.path / "vectors.f32", "ab") as vector_file, \
+                open(self.path / "rows.i64", "ab") as rows_file:
+            if fcntl:
+                fcntl.flock(vector_file, fcntl.LOCK_EX)
+            try:
+                # Trim a torn append left by a crashed writer so rows stay aligned
+                count = len(self)
+                vector_file.truncate(count * self.embedder.dim * 4)
+                rows_file.truncate(count * self.ROW_FIELDS * 8)
+                vector_file.seek(0, os.SEEK_END)
+                rows_file.seek(0, os.SEEK_END)
+                vector_file.write(vectors.astype(np.float32).tobytes())
+                rows_file.write(rows.tobytes())
+            finally:
+                if fcntl:
+                    fcntl.flock(vector_file, fcntl.LOCK_UN)
+            self._added += len(entries)
+
+    def _view(self):
+        """Memory-mapped vectors and rows, remapped when other writers appended"""
+        with self._lock:
+            size = len(self)
+            if size != self._size:
+                if size:
+                    self._vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r",
+                                              shape=(size, self.embedder.dim))
+                    self._rows = np.memmap(self.path / "rows.i64", dtype=np.int64, mode="r",
+                                           shape=(size, self.ROW_FIELDS))
+                else:
+                    self._vectors = self._rows = None
+                self._size = size
+            return self._size, self._vectors, self._rows
+
+    def search(self, query: str, limit: int = 5, standalone_only: bool = False) -> List[SearchHit]:
+        """Most similar indexed questions, best first (blocking; call off the event loop)"""
+        if not self.enabled or self.embedder is None:
+            return []
+        size, vectors, rows = self._view()
+        if not size:
+            return []
+        self._searches += 1
+        query_vector = self.embedder.encode([query])[0]
+        scores = vectors @ query_vector
+        if standalone_only:
+            scores = np.where(rows[:, 2] == 1, scores, -np.inf)
+        k = min(limit, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            SearchHit(int(rows[i, 0]), int(rows[i, 1]), bool(rows[i, 2]), float(scores[i]), int(rows[i, 3]))
+            for i in top if np.isfinite(scores[i])
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "questions": len(self),
+            "embedder": self.embedder.name if self.embedder else None,
+            "added": self._added,
+            "searches": self._searches,
+        }
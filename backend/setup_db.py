@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 """
 Database Setup Script for MedAI
-Initializes PostgreSQL database and tables
+Creates the PostgreSQL database and migrates its schema
 """
 
+import argparse
 import os
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
@@ -17,8 +18,8 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def setup_database():
-    """Setup PostgreSQL database and tables"""
+def get_db_settings():
+    """Resolve database connection settings from environment variables"""
     
     # Database configuration from environment variables
     DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -49,6 +50,21 @@ def setup_database():
         except Exception as e:
             logger.warning(f"Could not parse DATABASE_URL: {e}")
     
+    return DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+
+def get_database_url() -> str:
+    """SQLAlchemy URL for the configured database"""
+    from sqlalchemy.engine import URL
+    
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME = get_db_settings()
+    url = URL.create("postgresql", username=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=int(DB_PORT), database=DB_NAME)
+    return url.render_as_string(hide_password=False)
+
+def setup_database():
+    """Create the PostgreSQL database if needed and migrate it to the latest schema"""
+    
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME = get_db_settings()
+    
     logger.info(f"Connecting to PostgreSQL at {DB_HOST}:{DB_PORT}")
     logger.info(f"Database: {DB_NAME}, User: {DB_USER}")
     
@@ -78,7 +94,121 @@ def setup_database():
         cursor.close()
         conn.close()
         
-        # Connect to the new database and create tables
+        # Tables, indexes and constraints all come from the migrations in migrations/versions
+        from database import upgrade_schema
+        upgrade_schema(get_database_url())
+        
+        logger.info("Database schema is up to date!")
+        logger.info(f"Database URL: postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+        
+    except Exception as e:
+        logger.error(f"Error setting up database: {e}")
+        raise
+
+def dedupe_messages():
+    """Remove duplicate message rows left behind by the old save_conversation.
+
+    Earlier versions re-inserted the whole transcript on every /chat turn, so
+    each message may exist many times with an identical conversation_id, role,
+    content and timestamp. The oldest copy (lowest id) of each is kept.
+    Deletes in MAINTENANCE_BATCH_SIZE batches, so it can run while the API
+    is serving.
+    """
+    run_maintenance(retention_days=0)
+
+def run_maintenance(retention_days: float = None):
+    """Archive conversations older than RETENTION_DAYS, remove duplicate messages and report the space freed"""
+    import asyncio
+    from maintenance import MaintenanceJob
+    from database import close_db
+    
+    async def run():
+        try:
+            return await MaintenanceJob(retention_days=retention_days).run()
+        finally:
+            await close_db()
+    
+    try:
+        report = asyncio.run(run())
+        if report is None:
+            logger.info("Maintenance is already running in another process")
+            return
+        for key, value in report.items():
+            logger.info(f"{key}: {value}")
+    except Exception as e:
+        logger.error(f"Error running maintenance: {e}")
+        raise
+
+def build_index(batch_size: int = 256):
+    """Add every stored question/answer pair to an empty retrieval index.
+
+    New replies are indexed as they are saved; this backfills history
+    written before the index existed (or after its directory was removed).
+    Reads through the same engine as the API, so it also indexes the SQLite
+    fallback database when PostgreSQL is unreachable.
+    """
+    import asyncio
+    import database
+    import transfer
+    from fallback import FallbackResponder
+    from retrieval import RetrievalIndex, IndexEntry
+    
+    index = RetrievalIndex(enabled=True)
+    index.open()
+    if not index.enabled:
+        raise RuntimeError("Retrieval index could not be opened")
+    if len(index):
+        raise RuntimeError(f"Retrieval index at {index.path} is not empty; remove it first to rebuild")
+    fallback = FallbackResponder()
+    
+    async def run() -> int:
+        try:
+            # Switches to the SQLite fallback like the API does
+            await database.init_db()
+            logger.info(f"Indexing messages from {database.get_engine().url.render_as_string()} into {index.path}")
+            batch, indexed = [], 0
+            previous = None
+            async with database.SessionLocal() as session:
+                # Ordered by conversation and time, one batch in memory at a time
+                async for rows in transfer.iter_message_batches(session):
+                    for conversation_id, _, _, _, message_id, role, content, _ in rows:
+                        if previous and previous[1] == conversation_id and previous[2] == "user" and role == "assistant":
+                            if not fallback.is_fallback(content):
+                                # Only the first question of a conversation stands on its own
+                                batch.append(IndexEntry(previous[0], message_id, previous[4], previous[3]))
+                        first = previous is None or previous[1] != conversation_id
+                        previous = (message_id, conversation_id, role, content, first)
+                        if len(batch) >= batch_size:
+                            await asyncio.to_thread(index.add, batch)
+                            indexed += len(batch)
+                            batch = []
+            if batch:
+                await asyncio.to_thread(index.add, batch)
+                indexed += len(batch)
+            return indexed
+        finally:
+            await database.close_db()
+    
+    try:
+        indexed = asyncio.run(run())
+        logger.info(f"Indexed {indexed} question/answer pairs")
+    except Exception as e:
+        logger.error(f"Error building retrieval index: {e}")
+        raise
+
+def create_partitions(months_ahead: int = 3):
+    """Add monthly partitions up to ``months_ahead`` months from now.
+
+    Only for databases migrated with DB_PARTITION_MESSAGES=true. Run it ahead
+    of time (e.g. monthly from cron): rows for a month without a partition go
+    to messages_default, and a partition can't be created over rows that
+    already sit there.
+    """
+    from database import message_partition_ddl, months_between
+    
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME = get_db_settings()
+    
+    try:
         conn = psycopg2.connect(
             host=DB_HOST,
             port=DB_PORT,
@@ -88,43 +218,137 @@ def setup_database():
         )
         cursor = conn.cursor()
         
-        # Create conversations table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id VARCHAR PRIMARY KEY,
-                title VARCHAR NOT NULL,
-                created_at TIMESTAMP NOT NULL,
-                updated_at TIMESTAMP NOT NULL
-            )
-        """)
-        
-        # Create messages table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id SERIAL PRIMARY KEY,
-                conversation_id VARCHAR NOT NULL,
-                role VARCHAR NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP NOT NULL
-            )
-        """)
-        
-        # Create index for better performance
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_messages_conversation_id 
-            ON messages(conversation_id)
-        """)
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'messages'::regclass")
+        if not cursor.fetchone():
+            raise RuntimeError("messages is not partitioned; migrate with DB_PARTITION_MESSAGES=true first")
+        for year, month in months_between(None, months_ahead):
+            cursor.execute(message_partition_ddl(year, month))
         
         conn.commit()
         cursor.close()
         conn.close()
         
-        logger.info("Database tables created successfully!")
-        logger.info(f"Database URL: postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+        logger.info(f"Message partitions exist through {months_ahead} months ahead")
         
     except Exception as e:
-        logger.error(f"Error setting up database: {e}")
+        logger.error(f"Error creating message partitions: {e}")
+        raise
+
+def export_history(path: str, since: str = None, until: str = None):
+    """Write all stored messages to ``path`` as NDJSON, or Parquet for a .parquet path.
+
+    Reads through a server-side cursor in EXPORT_BATCH_SIZE batches, so the
+    size of the history does not matter. NDJSON paths ending in .gz are
+    compressed; '-' writes to stdout.
+    """
+    import asyncio
+    import transfer
+    from database import close_db
+    
+    async def run():
+        try:
+            await transfer.export_file(path, since=since, until=until)
+        finally:
+            await close_db()
+    
+    try:
+        asyncio.run(run())
+        logger.info(f"Exported messages to {path}")
+    except Exception as e:
+        logger.error(f"Error exporting messages: {e}")
+        raise
+
+def import_history(path: str):
+    """Load an export written by --export (or GET /admin/export).
+
+    Uses COPY on PostgreSQL, in IMPORT_BATCH_SIZE transactions.
+    Conversations already in the database are skipped, so re-running an
+    import is harmless. Run --build-index on an empty index afterwards to
+    make imported answers searchable.
+    """
+    import asyncio
+    import transfer
+    from database import close_db
+    
+    async def run():
+        try:
+            return await transfer.import_file(path)
+        finally:
+            await close_db()
+    
+    try:
+        result = asyncio.run(run())
+        logger.info(
+            f"Imported {result['messages']} messages in {result['conversations']} conversations "
+            f"({result['skipped_conversations']} existing conversations skipped)"
+        )
+    except Exception as e:
+        logger.error(f"Error importing messages: {e}")
         raise
 
 if __name__ == "__main__":
-    setup_database() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="MedAI database management")
+    parser.add_argument(
+        "--dedupe-messages",
+        action="store_true",
+        help="Remove duplicate message rows written by older versions and exit"
+    )
+    parser.add_argument(
+        "--maintenance",
+        action="store_true",
+        help="Archive conversations older than RETENTION_DAYS, remove duplicate messages and exit"
+    )
+    parser.add_argument(
+        "--retention-days",
+        type=float,
+        metavar="DAYS",
+        help="With --maintenance, override RETENTION_DAYS (0 = archive nothing)"
+    )
+    parser.add_argument(
+        "--build-index",
+        action="store_true",
+        help="Index all stored questions for /search and answer reuse and exit"
+    )
+    parser.add_argument(
+        "--create-partitions",
+        type=int,
+        metavar="MONTHS",
+        help="Create monthly message partitions up to MONTHS ahead (partitioned databases only) and exit"
+    )
+    parser.add_argument(
+        "--export",
+        metavar="FILE",
+        help="Export all messages to FILE (.ndjson, .ndjson.gz or .parquet; '-' for stdout) and exit"
+    )
+    parser.add_argument(
+        "--since",
+        metavar="TIMESTAMP",
+        help="With --export, only messages at or after this ISO timestamp (local time unless it has an offset)"
+    )
+    parser.add_argument(
+        "--until",
+        metavar="TIMESTAMP",
+        help="With --export, only messages before this ISO timestamp"
+    )
+    parser.add_argument(
+        "--import",
+        dest="import_file",
+        metavar="FILE",
+        help="Import messages from an export FILE, skipping conversations that already exist, and exit"
+    )
+    args = parser.parse_args()
+    
+    if args.dedupe_messages:
+        dedupe_messages()
+    elif args.maintenance:
+        run_maintenance(args.retention_days)
+    elif args.build_index:
+        build_index()
+    elif args.create_partitions is not None:
+        create_partitions(args.create_partitions)
+    elif args.export:
+        export_history(args.export, since=args.since, until=args.until)
+    elif args.import_file:
+        import_history(args.import_file)
+    else:
+        setup_database() 
\ No newline at end of file
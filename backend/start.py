@@ -4,10 +4,20 @@ MedAI Backend Startup Script
 Medical AI Chatbot powered by BioMedLM
 """
 
+import argparse
+import asyncio
+import os
+import subprocess
+import threading
+import time
 import uvicorn
 import logging
 import sys
 from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
 
 # Configure logging
 logging.basicConfig(
@@ -16,30 +26,113 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+BACKEND_DIR = Path(__file__).resolve().parent
+DEFAULT_SOCKET = "/tmp/medai-inference.sock"
+
+def run_development(host: str, port: int):
+    """Single process with auto-reload; models load inside the API process"""
+    logger.info("Auto-reload enabled - server will restart on code changes")
+    uvicorn.run(
+        "main:app",  # Use string reference for auto-reload
+        host=host,
+        port=port,
+        reload=True,  # Enable auto-reload
+        reload_dirs=["."],  # Watch current directory for changes
+        log_level="info"
+    )
+
+def migrate_once():
+    """Apply migrations before the workers start, so they don't each try"""
+    from database import init_db, close_db
+
+    async def run():
+        try:
+            await init_db()
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+
+class InferenceServerProcess:
+    """Runs inference_server.py in a child process and restarts it if it dies"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = Path(socket_path)
+        self.process = None
+        self._stopping = threading.Event()
+
+    def start(self, wait: float = 30):
+        self._spawn()
+        # The socket is bound before the models load, so this is quick
+        deadline = time.monotonic() + wait
+        while not self.socket_path.exists():
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("Inference server did not start")
+            time.sleep(0.1)
+        threading.Thread(target=self._watch, name="inference-server-watch", daemon=True).start()
+
+    def _spawn(self):
+        self.socket_path.unlink(missing_ok=True)
+        self.process = subprocess.Popen(
+            [sys.executable, str(BACKEND_DIR / "inference_server.py")],
+            cwd=BACKEND_DIR,
+            env={**os.environ, "INFERENCE_SERVER_SOCKET": str(self.socket_path)},
+        )
+        logger.info(f"Inference server started (pid {self.process.pid}) on {self.socket_path}")
+
+    def _watch(self):
+        while not self._stopping.is_set():
+            if self.process.poll() is not None and not self._stopping.is_set():
+                logger.error(f"Inference server exited with code {self.process.returncode}, restarting it")
+                self._spawn()
+            self._stopping.wait(1)
+
+    def stop(self):
+        self._stopping.set()
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+def run_production(workers: int, host: str, port: int):
+    """N API workers without reload, sharing one inference server process for the local models"""
+    migrate_once()
+    os.environ["DB_MIGRATE_ON_STARTUP"] = "false"
+
+    socket_path = os.getenv("INFERENCE_SERVER_SOCKET") or DEFAULT_SOCKET
+    os.environ["INFERENCE_SERVER_SOCKET"] = socket_path
+    inference_server = InferenceServerProcess(socket_path)
+    inference_server.start()
+    try:
+        logger.info(f"Starting {workers} API workers")
+        uvicorn.run("main:app", host=host, port=port, workers=workers, log_level="info")
+    finally:
+        inference_server.stop()
+
 def main():
     """Start the MedAI backend server"""
+    parser = argparse.ArgumentParser(description="Start the MedAI backend")
+    parser.add_argument("--production", action="store_true",
+                        help="run API_WORKERS workers and a separate inference server process, without reload")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", "0")) or os.cpu_count(),
+                        help="number of API worker processes in production mode (default: API_WORKERS or CPU count)")
+    args = parser.parse_args()
+    host = os.getenv("BACKEND_HOST", "0.0.0.0")
+    port = int(os.getenv("BACKEND_PORT", "8000"))
+
     try:
         logger.info("Starting MedAI Backend Server...")
-        logger.info("Loading BioMedLM model (this may take a few minutes on first run)...")
-        
-        # Import main app after logging setup
-        from main import app
-        
-        logger.info("Model loaded successfully!")
-        logger.info("Server starting on http://localhost:8000")
-        logger.info("API documentation available at http://localhost:8000/docs")
-        logger.info("Auto-reload enabled - server will restart on code changes")
-        
-        # Start the server with auto-reload enabled
-        uvicorn.run(
-            "main:app",  # Use string reference for auto-reload
-            host="0.0.0.0",
-            port=8000,
-            reload=True,  # Enable auto-reload
-            reload_dirs=["."],  # Watch current directory for changes
-            log_level="info"
-        )
-        
+        logger.info("The model loads in the background; /ready reports when it is available")
+        logger.info(f"Server starting on http://localhost:{port}")
+        logger.info(f"API documentation available at http://localhost:{port}/docs")
+
+        if args.production:
+            run_production(args.workers, host, port)
+        else:
+            run_development(host, port)
+
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
         sys.exit(0)
@@ -48,4 +141,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,104 @@
+"""
+Shared fixtures: the API running against a temporary SQLite database and a scripted local model
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+class ScriptedModel:
+    """Stands in for BioMedLMModel: answers "Answer to <prompt>" in word-sized deltas"""
+
+    backend = "local"
+    batcher = None
+
+    def __init__(self, name: str = "local", **_):
+        from context import ConversationKVCache
+
+        self.name = name
+        self.state = "not_loaded"
+        self.kv_cache = ConversationKVCache()
+        self.prompts = []
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load_model(self):
+        self.state = "ready"
+
+    def unload(self):
+        self.state = "not_loaded"
+
+    def memory_bytes(self) -> int:
+        return 0
+
+    def describe(self) -> dict:
+        return {"backend": self.backend, "state": self.state}
+
+    def cache_identity(self, profile=None) -> dict:
+        return {"backend": self.backend, "model": self.name, "profile": profile.name if profile else None}
+
+    def generate_response(self, prompt: str, max_length: int = None, history=None, conversation_id: str = None,
+                          profile=None) -> str:
+        self.prompts.append((prompt, list(history or [])))
+        return f"Answer to {prompt}"
+
+    def stream_response(self, prompt: str, on_delta, max_length: int = None, history=None,
+                        conversation_id: str = None, profile=None) -> str:
+        response = self.generate_response(prompt, history=history, conversation_id=conversation_id, profile=profile)
+        for word in response.split(" "):
+            on_delta(word + " ")
+        return response
+
+    def is_fallback(self, prompt: str, response: str) -> bool:
+        return False
+
+    def _serve_fallback(self, prompt: str) -> str:
+        return "Fallback answer"
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory) -> str:
+    """Directory of a small randomly initialised GPT-2 and tokenizer, built without downloads"""
+    from benchmarks.make_tiny_model import make_tiny_model
+
+    path = str(tmp_path_factory.mktemp("tiny-model"))
+    make_tiny_model(path)
+    return path
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """TestClient for main.app with its own database, caches and a ScriptedModel as ``local``"""
+    from fastapi.testclient import TestClient
+
+    import database
+    import main
+    from cache import ResponseCache
+    from executor import InferenceExecutor
+    from models import ChatGPTModel
+    from registry import ModelRegistry
+    from retrieval import RetrievalIndex
+
+    original_engine = database.engine
+    engine = database.create_engine_for(f"sqlite:///{tmp_path}/medai.db")
+    monkeypatch.setattr(database, "engine", engine)
+    database.SessionLocal.configure(bind=engine)
+    monkeypatch.setattr(main, "model_registry",
+                        ModelRegistry({"local": ScriptedModel, "openai": ChatGPTModel}, config_path=""))
+    # Shutdown stops the executor, so each app run needs its own
+    monkeypatch.setattr(main, "inference_executor", InferenceExecutor(max_workers=2, max_queue=4))
+    monkeypatch.setattr(main, "response_cache", ResponseCache(disk_path="", enabled=True))
+    monkeypatch.setattr(main, "retrieval_index", RetrievalIndex(path=str(tmp_path / "index"), enabled=True))
+    try:
+        with TestClient(main.app) as client:
+            # Startup loads the model in the background; tests start from a loaded one
+            deadline = time.monotonic() + 10
+            while not main.model_registry.default.ready and time.monotonic() < deadline:
+                time.sleep(0.01)
+            yield client
+    finally:
+        database.SessionLocal.configure(bind=original_engine)
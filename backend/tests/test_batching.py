@@ -0,0 +1,59 @@
+"""
+Micro-batching: concurrent submissions share a batch and each gets its own result
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batching import MicroBatcher
+
+def test_concurrent_items_are_batched_up_to_the_size_limit():
+    batches = []
+
+    def process(payloads):
+        batches.append(list(payloads))
+        return [payload * 2 for payload in payloads]
+
+    batcher = MicroBatcher(process, max_batch_size=3, window_ms=200)
+    start = threading.Barrier(5)
+    results = {}
+
+    def submit(number):
+        start.wait()
+        results[number] = batcher.submit(number).result(timeout=5)
+
+    threads = [threading.Thread(target=submit, args=(number,)) for number in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.stop()
+
+    assert results == {number: number * 2 for number in range(5)}
+    assert [len(batch) for batch in batches] == [3, 2]
+    assert batcher.stats()["items"] == 5
+
+def test_a_failed_batch_fails_every_item_and_the_batcher_keeps_going():
+    def process(payloads):
+        if "bad" in payloads:
+            raise ValueError("generation failed")
+        return payloads
+
+    batcher = MicroBatcher(process, max_batch_size=2, window_ms=50)
+    failed = [batcher.submit("bad"), batcher.submit("good")]
+    for future in failed:
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+    assert batcher.submit("next").result(timeout=5) == "next"
+    batcher.stop()
+
+def test_a_wrong_number_of_results_is_an_error():
+    batcher = MicroBatcher(lambda payloads: [], max_batch_size=1, window_ms=0)
+    with pytest.raises(RuntimeError):
+        batcher.submit("item").result(timeout=5)
+    batcher.stop()
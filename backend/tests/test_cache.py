@@ -0,0 +1,76 @@
+"""
+Response cache: LRU and TTL in memory, a disk tier read and written off the event loop
+"""
+
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache import ResponseCache, normalize_prompt
+
+def test_entries_expire_and_the_least_recently_used_is_evicted():
+    cache = ResponseCache(max_entries=2, ttl=0.2, disk_path="", enabled=True)
+
+    async def scenario():
+        cache.set("a", "1")
+        cache.set("b", "2")
+        assert await cache.get("a") == "1"
+        cache.set("c", "3")
+        evicted = await cache.get("b")
+        await asyncio.sleep(0.25)
+        return evicted, await cache.get("a")
+
+    assert asyncio.run(scenario()) == (None, None)
+    assert cache.stats()["hits"] == 1
+
+def test_disk_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(ttl=60, disk_path=path, enabled=True)
+    first.set("key", "answer")
+    first.close()
+
+    second = ResponseCache(ttl=60, disk_path=path, enabled=True)
+    reader_threads = []
+    read_disk = second._read_disk
+
+    def recording_read(key, now):
+        reader_threads.append(threading.current_thread())
+        return read_disk(key, now)
+
+    second._read_disk = recording_read
+    assert asyncio.run(second.get("key")) == "answer"
+    second.close()
+    assert second.stats()["disk_hits"] == 1
+    assert reader_threads and threading.main_thread() not in reader_threads
+
+def test_expired_rows_are_purged_on_a_timer(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(ttl=0.1, disk_path=path, enabled=True, purge_interval=0.2)
+    cache.set("old", "answer")
+    cache.flush()
+    with sqlite3.connect(path) as disk:
+        indexes = {row[0] for row in disk.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert "ix_responses_expires_at" in indexes
+        assert disk.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 1
+    time.sleep(0.5)
+    with sqlite3.connect(path) as disk:
+        assert disk.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+    assert asyncio.run(cache.get("old")) is None
+    cache.close()
+
+def test_unusable_disk_path_keeps_the_memory_tier(tmp_path):
+    cache = ResponseCache(ttl=60, disk_path=str(tmp_path / "missing" / "cache.db"), enabled=True)
+    cache.set("key", "answer")
+    assert asyncio.run(cache.get("key")) == "answer"
+    assert not cache.stats()["disk"]
+    cache.close()
+
+def test_prompts_differing_in_case_and_punctuation_share_a_key():
+    identity = {"model": "local"}
+    assert normalize_prompt("What causes  Diabetes?") == "what causes diabetes"
+    assert ResponseCache.make_key("What causes diabetes?", identity) == ResponseCache.make_key("what causes diabetes", identity)
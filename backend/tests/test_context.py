@@ -0,0 +1,48 @@
+"""
+Conversation KV cache: a cached turn is reused only while it is still the last one
+"""
+
+import sys
+from pathlib import Path
+from typing import NamedTuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from context import ConversationKVCache, KVCacheEntry, select_history
+
+class Turn(NamedTuple):
+    role: str
+    content: str
+
+def chat(cache: ConversationKVCache, stored: list, prompt: str, cap: int) -> bool:
+    """One /chat turn as the local model runs it; True if the KV cache was reused"""
+    # get_history returns at most ``cap`` of the stored messages
+    history = stored[-cap:]
+    entry = cache.take("conv", history)
+    response = f"answer to {prompt}"
+    cache.put("conv", KVCacheEntry([], None, prompt, response))
+    stored += [Turn("user", prompt), Turn("assistant", response)]
+    return entry is not None
+
+def test_follow_ups_reuse_the_cache_past_the_history_cap():
+    cache = ConversationKVCache(max_entries=4)
+    stored = []
+    reused = [chat(cache, stored, f"question {number}", cap=4) for number in range(6)]
+    # Only the first turn has nothing to reuse, including once 4 < len(stored)
+    assert reused == [False] + [True] * 5
+    assert cache.stats()["hits"] == 5
+
+def test_a_turn_the_model_did_not_generate_is_a_miss():
+    cache = ConversationKVCache(max_entries=4)
+    stored = []
+    for number in range(3):
+        chat(cache, stored, f"question {number}", cap=4)
+    # Answered elsewhere (another model, a fallback) so the cache lacks it
+    stored += [Turn("user", "question 3"), Turn("assistant", "answered without the cache")]
+    assert not chat(cache, stored, "question 4", cap=4)
+    assert cache.stats()["misses"] == 2
+
+def test_select_history_fits_the_budget_and_starts_with_a_question():
+    history = [Turn("user", "a" * 40), Turn("assistant", "b" * 40), Turn("user", "c" * 8), Turn("assistant", "d" * 8)]
+    selected = select_history(history, budget=30, count_tokens=lambda text: len(text) // 4)
+    assert selected == history[2:]
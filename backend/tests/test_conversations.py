@@ -0,0 +1,51 @@
+"""
+GET /conversations: keyset pages cover every conversation once, with counts and previews
+"""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database
+from database import ConversationDB, MessageDB
+
+def seed(api):
+    # Three conversations share an updated_at, so pages must break ties by id
+    base = datetime(2024, 1, 1)
+    updated = [base, base + timedelta(hours=1), base + timedelta(hours=1), base + timedelta(hours=1),
+               base + timedelta(hours=2)]
+
+    async def insert():
+        async with database.SessionLocal() as session:
+            for number, updated_at in enumerate(updated):
+                conversation_id = f"conv_{number}"
+                session.add(ConversationDB(id=conversation_id, title=f"t{number}", created_at=base,
+                                           updated_at=updated_at))
+                session.add_all([
+                    MessageDB(conversation_id=conversation_id, role="user", content=f"question {number}",
+                              timestamp=base),
+                    MessageDB(conversation_id=conversation_id, role="assistant", content=f"answer {number}",
+                              timestamp=base + timedelta(seconds=1)),
+                ])
+            await session.commit()
+
+    api.portal.call(insert)
+
+def test_pages_list_every_conversation_once_newest_first(api):
+    seed(api)
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = api.get("/conversations", params=params).json()
+        seen += page["conversations"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert [summary["id"] for summary in seen] == ["conv_4", "conv_3", "conv_2", "conv_1", "conv_0"]
+    assert all(summary["message_count"] == 2 for summary in seen)
+    assert seen[0]["last_message"] == "answer 4"
+
+def test_a_malformed_cursor_is_a_bad_request(api):
+    assert api.get("/conversations", params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,65 @@
+"""
+Inference executor: bounded admission, timeouts that keep their slot until the work ends
+"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from executor import InferenceExecutor, InferenceTimeoutError, QueueFullError
+
+def test_requests_beyond_workers_and_queue_are_rejected():
+    executor = InferenceExecutor(max_workers=1, max_queue=1, timeout=5)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(QueueFullError):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        # Capacity is back once the work has finished
+        return await executor.run(lambda: "answer")
+
+    assert asyncio.run(scenario()) == "answer"
+    assert executor.stats()["rejected"] == 1
+    assert executor.stats()["pending"] == 0
+    executor.shutdown()
+
+def test_timed_out_generation_holds_its_slot_until_it_finishes():
+    executor = InferenceExecutor(max_workers=1, max_queue=0, timeout=5)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(InferenceTimeoutError):
+            await executor.run(release.wait, timeout=0.05)
+        with pytest.raises(QueueFullError):
+            await executor.run(lambda: "answer")
+        release.set()
+        await asyncio.sleep(0.05)
+        return await executor.run(lambda: "answer")
+
+    assert asyncio.run(scenario()) == "answer"
+    assert executor.stats()["timed_out"] == 1
+    executor.shutdown()
+
+def test_stream_yields_deltas_then_the_result():
+    executor = InferenceExecutor(max_workers=1, max_queue=0, timeout=5)
+
+    def generate(prompt, on_delta):
+        for word in prompt.split():
+            on_delta(word)
+        return prompt
+
+    async def scenario():
+        stream = executor.stream(generate, "rest and fluids")
+        return [delta async for delta in stream], stream.result()
+
+    assert asyncio.run(scenario()) == (["rest", "and", "fluids"], "rest and fluids")
+    executor.shutdown()
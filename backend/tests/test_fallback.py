@@ -0,0 +1,44 @@
+"""
+Fallback responder: whole-word and phrase matching, priorities, and a broken rules file
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fallback import DEFAULT_RULES_PATH, FallbackResponder
+
+RULES = {
+    "default": "Please ask a doctor.",
+    "topics": [
+        {"name": "emergency", "keywords": ["chest pain"], "response": "Call emergency services.", "priority": 0},
+        {"name": "pain", "keywords": ["pain", "ache"], "response": "Rest and take painkillers.", "priority": 5},
+        {"name": "medication", "keywords": ["pill", "dose"], "response": "Follow the label.", "priority": 5},
+    ],
+}
+
+def make_responder(tmp_path) -> FallbackResponder:
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(RULES))
+    return FallbackResponder(str(path))
+
+def test_phrases_and_priorities_pick_the_answer(tmp_path):
+    responder = make_responder(tmp_path)
+    assert responder.respond("I have chest pain and a headache") == "Call emergency services."
+    assert [match.name for match in responder.match("How many pills per dose for this pain?")] == ["medication", "pain"]
+    assert responder.is_fallback("Follow the label.")
+
+def test_keywords_only_match_whole_words(tmp_path):
+    responder = make_responder(tmp_path)
+    # "painting" and "spill" contain keywords but are not them
+    assert responder.match("I spilled paint while painting") == []
+    assert responder.respond("Hello") == "Please ask a doctor."
+
+def test_unreadable_rules_fall_back_to_the_defaults(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text("{not json")
+    responder = FallbackResponder(str(path))
+    defaults = json.loads(DEFAULT_RULES_PATH.read_text())
+    assert responder.default_response == defaults["default"]
@@ -0,0 +1,48 @@
+"""
+Generation profiles: built-in defaults, JSON overrides and stop sequences in streamed text
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generation import GenerationProfiles, StopSequenceFilter, UnknownProfileError, resolve_profile, trim_at_stop
+
+def test_default_profile_has_no_deadline():
+    profiles = GenerationProfiles(config_path="", default="balanced")
+    assert profiles.get().name == "balanced"
+    assert profiles.get().deadline_s == 0
+    assert profiles.get("fast").deadline_s > 0
+
+def test_overrides_extend_the_built_in_profiles(tmp_path):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps({
+        "fast": {"max_new_tokens": 32},
+        "brief": {"max_new_tokens": 80, "stop": ["\n\n"]},
+        "broken": {"no_such_setting": 1},
+    }))
+    profiles = GenerationProfiles(config_path=str(path), default="brief")
+    assert profiles.get("fast").max_new_tokens == 32
+    assert not profiles.get("fast").do_sample
+    assert profiles.get().stop == ("\n\n",)
+    assert "broken" not in profiles.profiles
+    with pytest.raises(UnknownProfileError):
+        profiles.get("missing")
+
+def test_max_length_caps_both_backends():
+    profile = resolve_profile(GenerationProfiles(config_path="").get("thorough"), max_length=20)
+    assert (profile.max_new_tokens, profile.openai_max_tokens) == (20, 20)
+
+def test_stop_sequence_split_across_chunks_is_never_streamed():
+    chunks = []
+    stream = StopSequenceFilter(chunks.append, ("\nUser:",))
+    for chunk in ["Drink water.", "\nUs", "er: and", " more"]:
+        stream(chunk)
+    stream.flush()
+    assert "".join(chunks) == "Drink water."
+    assert stream.stopped
+    assert trim_at_stop("No stop here", ("\nUser:",)) == ("No stop here", False)
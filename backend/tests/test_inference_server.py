@@ -0,0 +1,104 @@
+"""
+Inference server protocol: API workers generate and stream over the Unix socket, and server errors map back
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import inference_server
+from conftest import ScriptedModel
+from executor import InferenceExecutor, QueueFullError
+from inference_client import InferenceClient, RemoteModel
+from models import fallback_responder
+from registry import ModelRegistry
+
+class Turn(NamedTuple):
+    role: str
+    content: str
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    """The inference server, serving a ScriptedModel as ``local``, on a socket in tmp_path"""
+    import uvicorn
+
+    monkeypatch.setattr(inference_server, "model_registry",
+                        ModelRegistry({"local": ScriptedModel}, config_path="", skip_backends=("openai",)))
+    path = str(tmp_path / "inference.sock")
+    server = uvicorn.Server(uvicorn.Config(inference_server.app, uds=path, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield path
+    server.should_exit = True
+    thread.join(10)
+
+async def connected_model(path: str) -> RemoteModel:
+    model = RemoteModel("local", client=InferenceClient(path))
+    model.load_model()
+    while not model.ready:
+        await asyncio.sleep(0.01)
+        await model.client.refresh()
+    return model
+
+def test_generate_and_stream_over_the_socket(socket_path):
+    async def scenario():
+        model = await connected_model(socket_path)
+        try:
+            history = [Turn("user", "Hi"), Turn("assistant", "Hello")]
+            response = await model.generate_response("What causes diabetes?", history=history, conversation_id="c")
+            deltas = []
+            streamed = await model.stream_response("How is it treated?", deltas.append)
+            return response, deltas, streamed
+        finally:
+            await model.client.close()
+
+    response, deltas, streamed = asyncio.run(scenario())
+    assert response == "Answer to What causes diabetes?"
+    assert "".join(deltas).strip() == streamed == "Answer to How is it treated?"
+    served = inference_server.model_registry.get("local")
+    assert served.prompts[0] == ("What causes diabetes?", [("user", "Hi"), ("assistant", "Hello")])
+
+def test_a_full_server_queue_is_reported_as_queue_full(socket_path, monkeypatch):
+    release = threading.Event()
+    served = inference_server.model_registry.get("local")
+    monkeypatch.setattr(served, "generate_response", lambda prompt, **_: release.wait(5) and "late")
+    monkeypatch.setattr(inference_server, "inference_executor", InferenceExecutor(max_workers=1, max_queue=0))
+
+    async def scenario():
+        model = await connected_model(socket_path)
+        try:
+            first = asyncio.ensure_future(model.generate_response("first"))
+            await asyncio.sleep(0.1)
+            with pytest.raises(QueueFullError):
+                await model.generate_response("second")
+            release.set()
+            return await first
+        finally:
+            release.set()
+            await model.client.close()
+
+    assert asyncio.run(scenario()) == "late"
+
+def test_an_unreachable_server_answers_with_the_fallback(tmp_path):
+    async def scenario():
+        model = RemoteModel("local", client=InferenceClient(str(tmp_path / "missing.sock")))
+        model.client.connect()
+        try:
+            await model.client.refresh()
+            return model.state, await model.generate_response("What causes diabetes?")
+        finally:
+            await model.client.close()
+
+    state, response = asyncio.run(scenario())
+    assert state == "unreachable"
+    assert fallback_responder.is_fallback(response)
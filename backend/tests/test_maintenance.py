@@ -0,0 +1,136 @@
+"""
+Retention archiving: every batch must be restorable before it is deleted
+"""
+
+import asyncio
+import gzip
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database
+import transfer
+from database import ConversationDB, MessageDB
+from maintenance import MaintenanceJob
+
+FORMATS = ["ndjson"] + (["parquet"] if transfer.parquet_available() else [])
+
+def read_archive(path: str) -> list:
+    """Records as setup_db.py --import would load them"""
+    if path.endswith(".parquet"):
+        return [record for batch in transfer.parquet_batches(path) for record in batch]
+    with gzip.open(path, "rb") as lines:
+        return [record for batch in transfer.ndjson_batches(lines) for record in batch]
+
+async def seed(conversations: int):
+    old = datetime.now() - timedelta(days=30)
+    async with database.SessionLocal() as session:
+        for number in range(conversations):
+            conversation_id = f"conv_{number}"
+            session.add(ConversationDB(id=conversation_id, title="t", created_at=old, updated_at=old))
+            session.add_all([
+                MessageDB(conversation_id=conversation_id, role="user", content=f"question {number}", timestamp=old),
+                MessageDB(conversation_id=conversation_id, role="assistant", content=f"answer {number}", timestamp=old),
+            ])
+        await session.commit()
+
+async def stored_contents() -> set:
+    async with database.SessionLocal() as session:
+        return set((await session.execute(select(MessageDB.content))).scalars())
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path}/medai.db"
+    database.upgrade_schema(url)
+    monkeypatch.setattr(database, "engine", None)
+    return url
+
+def run_with_engine(url: str, scenario):
+    async def run():
+        database.engine = database.create_engine_for(url)
+        database.SessionLocal.configure(bind=database.engine)
+        try:
+            return await scenario()
+        finally:
+            await database.engine.dispose()
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_batches_are_readable_before_they_are_deleted(sqlite_db, tmp_path, fmt):
+    job = MaintenanceJob(retention_days=7, archive_path=str(tmp_path / "archive"), archive_format=fmt,
+                         batch_size=2, pause_ms=0)
+    delete_messages = job._delete_messages
+    checked = []
+
+    async def checked_delete(engine, ids, lengths, reason, report):
+        if reason == "retention":
+            # The rows about to go must already be in a finished archive
+            contents = {record["content"] for record in read_archive(report["archive_files"][-1])}
+            assert contents and contents <= await stored_contents()
+            assert len(contents) == len(ids)
+            checked.append(report["archive_files"][-1])
+        await delete_messages(engine, ids, lengths, reason, report)
+
+    job._delete_messages = checked_delete
+
+    async def scenario():
+        await seed(3)
+        return await job.run(), await stored_contents()
+
+    report, remaining = run_with_engine(sqlite_db, scenario)
+    assert remaining == set()
+    assert report["archived_conversations"] == 3
+    assert checked == report["archive_files"] and len(checked) == 2
+    assert sum(len(read_archive(path)) for path in report["archive_files"]) == 6
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_interrupted_run_leaves_complete_archives(sqlite_db, tmp_path, fmt):
+    job = MaintenanceJob(retention_days=7, archive_path=str(tmp_path / "archive"), archive_format=fmt,
+                         batch_size=2, pause_ms=0)
+    delete_messages = job._delete_messages
+
+    async def crash_on_second_batch(engine, ids, lengths, reason, report):
+        if len(report["archive_files"]) == 2:
+            raise KeyboardInterrupt
+        await delete_messages(engine, ids, lengths, reason, report)
+
+    job._delete_messages = crash_on_second_batch
+
+    async def scenario():
+        await seed(3)
+        with pytest.raises(KeyboardInterrupt):
+            await job.run()
+        return await stored_contents()
+
+    remaining = run_with_engine(sqlite_db, scenario)
+    archives = sorted(str(path) for path in (tmp_path / "archive").glob("conversations-*"))
+    assert len(archives) == 2
+    # Both files import cleanly; the second batch is archived and still in the database
+    assert {record["content"] for record in read_archive(archives[1])} == remaining
+    assert len(read_archive(archives[0])) + len(remaining) == 6
+
+def test_runs_in_the_same_second_get_separate_archives(sqlite_db, tmp_path):
+    def make_job():
+        return MaintenanceJob(retention_days=7, archive_path=str(tmp_path / "archive"), batch_size=10, pause_ms=0)
+
+    async def scenario():
+        await seed(1)
+        first = await make_job().run()
+        await seed_more()
+        return first, await make_job().run()
+
+    async def seed_more():
+        old = datetime.now() - timedelta(days=30)
+        async with database.SessionLocal() as session:
+            session.add(ConversationDB(id="conv_later", title="t", created_at=old, updated_at=old))
+            session.add(MessageDB(conversation_id="conv_later", role="user", content="later", timestamp=old))
+            await session.commit()
+
+    first, second = run_with_engine(sqlite_db, scenario)
+    assert second["archived_conversations"] == 1
+    assert set(first["archive_files"]).isdisjoint(second["archive_files"])
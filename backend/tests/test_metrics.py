@@ -0,0 +1,39 @@
+"""
+Metrics: Prometheus text exposition, and request series labelled by route template
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import metrics
+
+def test_histograms_render_cumulative_buckets():
+    registry = metrics.Registry()
+    latency = registry.histogram("test_latency_seconds", "Test latency", ("operation",), buckets=(0.1, 1))
+    latency.observe(0.05, operation="read")
+    latency.observe(0.5, operation="read")
+    latency.observe(5, operation="read")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP test_latency_seconds Test latency", "# TYPE test_latency_seconds histogram"]
+    assert 'test_latency_seconds_bucket{operation="read",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{operation="read",le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{operation="read",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_sum{operation="read"} 5.55' in lines
+    assert 'test_latency_seconds_count{operation="read"} 3' in lines
+
+def test_label_values_are_escaped():
+    registry = metrics.Registry()
+    errors = registry.counter("test_errors_total", "Test errors", ("error",))
+    errors.inc(error='say "hi"\n')
+    assert 'test_errors_total{error="say \\"hi\\"\\n"} 1' in registry.render()
+
+def test_requests_are_counted_per_route_template(api):
+    before = metrics.http_requests.value(route="/conversations/{conversation_id}", method="GET", status=404)
+    api.get("/conversations/conv_missing")
+    api.get("/conversations/conv_also_missing")
+    after = metrics.http_requests.value(route="/conversations/{conversation_id}", method="GET", status=404)
+    assert after - before == 2
+    exposition = api.get("/metrics").text
+    assert 'medai_http_requests_total{route="/conversations/{conversation_id}",method="GET",status="404"}' in exposition
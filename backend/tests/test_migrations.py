@@ -0,0 +1,75 @@
+"""
+Migrations: a pre-migration database upgrades in place to the schema the models declare
+"""
+
+import asyncio
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, func, select
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database
+from database import Base, ConversationDB, MessageDB
+
+def make_legacy_database(path: Path):
+    """Tables as create_all made them before migrations: no composite indexes or foreign key"""
+    with sqlite3.connect(path) as legacy:
+        legacy.executescript("""
+            CREATE TABLE conversations (id VARCHAR NOT NULL, title VARCHAR NOT NULL, created_at DATETIME,
+                                        updated_at DATETIME, PRIMARY KEY (id));
+            CREATE TABLE messages (id INTEGER NOT NULL, conversation_id VARCHAR NOT NULL, role VARCHAR NOT NULL,
+                                   content TEXT NOT NULL, timestamp DATETIME, PRIMARY KEY (id));
+            CREATE INDEX idx_messages_conversation_id ON messages (conversation_id);
+            INSERT INTO conversations VALUES ('conv_1', 'kept', '2024-01-01 10:00:00', NULL);
+            INSERT INTO messages (conversation_id, role, content, timestamp)
+                VALUES ('conv_1', 'user', 'question', '2024-01-01 10:00:00'),
+                       ('conv_1', 'assistant', 'answer', NULL),
+                       ('conv_gone', 'user', 'orphan', '2024-01-01 10:00:00');
+        """)
+
+def test_legacy_database_upgrades_to_the_model_schema(tmp_path):
+    path = tmp_path / "medai.db"
+    make_legacy_database(path)
+    database.upgrade_schema(f"sqlite:///{path}")
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        differences = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+        contents = list(connection.execute(select(MessageDB.content).order_by(MessageDB.id)).scalars())
+        missing_timestamps = connection.execute(
+            select(func.count()).select_from(MessageDB).where(MessageDB.timestamp.is_(None))
+        ).scalar()
+    engine.dispose()
+    assert differences == []
+    # Orphaned messages are dropped, the rest are kept with a timestamp
+    assert contents == ["question", "answer"]
+    assert missing_timestamps == 0
+
+def test_deleting_a_conversation_deletes_its_messages(tmp_path):
+    url = f"sqlite:///{tmp_path}/medai.db"
+    database.upgrade_schema(url)
+
+    now = datetime.now()
+
+    async def scenario():
+        engine = database.create_engine_for(url)
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(ConversationDB.__table__.insert(), {
+                    "id": "conv_1", "title": "t", "created_at": now, "updated_at": now,
+                })
+                await connection.execute(MessageDB.__table__.insert(), {
+                    "conversation_id": "conv_1", "role": "user", "content": "question", "timestamp": now,
+                })
+                await connection.execute(ConversationDB.__table__.delete())
+                return (await connection.execute(select(func.count()).select_from(MessageDB))).scalar()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == 0
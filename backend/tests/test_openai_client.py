@@ -0,0 +1,107 @@
+"""
+OpenAI client resilience: breaker states, retries that feed the breaker, hedged requests
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from openai_client import CircuitBreaker, OpenAIUnavailable, ResilientOpenAI
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def make_client(**settings) -> ResilientOpenAI:
+    client = ResilientOpenAI(api_key="test")
+    client.backoff_base = 0
+    for name, value in settings.items():
+        setattr(client, name, value)
+    return client
+
+def test_breaker_opens_then_lets_one_trial_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    for _ in range(2):
+        assert breaker.allow() == "closed"
+        breaker.record_failure()
+    assert breaker.state == "open" and breaker.allow() is None
+
+    clock.now = 10
+    assert breaker.allow() == "half_open"
+    # Only one trial at a time
+    assert breaker.allow() is None and not breaker.available()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 20
+    assert breaker.allow() == "half_open"
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["times_opened"] == 2
+
+def test_transient_errors_are_retried():
+    client = make_client(max_retries=2)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("connection reset")
+        return "completion"
+
+    async def scenario():
+        try:
+            return await client._call(flaky)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario()) == "completion"
+    assert len(calls) == 3
+    assert client.breaker.stats()["consecutive_failures"] == 0
+
+def test_exhausted_retries_count_towards_opening_the_circuit():
+    client = make_client(max_retries=1)
+    client.breaker.failure_threshold = 2
+
+    async def down():
+        raise httpx.ConnectError("connection refused")
+
+    async def scenario():
+        try:
+            for _ in range(2):
+                with pytest.raises(OpenAIUnavailable):
+                    await client._call(down)
+            with pytest.raises(OpenAIUnavailable, match="circuit is open"):
+                await client._call(down)
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+    assert client.breaker.state == "open"
+
+def test_a_slow_request_is_hedged_by_a_second_one():
+    client = make_client(hedge_after=0.05)
+    started = []
+
+    async def request():
+        started.append(1)
+        await asyncio.sleep(5 if len(started) == 1 else 0)
+        return f"reply {len(started)}"
+
+    async def scenario():
+        try:
+            return await asyncio.wait_for(client._hedged(request), 1)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario()) == "reply 2"
+    assert len(started) == 2
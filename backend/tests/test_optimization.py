@@ -0,0 +1,38 @@
+"""
+CPU inference modes: int8 keeps the model's outputs, unavailable modes fall back to float32
+"""
+
+import sys
+from pathlib import Path
+
+import torch
+from transformers import AutoTokenizer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import optimization
+
+def logits(model, tokenizer) -> torch.Tensor:
+    ids = torch.tensor([tokenizer.encode("User: What causes diabetes?\nAssistant:")])
+    with torch.no_grad():
+        return model(ids).logits.flatten()
+
+def test_int8_is_smaller_and_predicts_like_float32(tiny_model):
+    tokenizer = AutoTokenizer.from_pretrained(tiny_model)
+    full, full_mode = optimization.load_model(tiny_model, "cpu", "none")
+    quantized, mode = optimization.load_model(tiny_model, "cpu", "int8")
+    assert (full_mode, mode) == ("none", "int8")
+    assert optimization.model_memory_bytes(quantized) < optimization.model_memory_bytes(full)
+    correlation = torch.corrcoef(torch.stack([logits(full, tokenizer), logits(quantized, tokenizer)]))[0, 1]
+    assert correlation > 0.99
+
+def test_onnx_without_optimum_loads_the_pytorch_model(tiny_model, monkeypatch):
+    # Importing a module mapped to None raises ImportError
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", None)
+    model, mode = optimization.load_model(tiny_model, "cpu", "onnx", onnx_path="")
+    assert mode == "none"
+    assert isinstance(model, torch.nn.Module)
+
+def test_unknown_mode_falls_back_to_none(monkeypatch):
+    monkeypatch.setenv("MODEL_OPTIMIZATION", "fp4")
+    assert optimization.get_mode() == "none"
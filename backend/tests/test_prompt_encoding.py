@@ -0,0 +1,46 @@
+"""
+Prompt encoding: pre-tokenized preamble and turns give the ids of the full prompt text, within the context
+"""
+
+import sys
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generation import GenerationProfiles
+from models import PREAMBLE, BioMedLMModel
+
+class Turn(NamedTuple):
+    role: str
+    content: str
+
+@pytest.fixture(scope="module")
+def model(tiny_model):
+    model = BioMedLMModel(model=tiny_model, optimization_mode="none")
+    model.load_model()
+    assert model.ready
+    return model
+
+def test_encoded_turns_match_tokenizing_the_whole_prompt(model):
+    history = [Turn("user", "What causes diabetes?"), Turn("assistant", "Insulin resistance, mostly.")]
+    ids = model._encode_prompt("How is it treated?", history, GenerationProfiles(config_path="").get("balanced"))
+    text = (PREAMBLE + "\nUser: What causes diabetes?\nAssistant: Insulin resistance, mostly."
+            "\nUser: How is it treated?\nAssistant:")
+    assert ids == model.tokenizer.encode(text)
+
+def test_long_histories_drop_whole_turns_to_fit_the_context(model):
+    profile = GenerationProfiles(config_path="").get("fast")
+    history = [Turn("user", f"question {number} " + "word " * 20) if number % 2 == 0
+               else Turn("assistant", "reply " * 20) for number in range(60)]
+    ids = model._encode_prompt("How is it treated?", history, profile)
+    prompt_ids = model._encode_turns([("user", "How is it treated?")])[0]
+
+    assert len(ids) + min(profile.max_new_tokens, model.context_limit // 4) <= model.context_limit
+    assert ids[:len(model._preamble_ids)] == model._preamble_ids
+    assert ids[-len(prompt_ids):] == prompt_ids
+    # What is kept of the history starts at a question, never mid-turn
+    kept = model.tokenizer.decode(ids[len(model._preamble_ids):-len(prompt_ids)])
+    assert kept.startswith("\nUser: question") and "question 58" in kept
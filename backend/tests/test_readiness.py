@@ -0,0 +1,27 @@
+"""
+Lazy model loading: the API serves while the model loads, and /ready says when it can answer
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main
+
+def test_ready_only_once_the_default_model_has_loaded(api):
+    model = main.model_registry.default
+    model.state = "loading"
+    assert api.get("/health").json()["model_state"] == "loading"
+    response = api.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"ready": False, "model": "local", "model_state": "loading"}
+
+    model.state = "ready"
+    assert api.get("/ready").json()["ready"] is True
+
+def test_a_named_model_that_is_still_loading_is_unavailable(api):
+    main.model_registry.default.state = "loading"
+    response = api.post("/chat", json={"message": "What causes diabetes?", "model": "local"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,103 @@
+"""
+Model registry routing: named requests only get a loaded model, rules pick ready ones
+"""
+
+import asyncio
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from registry import ModelRegistry, ModelNotLoadedError, UnknownModelError
+
+class FakeLocalModel:
+    backend = "local"
+    batcher = None
+
+    def __init__(self, name: str, **_):
+        self.name = name
+        self.state = "not_loaded"
+        self.release = threading.Event()
+        self.loads = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load_model(self):
+        self.loads += 1
+        self.state = "loading"
+        self.release.wait(5)
+        self.state = "ready"
+
+    def unload(self):
+        self.state = "not_loaded"
+
+    def memory_bytes(self) -> int:
+        return 0
+
+class FakeRemoteModel:
+    backend = "openai"
+    is_async = True
+
+    def __init__(self, name: str, **_):
+        self.name = name
+        self.ready = False
+
+    def load_model(self):
+        pass
+
+    def available(self) -> bool:
+        return False
+
+    async def close(self):
+        pass
+
+def make_registry(tmp_path, config: dict) -> ModelRegistry:
+    path = tmp_path / "models.json"
+    path.write_text(json.dumps(config))
+    return ModelRegistry({"local": FakeLocalModel, "openai": FakeRemoteModel}, config_path=str(path),
+                         memory_budget_mb=0)
+
+def test_requests_for_a_loading_model_are_refused_until_it_is_ready(tmp_path):
+    registry = make_registry(tmp_path, {"models": {"small": {"backend": "local", "preload": True}}})
+    small = registry.models["small"]
+
+    async def scenario():
+        await registry.start()
+        await asyncio.sleep(0.05)
+        # Loading was started by the preload, not by these requests
+        for _ in range(2):
+            with pytest.raises(ModelNotLoadedError):
+                registry.route("hello", "small")
+        small.release.set()
+        registry.models["local"].release.set()
+        while not small.ready:
+            await asyncio.sleep(0.01)
+        chosen = registry.route("hello", "small")
+        await registry.close()
+        return chosen
+
+    assert asyncio.run(scenario()) is small
+    assert small.loads == 1
+
+def test_unknown_models_are_rejected(tmp_path):
+    registry = make_registry(tmp_path, {})
+    with pytest.raises(UnknownModelError):
+        registry.route("hello", "missing")
+
+def test_rules_only_route_to_ready_models(tmp_path):
+    registry = make_registry(tmp_path, {
+        "models": {"small": {"backend": "local"}},
+        "routes": [{"model": "small", "max_chars": 10}],
+    })
+    local, small = registry.models["local"], registry.models["small"]
+    local.state = "ready"
+    assert registry.route("short") is local
+    small.state = "ready"
+    assert registry.route("short") is small
+    assert registry.route("a much longer question") is local
@@ -0,0 +1,50 @@
+"""
+Retrieval index: appended questions are found again, and a misconfigured index stays out of the way
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retrieval import HashingEmbedder, IndexEntry, RetrievalIndex, question_hash
+
+ENTRIES = [
+    IndexEntry(1, 2, True, "What causes diabetes?"),
+    IndexEntry(3, 4, False, "What are the symptoms of depression?"),
+    IndexEntry(5, 6, True, "How is high blood pressure treated?"),
+]
+
+def open_index(path, dim: int = 64) -> RetrievalIndex:
+    index = RetrievalIndex(path=str(path), embedder=HashingEmbedder(dim), enabled=True)
+    index.open()
+    return index
+
+def test_search_finds_the_closest_question(tmp_path):
+    index = open_index(tmp_path)
+    index.add(ENTRIES)
+    hits = index.search("what causes diabetes", limit=2)
+    assert len(index) == 3
+    assert (hits[0].question_id, hits[0].answer_id) == (1, 2)
+    assert hits[0].question_hash == question_hash("What causes diabetes?")
+    assert hits[0].score > hits[1].score
+    assert all(hit.standalone for hit in index.search("symptoms of depression", standalone_only=True))
+
+def test_other_processes_see_appended_rows(tmp_path):
+    writer, reader = open_index(tmp_path), open_index(tmp_path)
+    writer.add(ENTRIES[:1])
+    assert len(reader.search("diabetes")) == 1
+    writer.add(ENTRIES[1:])
+    assert len(reader.search("diabetes")) == 3
+
+def test_unopened_index_does_nothing(tmp_path):
+    index = RetrievalIndex(path=str(tmp_path / "index"), enabled=True)
+    index.add(ENTRIES)
+    assert index.search("diabetes") == []
+    assert not (tmp_path / "index").exists()
+
+def test_index_built_with_another_embedder_is_disabled(tmp_path):
+    open_index(tmp_path, dim=64).add(ENTRIES)
+    index = open_index(tmp_path, dim=32)
+    assert not index.enabled
+    assert index.search("diabetes") == []
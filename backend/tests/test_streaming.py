@@ -0,0 +1,46 @@
+"""
+/chat/stream: deltas as server-sent events, a final done event, errors as events after the headers
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main
+from executor import InferenceExecutor
+
+def read_events(response) -> list:
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+def test_deltas_add_up_to_the_saved_response(api):
+    response = api.post("/chat/stream", json={"message": "What causes diabetes?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = read_events(response)
+    deltas = "".join(data["delta"] for event, data in events[:-1])
+    event, done = events[-1]
+    assert event == "done"
+    assert deltas.strip() == done["response"] == "Answer to What causes diabetes?"
+
+    saved = api.get(f"/conversations/{done['conversation_id']}").json()
+    assert [message["content"] for message in saved["messages"]] == ["What causes diabetes?", done["response"]]
+
+def test_a_generation_that_times_out_ends_with_an_error_event(api, monkeypatch):
+    release = threading.Event()
+    model = main.model_registry.get("local")
+    monkeypatch.setattr(model, "stream_response", lambda prompt, on_delta, **_: release.wait(5) and "late")
+    monkeypatch.setattr(main, "inference_executor", InferenceExecutor(max_workers=1, max_queue=0, timeout=0.2))
+    try:
+        events = read_events(api.post("/chat/stream", json={"message": "What causes diabetes?"}))
+    finally:
+        release.set()
+    assert events == [("error", {"detail": "Response generation timed out, please try again"})]
+    assert api.get("/conversations").json()["conversations"] == []
@@ -0,0 +1,54 @@
+"""
+Request tracing: the Server-Timing breakdown, and exported spans joining the caller's trace
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+def server_timing(response) -> dict:
+    entries = {}
+    for entry in response.headers["Server-Timing"].split(", "):
+        name, duration = entry.split(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+def test_chat_reports_its_stages_in_server_timing(api):
+    response = api.post("/chat", json={"message": "What causes diabetes?"})
+    assert response.status_code == 200
+    timings = server_timing(response)
+    assert {"route", "cache", "generate", "db.save_conversation", "total"} <= set(timings)
+    assert timings["total"] >= timings["generate"]
+
+def test_spans_of_a_sampled_request_join_the_callers_trace(api, tmp_path, monkeypatch):
+    exporter = tracing.SpanExporter("file", path=str(tmp_path / "spans.jsonl"), interval=0.05)
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    exporter.start()
+    api.get("/health", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    api.get("/health", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})
+    exporter.shutdown()
+
+    spans = [span for line in (tmp_path / "spans.jsonl").read_text().splitlines()
+             for resource in json.loads(line)["resourceSpans"]
+             for scope in resource["scopeSpans"] for span in scope["spans"]]
+    # The unsampled request exports nothing
+    assert [span["name"] for span in spans] == ["GET /health"]
+    assert spans[0]["traceId"] == TRACE_ID and spans[0]["parentSpanId"] == PARENT_ID
+
+def test_malformed_traceparent_headers_are_ignored():
+    assert tracing._parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert tracing._parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert tracing._parse_traceparent("00-not-hex-01") is None
+    assert tracing._parse_traceparent(None) is None
+
+def test_spans_outside_a_request_do_nothing():
+    with tracing.span("db.commit") as current:
+        assert current is None
+    assert tracing.propagation_headers() == {}
@@ -0,0 +1,25 @@
+"""
+Timestamps in export filters and imported records
+"""
+
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transfer
+
+def test_aware_timestamps_are_converted_to_the_stored_local_clock():
+    parsed = transfer._parse_timestamp("2024-01-01T12:00:00+02:00")
+    expected = datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert parsed == expected and parsed.tzinfo is None
+
+def test_naive_timestamps_are_kept_as_they_are():
+    assert transfer._parse_timestamp("2024-01-01T12:00:00") == datetime(2024, 1, 1, 12, 0)
+
+def test_imported_records_use_the_same_clock():
+    record = transfer.parse_record({
+        "conversation_id": "c", "role": "user", "content": "hi", "timestamp": "2024-01-01T12:00:00Z",
+    })
+    assert record["timestamp"] == datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
@@ -0,0 +1,119 @@
+"""
+Write-behind persistence: batched flushes, and WAL replay after a crash without losing or duplicating turns
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database
+from database import MessageDB
+from write_behind import WriteBehindQueue
+
+class Turn(NamedTuple):
+    role: str
+    content: str
+    timestamp: str
+
+def turn(number: int) -> list:
+    asked = datetime(2024, 1, 1) + timedelta(minutes=number)
+    return [Turn("user", f"question {number}", asked.isoformat()),
+            Turn("assistant", f"answer {number}", (asked + timedelta(seconds=1)).isoformat())]
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    url = f"sqlite:///{tmp_path}/medai.db"
+    database.upgrade_schema(url)
+    return url
+
+def run_with_sessions(url: str, scenario):
+    async def run():
+        engine = database.create_engine_for(url)
+        try:
+            return await scenario(async_sessionmaker(engine, expire_on_commit=False))
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+def make_queue(sessions, tmp_path, **options) -> WriteBehindQueue:
+    return WriteBehindQueue(sessions, enabled=True, batch_size=100, interval_ms=60000,
+                            wal_path=str(tmp_path / "chat.wal"), wal_sync="off", **options)
+
+async def stored_count(sessions) -> int:
+    async with sessions() as db:
+        return (await db.execute(select(func.count(MessageDB.id)))).scalar()
+
+def crash(queue: WriteBehindQueue):
+    """Stop a queue the way a killed process would: no flush, files and lock just go away"""
+    queue._task.cancel()
+    queue._wal.close()
+    queue._wal_lock.close()
+
+def test_turns_are_written_in_one_batch_with_their_ids(sqlite_db, tmp_path):
+    saved = []
+
+    async def scenario(sessions):
+        queue = make_queue(sessions, tmp_path, on_saved=lambda cid, rows, first: saved.append((cid, rows, first)))
+        await queue.start()
+        await queue.submit("conv_a", "t", turn(0))
+        await queue.submit("conv_a", "t", turn(1))
+        assert await stored_count(sessions) == 0 and len(queue.pending("conv_a")) == 2
+        await queue.stop()
+        return await stored_count(sessions), queue.stats()
+
+    count, stats = run_with_sessions(sqlite_db, scenario)
+    assert count == 4
+    assert stats["batches"] == 1 and stats["flushed_turns"] == 2
+    assert [first for _, _, first in saved] == [True, False]
+    assert all(row.id for _, rows, _ in saved for row in rows)
+
+def test_turns_logged_before_a_crash_are_replayed(sqlite_db, tmp_path):
+    async def scenario(sessions):
+        queue = make_queue(sessions, tmp_path)
+        await queue.start()
+        await queue.submit("conv_a", "t", turn(0))
+        await queue.submit("conv_b", "t", turn(1))
+        crash(queue)
+        # A crash mid-write leaves a torn last line
+        with open(tmp_path / "chat.wal", "a", encoding="utf-8") as log:
+            log.write('{"conversation_id": "conv_c", "mess')
+
+        restarted = make_queue(sessions, tmp_path)
+        await restarted.start()
+        await restarted.stop()
+        return await stored_count(sessions), restarted.stats()
+
+    count, stats = run_with_sessions(sqlite_db, scenario)
+    assert count == 4
+    assert stats["replayed_messages"] == 4
+
+def test_a_batch_committed_before_the_crash_is_not_written_twice(sqlite_db, tmp_path):
+    async def scenario(sessions):
+        queue = make_queue(sessions, tmp_path)
+        await queue.start()
+        await queue.submit("conv_a", "t", turn(0))
+        await queue.submit("conv_a", "t", turn(1))
+        logged = (tmp_path / "chat.wal").read_text()
+        await queue.flush()
+        crash(queue)
+        # As if the process died after the commit but before deleting the rotated log
+        (tmp_path / "chat.wal.flushing").write_text(logged)
+
+        restarted = make_queue(sessions, tmp_path)
+        await restarted.start()
+        await restarted.submit("conv_a", "t", turn(2))
+        await restarted.stop()
+        return await stored_count(sessions), restarted.stats()
+
+    count, stats = run_with_sessions(sqlite_db, scenario)
+    assert count == 6
+    assert stats["replayed_messages"] == 0
+    assert not (tmp_path / "chat.wal.flushing").exists()
@@ -0,0 +1,347 @@
+"""
+Request Tracing for MedAI
+Spans around the stages of each request, exported in the OpenTelemetry
+format (OTLP/JSON) to a file or a collector, and summed up per request in a
+Server-Timing response header
+"""
+
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "file" appends spans to TRACING_FILE, "otlp" sends them to a collector; unset keeps them in-process
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "./traces/spans.jsonl")
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+# Fraction of requests whose spans are exported (requests arriving with a sampled traceparent always are)
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1"))
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+class Span:
+    """One timed operation; ids and fields follow the OpenTelemetry data model"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "error",
+                 "_started")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: int = KIND_INTERNAL,
+                 attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter()
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self) -> float:
+        """Finish the span; returns its duration in seconds"""
+        self.end_ns = time.time_ns()
+        return time.perf_counter() - self._started
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": 2, "message": self.error}
+        return span
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: dict) -> List[dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+class RequestTrace:
+    """The trace one request belongs to, and how long each of its stages took"""
+
+    def __init__(self, trace_id: str = None, sampled: bool = False):
+        self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+        self.sampled = sampled
+        # Stage name -> milliseconds, summed when a stage runs more than once
+        self.timings: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds * 1000
+
+    def server_timing(self, total: float = None) -> str:
+        entries = [f"{_token(name)};dur={ms:.1f}" for name, ms in self.timings.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+def _token(name: str) -> str:
+    # Server-Timing metric names are HTTP tokens
+    return "".join(c if c.isalnum() or c in "-_.!#$%&'*+^`|~" else "_" for c in name)
+
+_request: ContextVar[Optional[RequestTrace]] = ContextVar("medai_request_trace", default=None)
+_current: ContextVar[Optional[Span]] = ContextVar("medai_current_span", default=None)
+
+class SpanExporter:
+    """Batches finished spans off the request path and writes them as OTLP/JSON.
+
+    ``file`` appends one OTLP export request per line (the layout the
+    OpenTelemetry Collector's otlpjsonfile receiver reads); ``otlp`` POSTs
+    the same JSON to a collector's /v1/traces endpoint. Spans are dropped,
+    not queued without bound, if the exporter falls behind.
+    """
+
+    def __init__(self, kind: str, path: str = None, endpoint: str = None, service_name: str = None,
+                 batch_size: int = 512, interval: float = 1.0, max_queue: int = 10000):
+        self.kind = kind
+        self.path = Path(path or TRACING_FILE)
+        self.endpoint = (endpoint or OTLP_ENDPOINT).rstrip("/") + "/v1/traces"
+        self.service_name = service_name or os.getenv("OTEL_SERVICE_NAME") or "medai-api"
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._http = None
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread:
+            return
+        if self.kind == "file":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        else:
+            self._http = httpx.Client(timeout=5.0)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        target = self.path if self.kind == "file" else self.endpoint
+        logger.info(f"Exporting trace spans to {target}")
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._stopping.wait(self.interval)
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                return
+            self._write(batch)
+
+    def _payload(self, spans: List[Span]) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name, "process.pid": os.getpid()})},
+            "scopeSpans": [{"scope": {"name": "medai"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+    def _write(self, spans: List[Span]):
+        try:
+            if self.kind == "file":
+                # One write per line with O_APPEND, so API workers can share the file
+                with open(self.path, "a", encoding="utf-8") as output:
+                    output.write(json.dumps(self._payload(spans)) + "\n")
+            else:
+                self._http.post(self.endpoint, json=self._payload(spans)).raise_for_status()
+            self.exported += len(spans)
+        except (OSError, httpx.HTTPError) as e:
+            if not self.failed:
+                logger.error(f"Could not export {len(spans)} trace spans: {e}")
+            self.failed += len(spans)
+
+    def shutdown(self):
+        """Stop after writing out the spans already queued"""
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        if self._http:
+            self._http.close()
+            self._http = None
+
+    def stats(self) -> dict:
+        return {
+            "exporter": self.kind,
+            "target": str(self.path) if self.kind == "file" else self.endpoint,
+            "exported_spans": self.exported,
+            "dropped_spans": self.dropped,
+            "failed_spans": self.failed,
+        }
+
+def _make_exporter() -> Optional[SpanExporter]:
+    if not TRACING_EXPORTER:
+        return None
+    if TRACING_EXPORTER not in ("file", "otlp"):
+        logger.error(f"Unknown TRACING_EXPORTER '{TRACING_EXPORTER}', spans will not be exported")
+        return None
+    return SpanExporter(TRACING_EXPORTER)
+
+exporter = _make_exporter()
+
+def configure(service_name: str):
+    """Name the service spans are exported under (before start)"""
+    if exporter:
+        exporter.service_name = os.getenv("OTEL_SERVICE_NAME") or service_name
+
+def start():
+    if exporter:
+        exporter.start()
+
+def shutdown():
+    if exporter:
+        exporter.shutdown()
+
+def stats() -> dict:
+    return {
+        "server_timing": SERVER_TIMING_ENABLED,
+        "sample_rate": TRACING_SAMPLE_RATE,
+        **(exporter.stats() if exporter else {"exporter": None}),
+    }
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Time a block as a child of the current span.
+
+    Outside a traced request this does nothing, so helpers can be traced
+    unconditionally. The duration is added to the request's Server-Timing
+    entry for ``name`` and, if the request is sampled, the span is exported.
+    """
+    request = _request.get()
+    if request is None:
+        yield None
+        return
+    parent = _current.get()
+    current = Span(name, request.trace_id, parent.span_id if parent else None, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Closed from another context, e.g. a stream the client abandoned
+            pass
+        duration = current.end()
+        if parent is not None:
+            request.record(name, duration)
+        if request.sampled and exporter:
+            exporter.export(current)
+
+def traced(name: str):
+    """Decorator running each call (sync or async) in a span"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _parse_traceparent(header: Optional[str]):
+    """Trace id, parent span id and sampled flag of a W3C traceparent header"""
+    try:
+        version, trace_id, parent_id, flags = header.strip().split("-")
+        int(trace_id, 16), int(parent_id, 16)
+        if len(trace_id) != 32 or len(parent_id) != 16 or trace_id == "0" * 32:
+            return None
+        return trace_id, parent_id, bool(int(flags, 16) & 1)
+    except (AttributeError, ValueError):
+        return None
+
+def propagation_headers() -> Dict[str, str]:
+    """traceparent for an outgoing request, so the callee's spans join this trace"""
+    request, current = _request.get(), _current.get()
+    if request is None or current is None:
+        return {}
+    return {"traceparent": f"00-{request.trace_id}-{current.span_id}-{'01' if request.sampled else '00'}"}
+
+async def trace_requests(request, call_next):
+    """HTTP middleware: a server span per request and the Server-Timing header.
+
+    Register with ``app.middleware("http")(tracing.trace_requests)``. For
+    streamed responses the header covers the stages before the first byte.
+    """
+    if not (exporter or SERVER_TIMING_ENABLED):
+        return await call_next(request)
+    incoming = _parse_traceparent(request.headers.get("traceparent"))
+    if incoming:
+        trace = RequestTrace(incoming[0], sampled=incoming[2] and exporter is not None)
+    else:
+        trace = RequestTrace(sampled=exporter is not None and random.random() < TRACING_SAMPLE_RATE)
+    token = _request.set(trace)
+    try:
+        with span(request.method, kind=KIND_SERVER, **{"http.method": request.method, "url.path": request.url.path}) as root:
+            if incoming:
+                root.parent_id = incoming[1]
+            response = await call_next(request)
+            # Named by route template so /conversations/{conversation_id} is one operation
+            route = request.scope.get("route")
+            root.name = f"{request.method} {route.path if route else 'unmatched'}"
+            root.set_attribute("http.status_code", response.status_code)
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = trace.server_timing((root.end_ns - root.start_ns) / 1e9)
+        return response
+    finally:
+        _request.reset(token)
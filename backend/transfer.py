@@ -0,0 +1,344 @@
+"""
+Bulk Export and Import for MedAI
+Streams stored messages out as NDJSON or Parquet and loads such files back,
+in batches so memory use does not grow with the size of the history
+"""
+
+import asyncio
+import gzip
+import io
+import json
+import os
+import logging
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence
+from sqlalchemy import select, insert
+from dotenv import load_dotenv
+
+import database
+from database import ConversationDB, MessageDB
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor (and written per Parquet row group) at a time
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# Messages inserted per transaction on import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+# One row per message, with its conversation's fields repeated
+COLUMNS = (
+    "conversation_id", "title", "conversation_created_at", "conversation_updated_at",
+    "message_id", "role", "content", "timestamp",
+)
+_TIMESTAMP_COLUMNS = ("conversation_created_at", "conversation_updated_at", "timestamp")
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet files need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ("conversation_id", pa.string()),
+        ("title", pa.string()),
+        ("conversation_created_at", pa.timestamp("us")),
+        ("conversation_updated_at", pa.timestamp("us")),
+        ("message_id", pa.int64()),
+        ("role", pa.string()),
+        ("content", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+
+def format_for_path(path: str) -> str:
+    return "parquet" if str(path).endswith(".parquet") else "ndjson"
+
+async def iter_message_batches(session, batch_size: int = None, since: datetime = None, until: datetime = None,
+                               conversation_id: str = None,
+                               conversation_ids: Sequence[str] = None) -> AsyncIterator[List]:
+    """Messages with their conversation, ordered by conversation and time, ``batch_size`` rows at a time.
+
+    Rows come from a server-side cursor, so only one batch is in memory.
+    ``since``/``until`` bound the message timestamps (until is exclusive).
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    query = (
+        select(
+            MessageDB.conversation_id, ConversationDB.title, ConversationDB.created_at, ConversationDB.updated_at,
+            MessageDB.id, MessageDB.role, MessageDB.content, MessageDB.timestamp
+        )
+        .join(ConversationDB, ConversationDB.id == MessageDB.conversation_id)
+        .order_by(MessageDB.conversation_id, MessageDB.timestamp, MessageDB.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if since:
+        query = query.where(MessageDB.timestamp >= _parse_timestamp(since))
+    if until:
+        query = query.where(MessageDB.timestamp < _parse_timestamp(until))
+    if conversation_id:
+        query = query.where(MessageDB.conversation_id == conversation_id)
+    if conversation_ids is not None:
+        query = query.where(MessageDB.conversation_id.in_(conversation_ids))
+    result = await session.stream(query)
+    async for rows in result.partitions(batch_size):
+        yield rows
+
+class NDJSONEncoder:
+    """One JSON object per message per line"""
+
+    def encode(self, rows: List) -> bytes:
+        lines = []
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            for column in _TIMESTAMP_COLUMNS:
+                record[column] = record[column].isoformat()
+            lines.append(json.dumps(record))
+        return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+    def close(self) -> bytes:
+        return b""
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+class ParquetEncoder:
+    """One Parquet row group per batch, written out as soon as it is encoded"""
+
+    def __init__(self):
+        self._pa = _pyarrow()
+        self._schema = _parquet_schema(self._pa)
+        self._sink = _ChunkSink()
+        self._writer = self._pa.parquet.ParquetWriter(self._sink, self._schema, compression="zstd")
+
+    def encode(self, rows: List) -> bytes:
+        if rows:
+            columns = list(zip(*rows))
+            self._writer.write_table(self._pa.Table.from_arrays(
+                [self._pa.array(values, type=field.type) for values, field in zip(columns, self._schema)],
+                schema=self._schema
+            ))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+def make_encoder(fmt: str):
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    return ParquetEncoder() if fmt == "parquet" else NDJSONEncoder()
+
+async def export_chunks(fmt: str = "ndjson", batch_size: int = None, **filters) -> AsyncIterator[bytes]:
+    """Encoded export file contents, a batch at a time; ``filters`` as for iter_message_batches"""
+    encoder = make_encoder(fmt)
+    exported = 0
+    async with database.SessionLocal() as session:
+        async for rows in iter_message_batches(session, batch_size, **filters):
+            # Encoding is CPU work; keep it off the event loop
+            chunk = await asyncio.to_thread(encoder.encode, rows)
+            exported += len(rows)
+            if chunk:
+                yield chunk
+    tail = encoder.close()
+    if tail:
+        yield tail
+    logger.info(f"Exported {exported} messages as {fmt}")
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Stored timestamps are naive local time (datetime.now()), like the ones the API writes
+    if value.tzinfo is not None:
+        value = value.astimezone()
+    return value.replace(tzinfo=None)
+
+def parse_record(record: dict) -> dict:
+    """Validate one exported message row; raises ValueError when it can't be imported"""
+    try:
+        timestamp = _parse_timestamp(record["timestamp"])
+        parsed = {
+            "conversation_id": str(record["conversation_id"]),
+            "role": str(record["role"]),
+            "content": str(record["content"]),
+            "timestamp": timestamp,
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid message record: {e!r}") from None
+    if timestamp is None:
+        raise ValueError("Invalid message record: missing timestamp")
+    parsed["title"] = record.get("title") or "Imported conversation"
+    parsed["conversation_created_at"] = _parse_timestamp(record.get("conversation_created_at")) or timestamp
+    parsed["conversation_updated_at"] = _parse_timestamp(record.get("conversation_updated_at")) or timestamp
+    return parsed
+
+def ndjson_batches(lines: Iterable, batch_size: int = None) -> Iterator[List[dict]]:
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    batch = []
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            batch.append(parse_record(json.loads(line)))
+        except ValueError as e:
+            raise ValueError(f"Line {number}: {e}") from None
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def ndjson_stream_batches(chunks: AsyncIterable[bytes], batch_size: int = None) -> AsyncIterator[List[dict]]:
+    """Like ndjson_batches, for a body arriving in arbitrary chunks"""
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    buffer, number, batch = b"", 0, []
+
+    def add(line: bytes):
+        nonlocal number
+        number += 1
+        if line.strip():
+            try:
+                batch.append(parse_record(json.loads(line)))
+            except ValueError as e:
+                raise ValueError(f"Line {number}: {e}") from None
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            add(line)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    add(buffer)
+    if batch:
+        yield batch
+
+def parquet_rows(path: str) -> int:
+    """Rows in a Parquet file, from its footer"""
+    return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+
+def parquet_batches(path: str, batch_size: int = None) -> Iterator[List[dict]]:
+    pa = _pyarrow()
+    for record_batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=batch_size or IMPORT_BATCH_SIZE):
+        yield [parse_record(record) for record in record_batch.to_pylist()]
+
+async def _bulk_insert(conn, table, rows: List[dict]):
+    """COPY on PostgreSQL, a multi-row executemany elsewhere"""
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        columns = list(rows[0])
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            table.name, records=[tuple(row[column] for column in columns) for row in rows], columns=columns
+        )
+    else:
+        await conn.execute(insert(table), rows)
+
+async def import_batches(batches, engine=None) -> Dict[str, int]:
+    """Insert parsed message batches, one transaction per batch.
+
+    Conversations that already exist are skipped along with all their
+    messages, so importing the same file twice adds nothing. Message ids are
+    assigned by the database, not taken from the file.
+    """
+    engine = engine or database.get_engine()
+    created, skipped = set(), set()
+    imported = 0
+    if not hasattr(batches, "__aiter__"):
+        batches = _aiter(batches)
+    async for batch in batches:
+        conversations = {}
+        for record in batch:
+            conversation = conversations.setdefault(record["conversation_id"], dict(record))
+            # Files filtered by time may not carry the conversation's first message
+            conversation["conversation_updated_at"] = max(
+                conversation["conversation_updated_at"], record["timestamp"]
+            )
+        async with engine.begin() as conn:
+            unseen = [cid for cid in conversations if cid not in created and cid not in skipped]
+            if unseen:
+                existing = set((await conn.execute(
+                    select(ConversationDB.id).where(ConversationDB.id.in_(unseen))
+                )).scalars())
+                skipped |= existing
+                new_conversations = [
+                    {
+                        "id": cid,
+                        "title": conversations[cid]["title"],
+                        "created_at": conversations[cid]["conversation_created_at"],
+                        "updated_at": conversations[cid]["conversation_updated_at"],
+                    }
+                    for cid in unseen if cid not in existing
+                ]
+                await _bulk_insert(conn, ConversationDB.__table__, new_conversations)
+                created.update(conversation["id"] for conversation in new_conversations)
+            rows = [
+                {key: record[key] for key in ("conversation_id", "role", "content", "timestamp")}
+                for record in batch if record["conversation_id"] in created
+            ]
+            await _bulk_insert(conn, MessageDB.__table__, rows)
+        imported += len(rows)
+    logger.info(f"Imported {imported} messages in {len(created)} conversations, skipped {len(skipped)} existing conversations")
+    return {"messages": imported, "conversations": len(created), "skipped_conversations": len(skipped)}
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+async def export_file(path: str, fmt: str = None, **filters) -> None:
+    """Write an export to ``path`` ('-' for stdout); NDJSON paths ending in .gz are compressed"""
+    fmt = fmt or format_for_path(path)
+    if path == "-":
+        out = os.fdopen(os.dup(1), "wb")
+    elif path.endswith(".gz"):
+        out = gzip.open(path, "wb")
+    else:
+        out = open(path, "wb")
+    with out:
+        async for chunk in export_chunks(fmt, **filters):
+            out.write(chunk)
+
+async def import_file(path: str) -> Dict[str, int]:
+    if format_for_path(path) == "parquet":
+        return await import_batches(parquet_batches(path))
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as lines:
+        return await import_batches(ndjson_batches(lines))
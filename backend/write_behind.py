@@ -0,0 +1,337 @@
+"""
+Write-Behind Persistence for MedAI
+Queues chat turns in memory (backed by a local WAL file) and writes them to
+the database in batches off the request path
+"""
+
+import asyncio
+import json
+import os
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+from sqlalchemy import select, insert, update
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may use a log file
+    fcntl = None
+
+import metrics
+from database import ConversationDB, MessageDB
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WAL_SYNC_MODES = ("always", "interval", "off")
+
+class SavedMessage(NamedTuple):
+    """A message as written by a flush, with its database id"""
+    id: int
+    role: str
+    content: str
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _message_key(role: str, content: str, timestamp: datetime):
+    return role, content, timestamp.replace(tzinfo=None)
+
+class WriteBehindQueue:
+    """Buffers chat turns and bulk-inserts them on size or time thresholds.
+
+    Each submitted turn is appended to a write-ahead log before it is
+    acknowledged. A flush rotates the log to ``<wal>.flushing``, writes the
+    whole buffer in one transaction (one multi-row INSERT for messages) and
+    deletes the rotated log once committed. On startup any leftover log is
+    replayed, skipping messages the database already has, so a crash at any
+    point neither loses nor duplicates turns.
+
+    ``WRITE_BEHIND_WAL_SYNC`` controls fsync: ``always`` on every turn (safe
+    against power loss), ``interval`` once per flush tick (a process crash
+    loses nothing; power loss at most one interval), ``off`` leaves it to
+    the OS.
+
+    API workers sharing a host each lock their own log: the first worker
+    uses ``<wal>``, the next ``<wal>.1`` and so on, and a restarted worker
+    takes over (and replays) the log of the one it replaces.
+    """
+
+    def __init__(self, session_factory, on_saved: Callable = None, enabled: bool = None, batch_size: int = None,
+                 interval_ms: float = None, max_pending: int = None, wal_path: str = None, wal_sync: str = None):
+        self.enabled = enabled if enabled is not None else os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+        self.batch_size = batch_size or int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+        self.interval = (interval_ms or float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "100"))) / 1000
+        self.max_pending = max_pending or int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+        self.wal_path = Path(wal_path or os.getenv("WRITE_BEHIND_WAL_PATH", "./write_behind.wal"))
+        self.wal_sync = (wal_sync or os.getenv("WRITE_BEHIND_WAL_SYNC", "interval")).lower()
+        if self.wal_sync not in WAL_SYNC_MODES:
+            logger.warning(f"Unknown WRITE_BEHIND_WAL_SYNC '{self.wal_sync}', using interval")
+            self.wal_sync = "interval"
+        self.session_factory = session_factory
+        # Called with (conversation_id, saved messages, first_turn) for turns submitted with index=True
+        self.on_saved = on_saved
+
+        self._buffer: List[dict] = []
+        self._inflight: Optional[List[dict]] = None
+        self._wal = None
+        self._wal_lock = None
+        self._wal_dirty = False
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task = None
+        self._flushed = 0
+        self._batches = 0
+        self._failures = 0
+        self._replayed = 0
+
+    @property
+    def _rotated_path(self) -> Path:
+        return self.wal_path.with_name(self.wal_path.name + ".flushing")
+
+    async def start(self):
+        """Replay any log left by a previous run, then start the background flusher"""
+        if not self.enabled:
+            return
+        self.wal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._claim_wal()
+        await self._recover()
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Write-behind enabled (batch {self.batch_size}, every {self.interval * 1000:.0f}ms, WAL {self.wal_path})")
+
+    async def stop(self):
+        """Flush everything still queued and stop the flusher"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Could not flush pending chat writes on shutdown, they remain in {self.wal_path}: {e}")
+        self._wal.close()
+        self._wal = None
+        if self._wal_lock:
+            self._wal_lock.close()
+            self._wal_lock = None
+
+    def _claim_wal(self):
+        """Lock the first log file no other live process holds and use it"""
+        if not fcntl:
+            return
+        base, slot = self.wal_path, 0
+        while True:
+            path = base if slot == 0 else base.with_name(f"{base.name}.{slot}")
+            lock = open(path.with_name(path.name + ".lock"), "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                slot += 1
+                continue
+            self._wal_lock, self.wal_path = lock, path
+            return
+
+    def __len__(self) -> int:
+        return len(self._buffer) + len(self._inflight or [])
+
+    async def submit(self, conversation_id: str, title: str, messages: List, index: bool = True):
+        """Queue one turn; returns once it is in the log, not the database"""
+        if len(self) >= self.max_pending:
+            # The database is falling behind (or down): make the caller wait for a flush
+            await self.flush()
+        record = {
+            "conversation_id": conversation_id,
+            "title": title,
+            "messages": [{"role": m.role, "content": m.content, "timestamp": m.timestamp} for m in messages],
+            "index": index,
+        }
+        self._wal.write(json.dumps(record) + "\n")
+        self._wal.flush()
+        if self.wal_sync == "always":
+            os.fsync(self._wal.fileno())
+        else:
+            self._wal_dirty = True
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def pending(self, conversation_id: str) -> List[dict]:
+        """Queued records for a conversation, oldest first"""
+        records = (self._inflight or []) + self._buffer
+        return [record for record in records if record["conversation_id"] == conversation_id]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if self._wal_dirty and self.wal_sync == "interval":
+                    self._wal_dirty = False
+                    await asyncio.to_thread(os.fsync, self._wal.fileno())
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Kept in memory and in the log; retried on the next tick
+                logger.error(f"Error flushing chat writes: {e}")
+
+    async def flush(self):
+        """Write everything queued so far to the database"""
+        async with self._flush_lock:
+            while self._inflight or self._buffer:
+                if self._inflight is None:
+                    self._inflight, self._buffer = self._buffer, []
+                    self._rotate()
+                try:
+                    with metrics.db_latency.time(operation="write_behind_flush"):
+                        saved = await self._write(self._inflight)
+                except Exception:
+                    self._failures += 1
+                    raise
+                self._rotated_path.unlink(missing_ok=True)
+                self._flushed += len(self._inflight)
+                self._batches += 1
+                records, self._inflight = self._inflight, None
+                self._notify(records, saved)
+
+    def _rotate(self):
+        """Move the current log aside so it covers exactly the in-flight batch"""
+        self._wal.close()
+        os.replace(self.wal_path, self._rotated_path)
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._wal_dirty = False
+
+    async def _write(self, records: List[dict]):
+        """Insert a batch in one transaction; returns (message ids per record, new conversation ids)"""
+        timestamps: Dict[str, List[datetime]] = {}
+        titles: Dict[str, str] = {}
+        message_rows = []
+        for record in records:
+            conversation_id = record["conversation_id"]
+            titles.setdefault(conversation_id, record["title"])
+            for message in record["messages"]:
+                timestamp = _parse_timestamp(message["timestamp"])
+                timestamps.setdefault(conversation_id, []).append(timestamp)
+                message_rows.append({
+                    "conversation_id": conversation_id,
+                    "role": message["role"],
+                    "content": message["content"],
+                    "timestamp": timestamp,
+                })
+
+        async with self.session_factory() as db:
+            existing = set((await db.execute(
+                select(ConversationDB.id).where(ConversationDB.id.in_(list(titles)))
+            )).scalars())
+            new_conversations = [
+                {"id": cid, "title": titles[cid], "created_at": min(ts), "updated_at": max(ts)}
+                for cid, ts in timestamps.items() if cid not in existing
+            ]
+            if new_conversations:
+                await db.execute(insert(ConversationDB), new_conversations)
+            if existing:
+                # Bulk UPDATE by primary key, one statement executed for all rows
+                await db.execute(update(ConversationDB), [
+                    {"id": cid, "updated_at": max(ts)} for cid, ts in timestamps.items() if cid in existing
+                ])
+            ids = []
+            if message_rows:
+                result = await db.execute(
+                    insert(MessageDB).returning(MessageDB.id, sort_by_parameter_order=True), message_rows
+                )
+                ids = list(result.scalars())
+            await db.commit()
+
+        return ids, {conversation["id"] for conversation in new_conversations}
+
+    def _notify(self, records: List[dict], saved):
+        if not self.on_saved:
+            return
+        ids, created = saved
+        position = 0
+        for record in records:
+            messages = record["messages"]
+            rows = [
+                SavedMessage(message_id, message["role"], message["content"])
+                for message_id, message in zip(ids[position:position + len(messages)], messages)
+            ]
+            position += len(messages)
+            first_turn = record["conversation_id"] in created
+            # Later turns of a conversation created in this batch are follow-ups
+            created.discard(record["conversation_id"])
+            if record["index"]:
+                try:
+                    self.on_saved(record["conversation_id"], rows, first_turn)
+                except Exception as e:
+                    logger.error(f"Error handling saved messages: {e}")
+
+    async def _recover(self):
+        """Replay logs from a run that stopped before flushing"""
+        records = []
+        for path in (self._rotated_path, self.wal_path):
+            if not path.exists():
+                continue
+            with open(path, encoding="utf-8") as log:
+                for line in log:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        logger.warning(f"Skipping unreadable write-behind log entry in {path}")
+        if not records:
+            self._rotated_path.unlink(missing_ok=True)
+            return
+
+        # The rotated log may already be committed if we crashed before deleting it
+        records = await self._drop_stored(records)
+        if records:
+            self._notify(records, await self._write(records))
+        self._replayed = sum(len(record["messages"]) for record in records)
+        logger.info(f"Replayed {self._replayed} messages from the write-behind log")
+        self._rotated_path.unlink(missing_ok=True)
+        self.wal_path.unlink(missing_ok=True)
+
+    async def _drop_stored(self, records: List[dict]) -> List[dict]:
+        remaining = []
+        async with self.session_factory() as db:
+            stored = {}
+            for record in records:
+                conversation_id = record["conversation_id"]
+                if conversation_id not in stored:
+                    rows = await db.execute(
+                        select(MessageDB.role, MessageDB.content, MessageDB.timestamp)
+                        .where(MessageDB.conversation_id == conversation_id)
+                    )
+                    stored[conversation_id] = {_message_key(*row) for row in rows}
+                messages = [
+                    message for message in record["messages"]
+                    if _message_key(message["role"], message["content"], _parse_timestamp(message["timestamp"]))
+                    not in stored[conversation_id]
+                ]
+                if messages:
+                    remaining.append({**record, "messages": messages})
+        return remaining
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending_turns": len(self),
+            "flushed_turns": self._flushed,
+            "batches": self._batches,
+            "failed_flushes": self._failures,
+            "replayed_messages": self._replayed,
+            "wal_sync": self.wal_sync,
+        }
@@ -2,14 +2,16 @@ import React, { useState, useEffect } from 'react';
 import ChatContainer from './components/ChatContainer';
 import ChatInput from './components/ChatInput';
 import Sidebar from './components/Sidebar';
-import { Message, Conversation } from './types';
+import { Message, Conversation, ConversationSummary } from './types';
 import { chatService } from './services/api';
 
 function App() {
-  const [conversations, setConversations] = useState<Conversation[]>([]);
+  const [conversations, setConversations] = useState<ConversationSummary[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [currentConversation, setCurrentConversation] = useState<Conversation | null>(null);
   const [messages, setMessages] = useState<Message[]>([]);
   const [loading, setLoading] = useState(false);
+  const [streaming, setStreaming] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [sidebarOpen, setSidebarOpen] = useState(false);
 
@@ -18,10 +20,11 @@ function App() {
     loadConversations();
   }, []);
 
-  const loadConversations = async () => {
+  const loadConversations = async (cursor?: string | null) => {
     try {
-      const conversations = await chatService.getConversations();
-      setConversations(conversations);
+      const page = await chatService.getConversations(cursor);
+      setConversations(prev => (cursor ? [...prev, ...page.conversations] : page.conversations));
+      setNextCursor(page.next_cursor || null);
     } catch (err) {
       console.error('Error loading conversations:', err);
     }
@@ -40,11 +43,35 @@ function App() {
     setLoading(true);
     setError(null);
 
-    try {
-      const response = await chatService.sendMessage({
-        message: message,
-        conversation_id: currentConversation?.id
+    // Placeholder that fills in as tokens stream from the server
+    const streamingIndex = messages.length + 1;
+    let streamedText = '';
+    const updateAssistantMessage = (content: string) => {
+      setMessages(prev => {
+        const next = [...prev];
+        next[streamingIndex] = {
+          role: 'assistant',
+          content,
+          timestamp: next[streamingIndex]?.timestamp || new Date().toISOString()
+        };
+        return next;
       });
+    };
+
+    try {
+      const response = await chatService.streamMessage(
+        {
+          message: message,
+          conversation_id: currentConversation?.id
+        },
+        (delta) => {
+          if (!streamedText) {
+            setStreaming(true);
+          }
+          streamedText += delta;
+          updateAssistantMessage(streamedText);
+        }
+      );
       
       const assistantMessage: Message = {
         role: 'assistant',
@@ -52,45 +79,75 @@ function App() {
         timestamp: new Date().toISOString()
       };
 
-      setMessages(prev => [...prev, assistantMessage]);
+      // The final response replaces the streamed text (it may be a fallback)
+      updateAssistantMessage(response.response);
       
+      const now = new Date().toISOString();
+      const preview = response.response.substring(0, 100);
+
       if (!currentConversation) {
         // Create new conversation
         const newConversation: Conversation = {
           id: response.conversation_id,
           title: message.substring(0, 50) + (message.length > 50 ? '...' : ''),
           messages: [newMessage, assistantMessage],
-          created_at: new Date().toISOString(),
-          updated_at: new Date().toISOString()
+          created_at: now,
+          updated_at: now
         };
         setCurrentConversation(newConversation);
-        setConversations(prev => [newConversation, ...prev]);
+        setConversations(prev => [
+          {
+            id: newConversation.id,
+            title: newConversation.title,
+            message_count: 2,
+            last_message: preview,
+            created_at: now,
+            updated_at: now
+          },
+          ...prev
+        ]);
       } else {
-        // Update existing conversation
+        // Update existing conversation and move it to the top of the list
         const updatedConversation = {
           ...currentConversation,
           messages: [...currentConversation.messages, newMessage, assistantMessage],
-          updated_at: new Date().toISOString()
+          updated_at: now
         };
         setCurrentConversation(updatedConversation);
-        setConversations(prev => 
-          prev.map(conv => 
-            conv.id === currentConversation.id ? updatedConversation : conv
-          )
-        );
+        setConversations(prev => {
+          const existing = prev.find(conv => conv.id === currentConversation.id);
+          const updatedSummary: ConversationSummary = {
+            id: updatedConversation.id,
+            title: updatedConversation.title,
+            message_count: (existing?.message_count ?? currentConversation.messages.length) + 2,
+            last_message: preview,
+            created_at: updatedConversation.created_at,
+            updated_at: now
+          };
+          return [updatedSummary, ...prev.filter(conv => conv.id !== currentConversation.id)];
+        });
       }
     } catch (err) {
+      // Drop any partially streamed reply
+      setMessages(prev => prev.slice(0, streamingIndex));
       setError('Failed to send message. Please try again.');
       console.error('Error sending message:', err);
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   };
 
-  const handleConversationSelect = async (conversation: Conversation) => {
-    setCurrentConversation(conversation);
-    setMessages(conversation.messages);
+  const handleConversationSelect = async (summary: ConversationSummary) => {
     setSidebarOpen(false); // Close sidebar on mobile
+    try {
+      // The listing only has summaries; fetch the full transcript on demand
+      const conversation = await chatService.getConversation(summary.id);
+      setCurrentConversation(conversation);
+      setMessages(conversation.messages);
+    } catch (err) {
+      console.error('Error loading conversation:', err);
+    }
   };
 
   const handleNewConversation = () => {
@@ -134,6 +191,8 @@ function App() {
           onConversationSelect={handleConversationSelect}
           onNewConversation={handleNewConversation}
           onDeleteConversation={handleDeleteConversation}
+          hasMore={nextCursor !== null}
+          onLoadMore={() => loadConversations(nextCursor)}
         />
       </div>
 
@@ -157,7 +216,7 @@ function App() {
         <div className="flex-1 overflow-hidden">
           <ChatContainer 
             messages={messages} 
-            loading={loading}
+            loading={loading && !streaming}
             error={error}
           />
         </div>
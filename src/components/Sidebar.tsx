@@ -1,13 +1,15 @@
 import React from 'react';
-import { Conversation } from '../types';
+import { Conversation, ConversationSummary } from '../types';
 import { Plus, Trash2, MessageSquare, X } from 'lucide-react';
 
 interface SidebarProps {
-  conversations: Conversation[];
+  conversations: ConversationSummary[];
   currentConversation: Conversation | null;
-  onConversationSelect: (conversation: Conversation) => void;
+  onConversationSelect: (conversation: ConversationSummary) => void;
   onNewConversation: () => void;
   onDeleteConversation: (id: string) => void;
+  hasMore?: boolean;
+  onLoadMore?: () => void;
 }
 
 const Sidebar: React.FC<SidebarProps> = ({
@@ -16,6 +18,8 @@ const Sidebar: React.FC<SidebarProps> = ({
   onConversationSelect,
   onNewConversation,
   onDeleteConversation,
+  hasMore,
+  onLoadMore,
 }) => {
   const formatDate = (dateString: string | undefined) => {
     if (!dateString) return 'Unknown';
@@ -83,7 +87,7 @@ const Sidebar: React.FC<SidebarProps> = ({
                       {conversation.title}
                     </h3>
                     <div className="flex items-center mt-1 text-xs text-gray-500">
-                      <span>{conversation.messages.length} messages</span>
+                      <span>{conversation.message_count} messages</span>
                       <span className="mx-2">•</span>
                       <span>{formatDate(conversation.updated_at)}</span>
                     </div>
@@ -104,6 +108,14 @@ const Sidebar: React.FC<SidebarProps> = ({
                 </div>
               </div>
             ))}
+            {hasMore && (
+              <button
+                onClick={onLoadMore}
+                className="w-full p-2 text-sm text-gray-600 hover:text-gray-900 hover:bg-gray-50 rounded-lg transition-colors"
+              >
+                Load more
+              </button>
+            )}
           </div>
         )}
       </div>
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { ChatRequest, ChatResponse, Conversation } from '../types';
+import { ChatRequest, ChatResponse, Conversation, ConversationPage } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -23,9 +23,75 @@ export const chatService = {
     }
   },
 
-  async getConversations(): Promise<Conversation[]> {
+  async streamMessage(
+    request: ChatRequest,
+    onDelta: (delta: string) => void
+  ): Promise<ChatResponse> {
+    let response: Response;
     try {
-      const response = await api.get<Conversation[]>('/conversations');
+      response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Accept: 'text/event-stream',
+        },
+        body: JSON.stringify(request),
+      });
+    } catch (error) {
+      throw new Error('Network error');
+    }
+
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => null);
+      throw new Error(data?.detail || 'Failed to send message');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Server-sent events are separated by a blank line
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+          } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+          }
+        }
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === 'done') {
+          return payload as ChatResponse;
+        }
+        if (event === 'error') {
+          throw new Error(payload.detail || 'Failed to send message');
+        }
+        onDelta(payload.delta);
+      }
+    }
+
+    throw new Error('Stream ended before the response completed');
+  },
+
+  async getConversations(cursor?: string | null, limit = 20): Promise<ConversationPage> {
+    try {
+      const response = await api.get<ConversationPage>('/conversations', {
+        params: { limit, ...(cursor ? { cursor } : {}) },
+      });
       return response.data;
     } catch (error) {
       if (axios.isAxiosError(error)) {
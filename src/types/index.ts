@@ -12,6 +12,20 @@ export interface Conversation {
   updated_at: string;
 }
 
+export interface ConversationSummary {
+  id: string;
+  title: string;
+  message_count: number;
+  last_message?: string | null;
+  created_at: string;
+  updated_at: string;
+}
+
+export interface ConversationPage {
+  conversations: ConversationSummary[];
+  next_cursor?: string | null;
+}
+
 export interface ChatRequest {
   message: string;
   conversation_id?: string;